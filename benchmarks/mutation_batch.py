@@ -0,0 +1,52 @@
+"""Compares generating a pool of mutants one by one and as a batch.
+
+The batch path of the RandomMutationEngine needs NumPy (the 'batch' extra):
+
+    python benchmarks/mutation_batch.py --mutants 10000 --size 1024
+"""
+
+import argparse
+import time
+
+from resimulate.euicc.mutation.random_engine import RandomMutationEngine
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.transport.apdu import APDUPacket
+
+
+def run(mutation_type: MutationType, args: argparse.Namespace) -> None:
+    engine = RandomMutationEngine(mutation_rate=args.mutation_rate, seed=1)
+    data = bytes(range(256)) * (args.size // 256 + 1)
+    apdu = APDUPacket(cla=0x80, ins=0xE2, p1=0x91, p2=0x00, data=data[: args.size])
+
+    start = time.perf_counter()
+    for _ in range(args.mutants):
+        engine.mutate(apdu, mutation_type)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, args.mutants, args.batch_size):
+        count = min(args.batch_size, args.mutants - offset)
+        engine.mutate_batch(apdu, mutation_type, count, start=offset)
+    batch = time.perf_counter() - start
+
+    print(
+        f"{mutation_type:>14}: single {single:7.3f}s, batch {batch:7.3f}s, "
+        f"{single / batch:5.1f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mutants", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=1024, help="APDU data size")
+    parser.add_argument("--mutation-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    for mutation_type in MutationType:
+        if mutation_type is not MutationType.NONE:
+            run(mutation_type, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Measures the bookkeeping of the mutation tree while a scenario is recorded.
+
+The scenario is synthetic: every run performs the same number of operations and a
+mutation fails deterministically with the given rate, so no card is involved.
+The tree is explored until no mutation is left untried, which takes one run per
+node. The legacy column rescans the whole tree after every run, as the recursive
+termination check did before the subtree counters:
+
+    python benchmarks/mutation_tree.py --nodes 100000 --operations 8
+"""
+
+import argparse
+import random
+import time
+
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.recorder.operation import MutationTreeNode
+from resimulate.euicc.recorder.recorder import OperationRecorder
+
+
+def legacy_tree_has_not_tried_mutations(node: MutationTreeNode) -> bool:
+    if node.failure_reason or node.leaf:
+        return False
+
+    tried_mutations = [child.mutation_type for child in node.children]
+    if set(MutationType).difference(tried_mutations):
+        return True
+
+    return any(legacy_tree_has_not_tried_mutations(c) for c in node.children)
+
+
+def run_scenario(recorder: OperationRecorder, operations: int, failure_rate: float):
+    for operation in range(operations):
+        recorder.get_next_mutation(f"operation_{operation}")
+        node = recorder.current_node
+        # Decided once per node, as a card answers the same mutation the same way
+        if random.Random(id(node)).random() < failure_rate:
+            node.set_failure("SyntheticError")
+            break
+    else:
+        recorder.current_node.set_leaf()
+
+    recorder.reset()
+
+
+def run(args: argparse.Namespace) -> None:
+    recorder = OperationRecorder()
+    runs = 0
+    timings = []
+    legacy_duration = 0.0
+    start = time.perf_counter()
+    while runs < args.nodes:
+        run_start = time.perf_counter()
+        run_scenario(recorder, args.operations, args.failure_rate)
+        done = not recorder.root.tree_has_not_tried_mutations()
+        timings.append(time.perf_counter() - run_start)
+        runs += 1
+
+        if args.legacy_every and runs % args.legacy_every == 0:
+            legacy_start = time.perf_counter()
+            legacy_tree_has_not_tried_mutations(recorder.root)
+            legacy_duration += time.perf_counter() - legacy_start
+
+        if done:
+            break
+
+    duration = time.perf_counter() - start
+    window = max(1, len(timings) // 10)
+    first = sum(timings[:window]) / window * 1e6
+    last = sum(timings[-window:]) / window * 1e6
+    print(
+        f"{runs} runs in {duration:.3f}s, "
+        f"{first:.1f}us per run at the start, {last:.1f}us per run at the end"
+    )
+
+    if args.legacy_every:
+        checks = runs // args.legacy_every
+        if checks:
+            print(
+                f"legacy rescan: {legacy_duration / checks * 1e3:.3f}ms per check, "
+                f"{legacy_duration / checks * runs:.1f}s if run after every run"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--operations", type=int, default=8)
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.5, help="Chance of a mutation to fail"
+    )
+    parser.add_argument(
+        "--legacy-every",
+        type=int,
+        default=1000,
+        help="Runs between legacy rescans, 0 to disable them",
+    )
+    args = parser.parse_args()
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
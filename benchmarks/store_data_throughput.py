@@ -0,0 +1,95 @@
+"""Compares the STORE DATA throughput of short and extended length APDUs.
+
+The card is simulated with a fixed latency per APDU and a transfer time per byte,
+so the numbers show the transport overhead of each mode without a reader:
+
+    python benchmarks/store_data_throughput.py --segments 200 --segment-size 1024
+"""
+
+import argparse
+import time
+
+from smartcard.CardConnection import CardConnection
+
+from resimulate.euicc.transport.apdu import APDUPacket
+from resimulate.euicc.transport.pcsc_link import PcscLink
+
+# Card capabilities (73) with the extended Lc/Le bit set in the third byte
+EXTENDED_LENGTH_ATR = bytes.fromhex("3B888001807300004031FE0075")
+
+
+class SimulatedCardConnection:
+    """Acknowledges every APDU with 9000 after the configured delay. The APDUs are
+    parsed, so malformed ones and ones without Le, whose response a card would
+    drop, fail the benchmark."""
+
+    def __init__(self, latency: float, byte_time: float):
+        self.latency = latency
+        self.byte_time = byte_time
+        self.transmitted_apdus = 0
+        self.transmitted_bytes = 0
+
+    def getReader(self) -> str:
+        return "simulated"
+
+    def getProtocol(self) -> int:
+        return CardConnection.T1_protocol
+
+    def getATR(self) -> list[int]:
+        return list(EXTENDED_LENGTH_ATR)
+
+    def connect(self, protocol: int | None = None):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def transmit(self, apdu: list[int], protocol: int | None = None):
+        if APDUPacket.from_bytes(bytes(apdu)).le is None:
+            raise ValueError(f"APDU expects no response: {bytes(apdu).hex()}")
+        self.transmitted_apdus += 1
+        self.transmitted_bytes += len(apdu)
+        time.sleep(self.latency + len(apdu) * self.byte_time)
+        return [], 0x90, 0x00
+
+
+def run(extended_length: bool, args: argparse.Namespace) -> None:
+    connection = SimulatedCardConnection(args.latency / 1000, args.byte_time / 1e6)
+    link = PcscLink(card_connection=connection, extended_length=extended_length)
+    link.connect()
+
+    segment = bytes(range(256)) * (args.segment_size // 256 + 1)
+    segment = segment[: args.segment_size]
+
+    start = time.perf_counter()
+    for _ in range(args.segments):
+        apdu = APDUPacket(cla=0x80, ins=0xE2, p1=0x91, p2=0x00, data=segment)
+        link.send_apdu_with_mutation("benchmark", apdu)
+    duration = time.perf_counter() - start
+
+    mode = "extended" if extended_length else "short"
+    kib = args.segments * args.segment_size / 1024
+    print(
+        f"{mode:>8}: {connection.transmitted_apdus:6d} APDUs, "
+        f"{duration:7.3f}s, {kib / duration:8.1f} KiB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=100)
+    parser.add_argument("--segment-size", type=int, default=1024)
+    parser.add_argument(
+        "--latency", type=float, default=2.0, help="Latency per APDU in ms"
+    )
+    parser.add_argument(
+        "--byte-time", type=float, default=10.0, help="Transfer time per byte in us"
+    )
+    args = parser.parse_args()
+
+    for extended_length in (False, True):
+        run(extended_length, args)
+
+
+if __name__ == "__main__":
+    main()
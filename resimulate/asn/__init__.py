@@ -1,12 +1,100 @@
+import hashlib
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+
 import asn1tools
 
-asn = asn1tools.compile_files(
-    [
-        "resimulate/asn/pkix1_explicit_88.asn",
-        "resimulate/asn/pkix1_implicit_88.asn",
-        "resimulate/asn/pe_definitions_v3_4.asn",
-        "resimulate/asn/rsp_definitions_v3_1.asn",
-    ],
-    codec="ber",
-    cache_dir=".asn_cache",
-)
+from resimulate.asn.cache import CodecCache
+from resimulate.util import get_version
+
+ASN_DIR = Path(__file__).parent
+ASN_FILES = [
+    ASN_DIR / "pkix1_explicit_88.asn",
+    ASN_DIR / "pkix1_implicit_88.asn",
+    ASN_DIR / "pe_definitions_v3_4.asn",
+    ASN_DIR / "rsp_definitions_v3_1.asn",
+]
+CODEC = "ber"
+
+
+def get_cache_dir() -> Path:
+    """Returns the per-version cache directory of ReSIMulate. It can be overridden
+    with the RESIMULATE_CACHE_DIR environment variable."""
+    if cache_dir := os.environ.get("RESIMULATE_CACHE_DIR"):
+        return Path(cache_dir)
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "resimulate" / (get_version() or "unknown")
+
+
+def get_cache_path() -> Path:
+    """Returns the location of the compiled codec, keyed by the content of the ASN.1
+    files, the codec and the asn1tools version."""
+    digest = hashlib.sha256(f"{asn1tools.__version__}:{CODEC}".encode())
+    for asn_file in ASN_FILES:
+        digest.update(asn_file.read_bytes())
+
+    return get_cache_dir() / "asn" / f"{digest.hexdigest()[:16]}.pickle"
+
+
+def compile_asn(force: bool = False) -> asn1tools.compiler.Specification:
+    """Loads the compiled ASN.1 codec from the cache, compiling and caching it if
+    it is missing (or if force is set)."""
+    cache_path = get_cache_path()
+    if not force:
+        start = time.perf_counter()
+        try:
+            with open(cache_path, "rb") as f:
+                specification = pickle.load(f)
+            logging.debug(
+                "Loaded ASN.1 codec from %s in %.3fs",
+                cache_path,
+                time.perf_counter() - start,
+            )
+            return specification
+        except FileNotFoundError:
+            logging.debug("No compiled ASN.1 codec found at %s", cache_path)
+        except Exception as e:
+            logging.warning("Ignoring broken ASN.1 cache %s: %s", cache_path, e)
+
+    start = time.perf_counter()
+    specification = asn1tools.compile_files(
+        [str(asn_file) for asn_file in ASN_FILES], codec=CODEC
+    )
+    logging.debug("Compiled ASN.1 codec in %.3fs", time.perf_counter() - start)
+
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, concurrent invocations must never see
+        # a partially written cache.
+        temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "wb") as f:
+            pickle.dump(specification, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.warning("Could not cache the ASN.1 codec in %s: %s", cache_path, e)
+
+    return specification
+
+
+class LazySpecification:
+    """Stands in for the compiled ASN.1 codec, which is only loaded on first use."""
+
+    def __init__(self):
+        self.specification: asn1tools.compiler.Specification | None = None
+
+    def load(self, force: bool = False) -> asn1tools.compiler.Specification:
+        if self.specification is None or force:
+            self.specification = compile_asn(force)
+
+        return self.specification
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+
+asn = LazySpecification()
+codec_cache = CodecCache(asn)
@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Any
+
+DEFAULT_CACHE_SIZE = 256
+
+# Payloads above this size (e.g. bound profile package segments) are unique and
+# would only evict the small constant requests the cache is meant for.
+MAX_CACHED_PAYLOAD = 4096
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return f"hits={self.hits} misses={self.misses} hit_rate={self.hit_rate:.0%}"
+
+
+def freeze(value: Any) -> Hashable:
+    """Turns an ASN.1 value (dicts, lists, CHOICE tuples, scalars) into a hashable
+    key. Types are kept in the key, so e.g. a list and a tuple never collide."""
+    if isinstance(value, dict):
+        return dict, tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(freeze(item) for item in value)
+    if isinstance(value, bytearray):
+        return bytes, bytes(value)
+
+    hash(value)
+    return type(value), value
+
+
+def copy_value(value: Any) -> Any:
+    """Copies the containers of a decoded ASN.1 value, scalars are immutable and
+    shared. Several times faster than copy.deepcopy for decoded values."""
+    if isinstance(value, dict):
+        return {key: copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_value(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(copy_value(item) for item in value)
+
+    return value
+
+
+class CodecCache:
+    """Bounded LRU cache in front of an ASN.1 codec.
+
+    Encodes are keyed by the type and the canonicalized value, decodes by the type
+    and the encoded bytes. Decoded values are copied when they are handed out, so
+    callers can modify them without corrupting the cache. The cache is shared by
+    threads, e.g. the readers of a bulk download, so its entries are locked.
+    """
+
+    def __init__(self, specification, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.specification = specification
+        self.maxsize = maxsize
+        self.encoded: OrderedDict[Hashable, bytes] = OrderedDict()
+        self.decoded: OrderedDict[Hashable, Any] = OrderedDict()
+        self.stats = {"encode": CacheStats(), "decode": CacheStats()}
+        self.lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f"encode: {self.stats['encode']}, decode: {self.stats['decode']}"
+
+    def encode(self, type_name: str, value: Any, **kwargs) -> bytes:
+        try:
+            key = (type_name, freeze(value), freeze(kwargs))
+        except TypeError:
+            return self.specification.encode(type_name, value, **kwargs)
+
+        if (encoded := self.__get(self.encoded, key, "encode")) is not None:
+            return encoded
+
+        encoded = self.specification.encode(type_name, value, **kwargs)
+        if len(encoded) <= MAX_CACHED_PAYLOAD:
+            self.__put(self.encoded, key, encoded)
+
+        return encoded
+
+    def decode(self, type_name: str, data: bytes, **kwargs) -> Any:
+        if len(data) > MAX_CACHED_PAYLOAD:
+            return self.specification.decode(type_name, data, **kwargs)
+
+        key = (type_name, bytes(data), freeze(kwargs))
+        if (decoded := self.__get(self.decoded, key, "decode")) is not None:
+            return copy_value(decoded)
+
+        decoded = self.specification.decode(type_name, data, **kwargs)
+        self.__put(self.decoded, key, decoded)
+        return copy_value(decoded)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.encoded.clear()
+            self.decoded.clear()
+
+    def __get(self, cache: OrderedDict, key: Hashable, operation: str) -> Any:
+        stats = self.stats[operation]
+        with self.lock:
+            value = cache.get(key)
+            if value is None:
+                stats.misses += 1
+                return None
+
+            stats.hits += 1
+            cache.move_to_end(key)
+            return value
+
+    def __put(self, cache: OrderedDict, key: Hashable, value: Any) -> None:
+        with self.lock:
+            cache[key] = value
+            if len(cache) > self.maxsize:
+                cache.popitem(last=False)
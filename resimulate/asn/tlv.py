@@ -0,0 +1,73 @@
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Tlv:
+    """BER TLV within a buffer, the views share the memory of the buffer."""
+
+    tag: int
+    data: memoryview
+    header_size: int
+
+    @property
+    def header(self) -> memoryview:
+        return self.data[: self.header_size]
+
+    @property
+    def value(self) -> memoryview:
+        return self.data[self.header_size :]
+
+
+def read_header(
+    data: bytes | memoryview, offset: int, end: int
+) -> tuple[int, int, int]:
+    """Reads the tag and length of the TLV at the offset.
+
+    Returns:
+        tuple[int, int, int]: Offset of the length field, offset of the value and
+            the decoded length.
+
+    Raises:
+        ValueError: If the TLV is no valid definite length BER or exceeds the end.
+    """
+    tag_end = offset + 1
+    if data[offset] & 0x1F == 0x1F:
+        while tag_end < end and data[tag_end] & 0x80:
+            tag_end += 1
+        tag_end += 1
+
+    if tag_end >= end:
+        raise ValueError(f"Truncated TLV at offset {offset}")
+
+    length_size = 1
+    length = data[tag_end]
+    if length & 0x80:
+        length_size += length & 0x7F
+        if length == 0x80 or tag_end + length_size > end:
+            raise ValueError(f"Unsupported length at offset {tag_end}")
+        length = int.from_bytes(data[tag_end + 1 : tag_end + length_size])
+
+    value_offset = tag_end + length_size
+    if value_offset + length > end:
+        raise ValueError(f"TLV at offset {offset} exceeds its parent")
+
+    return tag_end, value_offset, length
+
+
+def iter_tlvs(data: bytes | memoryview) -> Iterator[Tlv]:
+    """Yields the TLVs following each other in the data, without their nested ones.
+
+    The TLVs are parsed as they are consumed, so a caller can act on the first
+    ones before the rest was looked at, and their data is never copied.
+    """
+    data = memoryview(data)
+    offset = 0
+    while offset < len(data):
+        tag_end, value_offset, length = read_header(data, offset, len(data))
+        yield Tlv(
+            tag=int.from_bytes(data[offset:tag_end]),
+            data=data[offset : value_offset + length],
+            header_size=value_offset - offset,
+        )
+        offset = value_offset + length
@@ -8,7 +8,7 @@ import argcomplete
 from rich import print
 from rich_argparse import RichHelpFormatter
 
-from resimulate.cli import fuzzer, lpa, trace
+from resimulate.cli import asn, fuzzer, lpa, trace
 from resimulate.util import get_pcsc_devices, get_version
 from resimulate.util.logger import init_logger
 
@@ -40,6 +40,7 @@ subparsers = parser.add_subparsers(
 lpa.add_subparser(subparsers)
 trace.add_subparser(subparsers)
 fuzzer.add_subparser(subparsers)
+asn.add_subparser(subparsers)
 
 
 def main():
@@ -54,6 +55,8 @@ def main():
         lpa.run(args)
     elif args.command == "fuzzer":
         fuzzer.run(args)
+    elif args.command == "asn":
+        asn.run(args)
     else:
         raise ValueError(f"Unsupported command: {args.command}")
 
@@ -0,0 +1,23 @@
+import argparse
+
+from rich_argparse import RichHelpFormatter
+
+from resimulate.cli.asn import warmup
+
+
+def add_subparser(parent: argparse._SubParsersAction) -> None:
+    asn_parser: argparse.ArgumentParser = parent.add_parser(
+        "asn",
+        help="ASN.1 codec operations",
+        formatter_class=RichHelpFormatter,
+    )
+
+    asn_subparsers = asn_parser.add_subparsers(dest="asn_command", required=True)
+    warmup.add_subparser(asn_subparsers)
+
+
+def run(args: argparse.Namespace) -> None:
+    if args.asn_command == "warmup":
+        warmup.run(args)
+    else:
+        raise ValueError(f"Unknown asn command: {args.asn_command}")
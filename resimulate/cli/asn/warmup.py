@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from rich import print
+from rich_argparse import RichHelpFormatter
+
+from resimulate.asn import compile_asn, get_cache_path
+
+
+def add_subparser(parent_parser: argparse._SubParsersAction) -> None:
+    parser: argparse.ArgumentParser = parent_parser.add_parser(
+        "warmup",
+        formatter_class=RichHelpFormatter,
+        help="Compile and cache the ASN.1 codec.",
+        description="Compile the ASN.1 definitions and cache the codec, so the first command using it does not have to. Reports how long loading the cached codec takes, which bounds the ASN.1 share of the cold start of e.g. the lpa commands.",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Recompile the codec even if it is already cached.",
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+    compile_asn(force=args.force)
+    warmup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compile_asn()
+    load_time = time.perf_counter() - start
+
+    print(f"[bold green]ASN.1 codec cached at {get_cache_path()}")
+    print(f"Warmup: {warmup_time:.3f}s, loading from cache: {load_time:.3f}s")
@@ -2,7 +2,7 @@ import argparse
 
 from rich_argparse import RichHelpFormatter
 
-from resimulate.cli.fuzzer import apdu_fuzz, compare, fuzz
+from resimulate.cli.fuzzer import apdu_fuzz, compare, corpus, export, fuzz
 
 
 def add_subparser(parent: argparse._SubParsersAction) -> None:
@@ -18,6 +18,8 @@ def add_subparser(parent: argparse._SubParsersAction) -> None:
     fuzz.add_subparser(fuzzer_subparsers)
     apdu_fuzz.add_subparser(fuzzer_subparsers)
     compare.add_subparser(fuzzer_subparsers)
+    corpus.add_subparser(fuzzer_subparsers)
+    export.add_subparser(fuzzer_subparsers)
 
 
 def run(args: argparse.Namespace) -> None:
@@ -27,5 +29,9 @@ def run(args: argparse.Namespace) -> None:
         apdu_fuzz.run(args)
     elif args.fuzzer_command == "compare":
         compare.run(args)
+    elif args.fuzzer_command == "corpus":
+        corpus.run(args)
+    elif args.fuzzer_command == "export":
+        export.run(args)
     else:
         raise ValueError(f"Unknown fuzzer command: {args.fuzzer_command}")
@@ -4,8 +4,15 @@ from rich_argparse import RichHelpFormatter
 
 from resimulate.euicc.mutation.deterministic_engine import DeterministicMutationEngine
 from resimulate.euicc.mutation.random_engine import RandomMutationEngine
+from resimulate.euicc.mutation.scheduler import MutationScheduler
+from resimulate.euicc.mutation.structure_engine import StructureMutationEngine
 from resimulate.fuzzing.apdu_fuzzing import SCENARIOS
-from resimulate.fuzzing.apdu_fuzzing.models.scenario_runner import ScenarioRunner
+from resimulate.fuzzing.apdu_fuzzing.models.farm import FarmScenarioRunner
+from resimulate.fuzzing.apdu_fuzzing.models.scenario_runner import (
+    CHECKPOINT_INTERVAL,
+    ScenarioRunner,
+)
+from resimulate.fuzzing.corpus import Corpus
 
 
 def add_subparser(
@@ -27,9 +34,9 @@ def add_subparser(
         "--engine",
         type=str,
         default="deterministic",
-        choices=["deterministic", "random"],
+        choices=["deterministic", "random", "structure"],
         required=False,
-        help="Fuzzing engine to use (default: %(default)s)",
+        help="Fuzzing engine to use. 'structure' mutates the decoded ASN.1 fields and the TLV length fields of STORE DATA requests instead of their bytes (default: %(default)s)",
     )
     parser.add_argument(
         "-o",
@@ -58,12 +65,59 @@ def add_subparser(
         default=False,
         help="Overwrite existing output files (default: %(default)s)",
     )
+    parser.add_argument(
+        "--schedule",
+        type=str,
+        default="exhaustive",
+        choices=["exhaustive", "coverage"],
+        required=False,
+        help="Mutation schedule. 'coverage' prioritizes the mutations which uncover new status words, response lengths and failures, and caps the ones which do not (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        required=False,
+        help="Corpus directory to store the mutated APDUs in. With --schedule coverage, the behaviours already in the corpus are not rewarded again (e.g. 'corpus/')",
+    )
+    parser.add_argument(
+        "--prefix-replay",
+        action="store_true",
+        default=False,
+        help="Answer the recorded prefix of a branch from the mutation tree and restore the card state where it diverges, instead of running every branch from a reset card. Only saves time with --simulate, where the state is snapshotted (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Continue the recordings from their last checkpoint and skip the scenarios which are already recorded (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=CHECKPOINT_INTERVAL,
+        required=False,
+        help="Seconds between two checkpoints of a recording (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--readers",
+        type=int,
+        nargs="+",
+        metavar="INDEX",
+        help="PC/SC device indices of a reader farm with identical cards. The mutation tree is explored on all readers in parallel, one worker process per reader. With --simulate, one simulated eUICC is used per index.",
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        default=False,
+        help="Fuzz a simulated eUICC instead of the card in the reader (default: %(default)s)",
+    )
 
 
 def run(args: argparse.Namespace) -> None:
     engine_map = {
         "deterministic": DeterministicMutationEngine,
         "random": RandomMutationEngine,
+        "structure": StructureMutationEngine,
     }
     mutation_engine_cls = engine_map[args.engine]
 
@@ -74,11 +128,25 @@ def run(args: argparse.Namespace) -> None:
     else:
         scenarios = SCENARIOS
 
-    runner = ScenarioRunner(scenarios=scenarios)
+    if args.readers:
+        runner = FarmScenarioRunner(
+            scenarios=scenarios, readers=args.readers, simulate=args.simulate
+        )
+    else:
+        runner = ScenarioRunner(
+            scenarios=scenarios,
+            simulate=args.simulate,
+            prefix_replay=args.prefix_replay,
+        )
+
     runner.record_card(
         card_name=args.card_name,
         mutation_engine=mutation_engine_cls(),
         path=args.output,
         overwrite=args.overwrite,
         apdu_data_size=args.max_apdu_size,
+        resume=args.resume,
+        checkpoint_interval=args.checkpoint_interval,
+        scheduler=MutationScheduler() if args.schedule == "coverage" else None,
+        corpus=Corpus(args.corpus) if args.corpus else None,
     )
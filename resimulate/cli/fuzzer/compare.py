@@ -1,8 +1,17 @@
 import argparse
+import logging
+from collections import defaultdict
 
+from rich import print
+from rich.table import Table
 from rich_argparse import RichHelpFormatter
 
-from resimulate.euicc.recorder.recorder import OperationRecorder
+from resimulate.euicc.recorder.comparison import diff_scenarios
+from resimulate.fuzzing.apdu_fuzzing import SCENARIOS
+from resimulate.fuzzing.apdu_fuzzing.models.scenario_runner import (
+    find_recordings,
+    split_recording_name,
+)
 
 
 def add_subparser(
@@ -12,23 +21,61 @@ def add_subparser(
         "compare",
         formatter_class=RichHelpFormatter,
         help="Compare recorded apdu fuzzings with fuzzing results of other cards.",
-        description="Compare recorded apdu fuzzings with fuzzing results of other cards.",
+        description="Compare the recorded apdu fuzzings of several cards. The recordings are grouped by scenario and every scenario prints the paths of its mutation tree on which the cards answered differently.",
     )
     parser.add_argument(
-        "main_fuzzing_file",
-        type=argparse.FileType("rb"),
-        help="Path to the recorded main apdu fuzzing file (e.g. 'resimulate/recordings/fuzzing.resim')",
+        "recordings",
+        nargs="+",
+        type=str,
+        help="Recorded apdu fuzzing files or directories containing them (e.g. 'resimulate/recordings/'). The first card is the first column.",
     )
     parser.add_argument(
-        "compare_fuzzing_files",
-        nargs="+",
-        type=argparse.FileType("rb"),
-        help="Paths to the recorded apdu fuzzing files to compare against (e.g. 'resimulate/recordings/fuzzing1.resim')",
+        "-j",
+        "--jobs",
+        type=int,
+        required=False,
+        help="Number of scenarios compared in parallel (default: number of CPUs)",
     )
 
 
 def run(args: argparse.Namespace) -> None:
-    OperationRecorder.compare_files(
-        args.main_fuzzing_file.name,
-        [file.name for file in args.compare_fuzzing_files],
-    )
+    scenario_names = [scenario.__qualname__ for scenario in SCENARIOS]
+    scenarios: dict[str, list[tuple[str, str]]] = defaultdict(list)
+    for recording_path in find_recordings(args.recordings):
+        names = split_recording_name(recording_path, scenario_names)
+        if names is None:
+            # Files which were renamed are compared with each other
+            names = (recording_path, "unknown")
+            logging.warning(f"Unknown scenario of {recording_path}")
+
+        card_name, scenario_name = names
+        scenarios[scenario_name].append((card_name, recording_path))
+
+    for scenario_name, recordings in list(scenarios.items()):
+        if len(recordings) < 2:
+            print(f"[yellow]Skipping {scenario_name}, only one card was recorded")
+            del scenarios[scenario_name]
+
+    for diff in diff_scenarios(scenarios, args.jobs):
+        if not diff.rows:
+            print(f"[bold green]{diff.scenario_name}: all {diff.paths} paths are equal")
+            continue
+
+        table = Table(
+            title=f"{diff.scenario_name}: {len(diff.rows)} of {diff.paths} paths diverge"
+        )
+        table.add_column("Path")
+        for card_name in diff.card_names:
+            table.add_column(card_name)
+
+        for path, outcomes in diff.rows:
+            cells = [
+                "-" if outcome is None else " ".join(filter(None, outcome))
+                for outcome in outcomes
+            ]
+            table.add_row(
+                " > ".join(f"{func_name}:{mutation}" for func_name, mutation in path),
+                *cells,
+            )
+
+        print(table)
@@ -0,0 +1,54 @@
+import argparse
+from collections import Counter
+
+from rich import print
+from rich.table import Table
+from rich_argparse import RichHelpFormatter
+
+from resimulate.fuzzing.corpus import Corpus
+
+
+def add_subparser(
+    parent_parser: argparse._SubParsersAction,
+) -> None:
+    parser: argparse.ArgumentParser = parent_parser.add_parser(
+        "corpus",
+        formatter_class=RichHelpFormatter,
+        help="Inspect and minimize a corpus of interesting APDUs.",
+        description="Summarizes a corpus written by 'fuzzer fuzz --corpus' or 'fuzzer apdu_fuzz --corpus' per operation, status word and exception.",
+    )
+    parser.add_argument(
+        "corpus",
+        type=str,
+        help="Corpus directory (e.g. 'corpus/')",
+    )
+    parser.add_argument(
+        "--minimize",
+        action="store_true",
+        default=False,
+        help="Only keep the smallest APDU of every operation, status word and exception (default: %(default)s)",
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    corpus = Corpus(args.corpus)
+    if args.minimize:
+        removed = corpus.minimize()
+        print(f"[bold green]Removed {removed} redundant entries")
+
+    behaviours = Counter()
+    for entry in corpus.entries():
+        for behaviour in entry.get_behaviours():
+            behaviours[behaviour] += 1
+
+    table = Table(title=f"Corpus {args.corpus}")
+    table.add_column("Operation")
+    table.add_column("SW")
+    table.add_column("Exception")
+    table.add_column("Entries", justify="right")
+    for (func_name, sw, exception), count in sorted(
+        behaviours.items(), key=lambda item: tuple(str(value) for value in item[0])
+    ):
+        table.add_row(func_name, sw or "-", exception or "-", str(count))
+
+    print(table)
@@ -0,0 +1,55 @@
+import argparse
+import logging
+
+from rich import print
+from rich_argparse import RichHelpFormatter
+
+from resimulate.euicc.recorder.export import ResultTable
+from resimulate.fuzzing.apdu_fuzzing import SCENARIOS
+from resimulate.fuzzing.apdu_fuzzing.models.scenario_runner import (
+    find_recordings,
+    split_recording_name,
+)
+
+
+def add_subparser(
+    parent_parser: argparse._SubParsersAction,
+) -> None:
+    parser: argparse.ArgumentParser = parent_parser.add_parser(
+        "export",
+        formatter_class=RichHelpFormatter,
+        help="Export recorded apdu fuzzings into a columnar table.",
+        description="Flattens the mutation trees of recorded apdu fuzzings into one NumPy table with a row per node: card name, ATR, scenario, tree path, mutation type, original and mutated APDU, response SW, failure reason and leaf flag. Load it with ResultTable.load to query it with vectorized filters.",
+    )
+    parser.add_argument(
+        "recordings",
+        nargs="+",
+        type=str,
+        help="Recorded apdu fuzzing files or directories containing them (e.g. 'resimulate/recordings/')",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="recordings.npz",
+        help="Output file (default: %(default)s)",
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    scenario_names = [scenario.__qualname__ for scenario in SCENARIOS]
+    recordings = []
+    for recording_path in find_recordings(args.recordings):
+        names = split_recording_name(recording_path, scenario_names)
+        if names is None:
+            logging.warning(f"Unknown scenario of {recording_path}")
+            names = (recording_path, "unknown")
+
+        card_name, scenario_name = names
+        recordings.append((recording_path, card_name, scenario_name))
+
+    table = ResultTable.from_recordings(recordings)
+    table.save(args.output)
+    print(
+        f"[bold green]Exported {len(table)} nodes of {len(recordings)} recordings to {args.output}"
+    )
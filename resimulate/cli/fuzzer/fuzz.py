@@ -16,21 +16,38 @@ from rich.progress import (
 from rich_argparse import RichHelpFormatter
 
 from resimulate.fuzzing import data_fuzzing
+from resimulate.fuzzing.corpus import Corpus
+from resimulate.fuzzing.data_fuzzing import link
 from resimulate.util.logger import init_logger
 
 
 def add_subparser(
     parent_parser: argparse._SubParsersAction,
 ) -> None:
-    parent_parser.add_parser(
+    parser: argparse.ArgumentParser = parent_parser.add_parser(
         "fuzz",
         formatter_class=RichHelpFormatter,
         help="Fuzz an esim card by generating arbitrary data.",
         description="Fuzz an esim card by generating APDUs with valid data by constructing the necessary data structures and filling them with arbitrary data.",
     )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        default=False,
+        help="Fuzz a simulated eUICC instead of the card in the reader. Fuzzing groups that need a profile download are skipped. (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        required=False,
+        help="Corpus directory to store the APDUs of interesting inputs in (e.g. 'corpus/')",
+    )
 
 
 def run(args: argparse.Namespace) -> None:
+    link.simulate = args.simulate
+    if args.corpus:
+        link.corpus = Corpus(args.corpus)
     loader = unittest.TestLoader()
     modules = data_fuzzing.__all__
 
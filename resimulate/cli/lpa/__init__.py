@@ -2,7 +2,7 @@ import argparse
 
 from rich_argparse import RichHelpFormatter
 
-from resimulate.cli.lpa import euicc, notification, profile
+from resimulate.cli.lpa import bulk_download, euicc, notification, profile
 from resimulate.euicc.card import Card
 from resimulate.euicc.transport.pcsc_link import PcscLink
 
@@ -20,15 +20,30 @@ def add_subparser(parent: argparse._SubParsersAction) -> None:
         required=False,
         help="Max APDU size (default: %(default)s)",
     )
+    lpa_parser.add_argument(
+        "--extended-length",
+        choices=["auto", "on", "off"],
+        default="auto",
+        help="Send long STORE DATA commands (e.g. profile package segments) as extended length APDUs. 'auto' detects support from the ATR. (default: %(default)s)",
+    )
 
     lpa_subparsers = lpa_parser.add_subparsers(dest="lpa_command", required=True)
     profile.add_subparser(lpa_subparsers)
     notification.add_subparser(lpa_subparsers)
     euicc.add_subparser(lpa_subparsers)
+    bulk_download.add_subparser(lpa_subparsers)
 
 
 def run(args: argparse.Namespace) -> None:
-    with PcscLink(apdu_data_size=args.max_apdu_size) as link:
+    extended_length = {"auto": None, "on": True, "off": False}[args.extended_length]
+    if args.lpa_command == "bulk-download":
+        # Opens a link per reader itself
+        bulk_download.run(args, extended_length)
+        return
+
+    with PcscLink(
+        apdu_data_size=args.max_apdu_size, extended_length=extended_length
+    ) as link:
         card = Card(link)
         if args.lpa_command == "profile":
             profile.run(args, card)
@@ -0,0 +1,94 @@
+import argparse
+
+from rich import print
+from rich.table import Table
+from rich_argparse import RichHelpFormatter
+
+from resimulate.euicc.provisioning import (
+    BulkDownloader,
+    read_activation_codes,
+    write_report,
+)
+
+
+def add_subparser(
+    parent_parser: argparse._SubParsersAction,
+) -> None:
+    parser: argparse.ArgumentParser = parent_parser.add_parser(
+        "bulk-download",
+        formatter_class=RichHelpFormatter,
+        help="Download many profiles onto the cards of several readers.",
+        description="Download the profiles of a CSV file of activation codes onto the cards of several readers in parallel. Every reader takes the next activation code as soon as its card is done, the notifications of a card are processed after its downloads.",
+    )
+    parser.add_argument(
+        "activation_codes",
+        type=str,
+        help="CSV file with an activation code and an optional confirmation code per row (e.g. 'LPA:1$smdp.example.com$MATCHING-ID,1234')",
+    )
+    parser.add_argument(
+        "-r",
+        "--readers",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="Indices of the PC/SC readers to use (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="bulk_download_report.csv",
+        help="Path of the CSV report with the result and timing of every download (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--skip-notifications",
+        action="store_true",
+        default=False,
+        help="Keep the notifications on the cards instead of processing them",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        required=False,
+        help="Number of notifications sent at the same time to each SM-DP+ (default: one after another)",
+    )
+
+
+def run(args: argparse.Namespace, extended_length: bool | None) -> None:
+    activation_codes = read_activation_codes(args.activation_codes)
+    downloader = BulkDownloader(
+        args.readers,
+        apdu_data_size=args.max_apdu_size,
+        extended_length=extended_length,
+        process_notifications=not args.skip_notifications,
+        notification_concurrency=args.concurrency,
+    )
+    results = downloader.run(activation_codes)
+    write_report(results, args.output)
+
+    table = Table(title=f"Bulk download of {len(results)} profiles")
+    table.add_column("Activation code")
+    table.add_column("Reader")
+    table.add_column("ICCID")
+    table.add_column("Result")
+    table.add_column("Seconds", justify="right")
+    for result in results:
+        if result.error:
+            outcome = f"[red]{result.error}"
+        elif result.notified:
+            outcome = "[green]installed, notified"
+        else:
+            outcome = "[green]installed"
+
+        table.add_row(
+            result.activation_code,
+            "-" if result.device_index is None else str(result.device_index),
+            result.iccid or "-",
+            outcome,
+            "-" if result.seconds is None else f"{result.seconds:.3f}",
+        )
+
+    print(table)
+    installed = sum(result.installed for result in results)
+    print(f"Installed {installed} of {len(results)} profiles, report in {args.output}")
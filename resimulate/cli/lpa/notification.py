@@ -61,6 +61,13 @@ def add_subparser(
         default=False,
         help="Remove the notification after processing",
     )
+    process_parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        required=False,
+        help="Number of notifications sent at the same time to each SM-DP+ (default: one after another)",
+    )
 
     remove_parser: argparse.ArgumentParser = notification_subparser.add_parser(
         "remove",
@@ -91,7 +98,9 @@ def run(args: argparse.Namespace, card: Card) -> None:
         pending_notifications = card.isd_r.retrieve_notification_list()
         if args.all:
             card.isd_r.process_notifications(
-                pending_notifications=pending_notifications, remove=args.remove
+                pending_notifications=pending_notifications,
+                remove=args.remove,
+                concurrency=args.concurrency,
             )
         elif args.sequence_numbers:
             relevant_notifications = [
@@ -102,7 +111,9 @@ def run(args: argparse.Namespace, card: Card) -> None:
             ]
 
             card.isd_r.process_notifications(
-                pending_notifications=relevant_notifications, remove=args.remove
+                pending_notifications=relevant_notifications,
+                remove=args.remove,
+                concurrency=args.concurrency,
             )
         else:
             raise ValueError(
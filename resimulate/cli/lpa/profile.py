@@ -2,12 +2,14 @@ import argparse
 
 from rich import print
 from rich.prompt import Prompt
+from rich.table import Table
 from rich_argparse import RichHelpFormatter
 
 from resimulate.euicc.card import Card
 from resimulate.euicc.models.activation_profile import ActivationProfile
 from resimulate.euicc.models.profile import ProfileClass, ProfileInfoTag
 from resimulate.util.enum_action import EnumAction
+from resimulate.util.timing import StageTimings
 
 
 def add_subparser(
@@ -184,6 +186,16 @@ def add_subparser(
     )
 
 
+def print_timings(timings: StageTimings) -> None:
+    table = Table(title="Download stages")
+    table.add_column("Stage")
+    table.add_column("Seconds", justify="right")
+    for stage, elapsed in timings.stages.items():
+        table.add_row(stage, f"{elapsed:.3f}")
+
+    print(table)
+
+
 def run(args: argparse.Namespace, card: Card) -> None:
     if args.profile_command == "list":
         print(
@@ -220,7 +232,9 @@ def run(args: argparse.Namespace, card: Card) -> None:
                 "Either activation code or SMDP address and matching ID must be provided."
             )
 
-        notification = card.isd_r.download_profile(profile)
+        timings = StageTimings()
+        notification = card.isd_r.download_profile(profile, timings)
+        print_timings(timings)
         process_notification = Prompt.ask(
             "Process notification?", choices=["y", "n"], default="y"
         )
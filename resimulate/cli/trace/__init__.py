@@ -2,18 +2,19 @@ import argparse
 
 from rich_argparse import RichHelpFormatter
 
-from resimulate.cli.trace import record, replay
+from resimulate.cli.trace import decode, record, replay
 
 
 def add_subparser(parent_parser: argparse._SubParsersAction) -> None:
     trace_parser: argparse.ArgumentParser = parent_parser.add_parser(
         "trace",
-        help="Trace-level operations (record, replay)",
+        help="Trace-level operations (record, replay, decode)",
         formatter_class=RichHelpFormatter,
     )
     trace_subparsers = trace_parser.add_subparsers(dest="trace_command", required=True)
     record.add_subparser(trace_subparsers)
     replay.add_subparser(trace_subparsers)
+    decode.add_subparser(trace_subparsers)
 
 
 def run(args: argparse.Namespace) -> None:
@@ -21,5 +22,7 @@ def run(args: argparse.Namespace) -> None:
         record.run(args)
     elif args.trace_command == "replay":
         replay.run(args)
+    elif args.trace_command == "decode":
+        decode.run(args)
     else:
         raise ValueError(f"Unknown trace command: {args.trace_command}")
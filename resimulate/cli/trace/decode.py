@@ -0,0 +1,39 @@
+import argparse
+import os
+
+from rich_argparse import RichHelpFormatter
+
+from resimulate.trace.decode import Decoder
+
+
+def add_subparser(
+    parent_parser: argparse._SubParsersAction,
+) -> None:
+    parser: argparse.ArgumentParser = parent_parser.add_parser(
+        "decode",
+        formatter_class=RichHelpFormatter,
+        help="Decode a raw recording offline.",
+        description="Decode the raw APDUs of a recording (e.g. one captured with 'trace record --raw') into a new recording that can be replayed.",
+    )
+    parser.add_argument(
+        "-i", "--input", required=True, type=argparse.FileType("rb"), help="Input file"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        type=str,
+        help="Output file (e.g. 'commands.apdu')",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes decoding the segments between card resets in parallel. (default: %(default)s)",
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    decoder: Decoder = Decoder(args.workers)
+    decoder.decode(args.input.name, args.output)
@@ -4,6 +4,7 @@ from pySim.apdu_source.gsmtap import GsmtapApduSource
 from rich_argparse import RichHelpFormatter
 
 from resimulate.trace.record import Recorder
+from resimulate.trace.tracer import DEFAULT_BUFFER_SIZE
 from resimulate.util.enums import ISDR_AID
 
 
@@ -46,9 +47,21 @@ def add_subparser(
         default=15,
         help="Timeout in seconds. (default: %(default)s)",
     )
+    parser.add_argument(
+        "-b",
+        "--buffer-size",
+        type=int,
+        default=DEFAULT_BUFFER_SIZE,
+        help="Number of captured APDUs buffered between capture and decoding. If decoding falls behind, the oldest APDUs are dropped. (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--raw",
+        action="store_true",
+        help="Only store the raw APDU bytes and card resets without decoding them. Use 'trace decode' to decode the recording afterwards.",
+    )
 
 
 def run(args: argparse.Namespace) -> None:
     source: GsmtapApduSource = GsmtapApduSource(args.bind_ip, int(args.bind_port))
-    recorder: Recorder = Recorder(source, args.isd_r)
+    recorder: Recorder = Recorder(source, args.isd_r, args.buffer_size, raw=args.raw)
     recorder.record(args.output, args.timeout)
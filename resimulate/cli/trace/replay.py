@@ -27,8 +27,30 @@ def add_subparser(
     parser.add_argument(
         "--mutate", action="store_true", default=False, help="Mutate APDUs"
     )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        default=False,
+        help="Replay to a simulated eUICC instead of the card in the reader",
+    )
+    parser.add_argument(
+        "--from",
+        dest="start",
+        type=int,
+        default=None,
+        help="Index of the first APDU to replay, counting from 0. Negative values count from the end. (default: first APDU)",
+    )
+    parser.add_argument(
+        "--to",
+        dest="stop",
+        type=int,
+        default=None,
+        help="Index of the APDU to stop before (exclusive). (default: replay until the end)",
+    )
 
 
 def run(args: argparse.Namespace) -> None:
-    replayer: Replayer = Replayer(args.pcsc_device, args.target_isd_r, args.mutate)
-    replayer.replay(args.input.name)
+    replayer: Replayer = Replayer(
+        args.pcsc_device, args.target_isd_r, args.mutate, args.simulate
+    )
+    replayer.replay(args.input.name, start=args.start, stop=args.stop)
@@ -1,10 +1,9 @@
 import inspect
 import logging
 
-from osmocom.utils import h2b
 from pySim.utils import sw_match
 
-from resimulate.asn import asn
+from resimulate.asn import codec_cache
 from resimulate.euicc.exceptions import ApduException
 from resimulate.euicc.transport.apdu import APDUPacket
 from resimulate.euicc.transport.pcsc_link import PcscLink
@@ -35,14 +34,14 @@ class Application:
         response_type: str | None = None,
         request_data: dict | None = None,
         caller_func_name: str | None = None,
-    ) -> dict | tuple | str | None:
+    ) -> dict | tuple | bytes | None:
         if request_data is None:
             request_data = dict()
 
         command_encoded = request_data
         if request_type is not None:
             logging.debug(f"Sending request: {request_type}")
-            command_encoded = asn.encode(
+            command_encoded = codec_cache.encode(
                 request_type,
                 request_data,
                 # check_constraints=True,
@@ -52,8 +51,7 @@ class Application:
             raise ValueError("Data too long")
 
         if not caller_func_name:
-            caller_frame = inspect.stack()[1]
-            caller_func_name = caller_frame.function
+            caller_func_name = inspect.currentframe().f_back.f_code.co_name
 
         apdu = APDUPacket(cla=0x80, ins=0xE2, p1=0x91, p2=0x00, data=command_encoded)
         data, sw = self.link.send_apdu_with_mutation(caller_func_name, apdu)
@@ -67,4 +65,4 @@ class Application:
         if response_type is None:
             return data
 
-        return asn.decode(response_type, h2b(data), check_constraints=True)
+        return codec_cache.decode(response_type, data, check_constraints=True)
@@ -5,7 +5,6 @@ from pySim.utils import sw_match
 from resimulate.euicc.applications import Application
 from resimulate.euicc.exceptions import ApduException, EuiccException
 from resimulate.euicc.transport.apdu import APDUPacket
-from resimulate.util import str2ascii
 
 
 class ESTK_FWUPD(Application):
@@ -41,7 +40,7 @@ class ESTK_FWUPD(Application):
         if not sw_match(sw, "9000"):
             raise ApduException(sw)
 
-        return str2ascii(data)
+        return data.decode("latin-1")
 
     def __send_program_block(
         self, block_id: int, data: bytes, validate: bool = False
@@ -1,7 +1,9 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha256
 
 from resimulate.asn import asn
+from resimulate.asn.tlv import Tlv, iter_tlvs
 from resimulate.euicc.applications import Application
 from resimulate.euicc.exceptions import (
     AuthenticateException,
@@ -26,13 +28,20 @@ from resimulate.euicc.models.notification import (
 )
 from resimulate.euicc.models.profile import Profile, ProfileClass, ProfileInfoTag
 from resimulate.euicc.models.reset_option import ResetOption, ResetOptionBitString
-from resimulate.smdp.client import SmdpClient
+from resimulate.smdp.client import SmdpClient, smdp_clients
+from resimulate.smdp.drain import NotificationDrain
 from resimulate.smdp.models import (
     AuthenticateClientResponse,
     GetBoundProfilePackageResponse,
     InitiateAuthenticationResponse,
 )
-from resimulate.util import h2b, i2h
+from resimulate.util import h2b
+from resimulate.util.timing import StageTimings
+
+BOUND_PROFILE_PACKAGE_TAG = 0xBF36
+INITIALISE_SECURE_CHANNEL_TAG = 0xBF23
+# firstSequenceOf87, sequenceOf88 and sequenceOf86, secondSequenceOf87 is optional
+REQUIRED_SEQUENCE_TAGS = (0xA0, 0xA1, 0xA3)
 
 
 class ISDR(Application):
@@ -85,7 +94,7 @@ class ISDR(Application):
         authentication: InitiateAuthenticationResponse,
         matching_id: str,
         imei: str | None = None,
-    ) -> dict:
+    ) -> bytes:
         device_info = {"tac": bytes.fromhex("35290611"), "deviceCapabilities": dict()}
         if imei:
             device_info["imei"] = imei
@@ -112,7 +121,7 @@ class ISDR(Application):
         )
         response = asn.decode(
             "AuthenticateServerResponse",
-            bytes.fromhex(data),
+            data,
             check_constraints=True,
         )
 
@@ -129,7 +138,7 @@ class ISDR(Application):
         self,
         authenticate_client_response: AuthenticateClientResponse,
         confirmation_code: str | None = None,
-    ) -> str:
+    ) -> bytes:
         smdp_signed_2 = authenticate_client_response.smdp_signed_2
         smdp_signed_2_decoded = asn.decode("SmdpSigned2", smdp_signed_2)
         cc_required_flag = smdp_signed_2_decoded.get("ccRequiredFlag")
@@ -153,7 +162,7 @@ class ISDR(Application):
         )
         response = asn.decode(
             "PrepareDownloadResponse",
-            bytes.fromhex(data),
+            data,
             check_constraints=True,
         )
 
@@ -165,26 +174,38 @@ class ISDR(Application):
         return data
 
     def load_bound_profile_package(
-        self, get_bpp_response: GetBoundProfilePackageResponse
+        self,
+        get_bpp_response: GetBoundProfilePackageResponse,
+        timings: StageTimings | None = None,
     ) -> ProfileInstallationResult:
-        bound_profile_package: dict = asn.decode(
-            "BoundProfilePackage",
-            get_bpp_response.bound_profile_package,
-            check_constraints=True,
-        )
-        logging.debug(f"BoundProfilePackage: {bound_profile_package}")
-
-        def send_and_check(
-            data: bytes, label: str | None = None, request_type: str | None = None
-        ) -> dict | None:
-            if label:
-                logging.debug(
-                    f"Sending {label}: {data.hex() if isinstance(data, bytes) else data}"
-                )
+        if timings is None:
+            timings = StageTimings()
+
+        # Segments are views of the package, nothing is copied until sent
+        package = next(iter_tlvs(get_bpp_response.bound_profile_package or b""), None)
+        if package is None or package.tag != BOUND_PROFILE_PACKAGE_TAG:
+            raise EuiccException("Invalid BoundProfilePackage")
 
+        members = {tlv.tag: tlv for tlv in iter_tlvs(package.value)}
+        logging.debug(
+            f"BoundProfilePackage: {len(package.data)} bytes, members {', '.join(f'{tag:X}' for tag in members)}"
+        )
+        # The request is sent along with the header, so it has to come first
+        initialise_secure_channel = next(iter(members.values()), None)
+        if (
+            initialise_secure_channel is None
+            or initialise_secure_channel.tag != INITIALISE_SECURE_CHANNEL_TAG
+        ):
+            raise EuiccException("BoundProfilePackage misses initialiseSecureChannel")
+
+        for tag in REQUIRED_SEQUENCE_TAGS:
+            if tag not in members:
+                raise EuiccException(f"BoundProfilePackage misses member {tag:X}")
+
+        def send_and_check(data: memoryview, label: str) -> dict | None:
+            logging.debug(f"Sending {label}: {len(data)} bytes")
             result = self.store_data(
                 caller_func_name=label,
-                request_type=request_type,
                 response_type="ProfileInstallationResult",
                 request_data=data,
             )
@@ -198,58 +219,42 @@ class ISDR(Application):
 
             return result
 
-        def register_list(data: list[bytes], tag: int):
-            size = sum(len(seq) for seq in data)
-            hex_data = [tag]
-            data_len = len(i2h([size]))
-            if data_len > 2:
-                hex_data.append(0x80 + (data_len - 2))
-
-            hex_data.append(size)
-            self.store_data(request_data=bytes.fromhex(i2h(hex_data)))
+        def register_list(sequence: Tlv):
+            self.store_data(request_data=sequence.header)
 
         # TODO: Move functions to isd-p
+        with timings.measure("load_bound_profile_package"):
+            # Step 1: initialise secure channel, sent with the header of the package
+            send_and_check(
+                package.data[
+                    : package.header_size + len(initialise_secure_channel.data)
+                ],
+                "initialiseSecureChannelRequest",
+            )
 
-        # Step 1: initialise secure channel
-        send_and_check(
-            {
-                "initialiseSecureChannelRequest": bound_profile_package.get(
-                    "initialiseSecureChannelRequest"
-                )
-            },
-            "initialiseSecureChannelRequest",
-            "BoundProfilePackage",
-        )
-
-        # Step 2: Configure ISDP
-        send_and_check(
-            bound_profile_package.get("firstSequenceOf87"),
-            "firstSequenceOf87",
-        )
-
-        # Step 3: Store Metadata
-        sequence_of_88 = bound_profile_package.get("sequenceOf88")
-        register_list(sequence_of_88, 0xA1)
-        for index, sequence in enumerate(sequence_of_88):
-            send_and_check(sequence, f"sequenceOf88_{index + 1}")
-
-        # Step 4: Replace Session Keys (optional)
-        if second_sequence := bound_profile_package.get("secondSequenceOf87"):
-            register_list(second_sequence, 0xA2)
-            for index, sequence in enumerate(second_sequence):
-                send_and_check(
-                    sequence,
-                    f"secondSequenceOf87_{index + 1}",
+            # Step 2: Configure ISDP
+            send_and_check(members[0xA0].data, "firstSequenceOf87")
+
+            # Step 3: Store Metadata
+            register_list(members[0xA1])
+            for index, sequence in enumerate(iter_tlvs(members[0xA1].value)):
+                send_and_check(sequence.data, f"sequenceOf88_{index + 1}")
+
+            # Step 4: Replace Session Keys (optional)
+            if second_sequence := members.get(0xA2):
+                register_list(second_sequence)
+                for index, sequence in enumerate(iter_tlvs(second_sequence.value)):
+                    send_and_check(sequence.data, f"secondSequenceOf87_{index + 1}")
+
+            # Step 5: load profile elements
+            register_list(members[0xA3])
+            final_result = None
+            for index, sequence in enumerate(iter_tlvs(members[0xA3].value)):
+                final_result = send_and_check(
+                    sequence.data, f"sequenceOf86_{index + 1}"
                 )
 
-        # Step 5: load profile elements
-        sequence_of_86 = bound_profile_package.get("sequenceOf86")
-        register_list(sequence_of_86, 0xA3)
-        final_result = None
-        for index, sequence in enumerate(sequence_of_86):
-            final_result = send_and_check(sequence, f"sequenceOf86_{index + 1}")
-
-        return ProfileInstallationResult(**final_result)
+            return ProfileInstallationResult(**final_result)
 
     def enable_profile(
         self,
@@ -465,14 +470,26 @@ class ISDR(Application):
         self,
         pending_notifications: list[PendingNotification],
         remove: bool = True,
+        concurrency: int | None = None,
     ) -> list[int]:
+        """Sends the notifications to their SM-DP+ and removes them from the card.
+
+        Args:
+            concurrency (int | None, optional): Notifications posted at the same
+                time to each SM-DP+. The card is still accessed one notification at
+                a time. None sends the notifications one after another.
+        """
+        if concurrency is not None:
+            return NotificationDrain(concurrency, verify_ssl=False).run(
+                pending_notifications,
+                self.__remove_sent_notification if remove else None,
+            )
+
         processed_notification_seq_numbers = []
         for pending_notification in pending_notifications:
             notification = pending_notification.get_notification()
 
-            smdp_client = SmdpClient(
-                smdp_address=notification.address, verify_ssl=False
-            )
+            smdp_client = smdp_clients.get(notification.address, verify_ssl=False)
             logging.debug(f"Processing notification from {notification.address}")
 
             try:
@@ -488,6 +505,15 @@ class ISDR(Application):
 
         return processed_notification_seq_numbers
 
+    def __remove_sent_notification(self, seq_number: int) -> bool:
+        try:
+            self.remove_notification(seq_number)
+        except NotificationException as e:
+            logging.error(f"Failed to remove notification {seq_number}: {e}")
+            return False
+
+        return True
+
     def set_nickname(self, iccid: str, nickname: str) -> bool:
         response = self.store_data(
             "SetNicknameRequest",
@@ -554,30 +580,66 @@ class ISDR(Application):
 
         return True
 
-    def download_profile(self, profile: ActivationProfile) -> ProfileInstallationResult:
+    def download_profile(
+        self, profile: ActivationProfile, timings: StageTimings | None = None
+    ) -> ProfileInstallationResult:
+        """Downloads the profile from its SM-DP+ and installs it.
+
+        The card and the network take turns, except at the start: the connection
+        to the SM-DP+ is opened in the background while the card is asked for the
+        challenge and EUICCInfo1.
+
+        Args:
+            timings (StageTimings | None, optional): Collects the seconds spent in
+                every stage of the download.
+        """
+        if timings is None:
+            timings = StageTimings()
+
         smdp_address = profile.smdp_address
         if not smdp_address:
-            smdp_address = self.get_configured_data().default_dp_address
+            with timings.measure("get_configured_data"):
+                smdp_address = self.get_configured_data().default_dp_address
 
-        smdp_client = SmdpClient(smdp_address=smdp_address, verify_ssl=False)
+        smdp_client = smdp_clients.get(smdp_address, verify_ssl=False)
 
         logging.debug(f"Downloading profile from {smdp_address}")
-        euicc_challenge = self.get_euicc_challenge()
-        euicc_info_1 = self.get_euicc_info_1()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            connected = executor.submit(self.__preconnect, smdp_client, timings)
+            with timings.measure("get_euicc_info"):
+                euicc_challenge = self.get_euicc_challenge()
+                euicc_info_1 = self.get_euicc_info_1()
 
-        init_auth = smdp_client.initiate_authentication(euicc_challenge, euicc_info_1)
+            connected.result()
+
+        with timings.measure("initiate_authentication"):
+            init_auth = smdp_client.initiate_authentication(
+                euicc_challenge, euicc_info_1
+            )
         transaction_id = init_auth.transaction_id
 
-        authenticate_server = self.authenticate_server(init_auth, profile.matching_id)
-        authenticate_client = smdp_client.authenticate_client(
-            transaction_id, authenticate_server
-        )
-        prepare_download = self.prepare_download(
-            authenticate_client, profile.confirmation_code
-        )
-        get_bpp_response = smdp_client.get_bound_profile_package(
-            transaction_id,
-            prepare_download,
-        )
-        notification = self.load_bound_profile_package(get_bpp_response)
+        with timings.measure("authenticate_server"):
+            authenticate_server = self.authenticate_server(
+                init_auth, profile.matching_id
+            )
+        with timings.measure("authenticate_client"):
+            authenticate_client = smdp_client.authenticate_client(
+                transaction_id, authenticate_server
+            )
+        with timings.measure("prepare_download"):
+            prepare_download = self.prepare_download(
+                authenticate_client, profile.confirmation_code
+            )
+        with timings.measure("get_bound_profile_package"):
+            get_bpp_response = smdp_client.get_bound_profile_package(
+                transaction_id,
+                prepare_download,
+            )
+        notification = self.load_bound_profile_package(get_bpp_response, timings)
+        logging.info(f"Downloaded profile from {smdp_address}: {timings}")
         return notification
+
+    @staticmethod
+    def __preconnect(smdp_client: SmdpClient, timings: StageTimings):
+        with timings.measure("connect"):
+            smdp_client.preconnect()
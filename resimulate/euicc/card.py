@@ -48,7 +48,7 @@ class Card:
         apdu = APDUPacket(
             cla=cla_byte, ins=0xA4, p1=0x04, p2=0x0C, data=bytes.fromhex(adf)
         )
-        self.link.send_apdu_checksw(apdu.to_hex(), "9000")
+        self.link.send_bytes_checksw(apdu.to_bytes(), "9000")
         logging.debug("Selected ADF %s", adf)
 
     def select_application(self, application_cls: Type[Application]) -> Application:
@@ -1,4 +1,4 @@
-from copy import deepcopy
+from dataclasses import replace
 
 from resimulate.euicc.mutation.engine import MutationEngine
 from resimulate.euicc.mutation.types import MutationType
@@ -66,7 +66,7 @@ class DeterministicMutationEngine(MutationEngine):
         mutation_type: MutationType,
     ) -> APDUPacket:
         data = bytearray(apdu.data)
-        mutated_apdu = deepcopy(apdu)
+        mutated_apdu = replace(apdu)
 
         match mutation_type:
             case MutationType.BITFLIP:
@@ -85,3 +85,14 @@ class DeterministicMutationEngine(MutationEngine):
                 mutated_apdu.data = self.truncate(data)
 
         return mutated_apdu
+
+    def mutate_batch(
+        self,
+        apdu: APDUPacket,
+        mutation_type: MutationType,
+        count: int,
+        start: int = 0,
+    ) -> list[APDUPacket]:
+        # Every mutant of the deterministic engine is the same
+        mutated_apdu = self.mutate(apdu, mutation_type)
+        return [replace(mutated_apdu) for _ in range(count)]
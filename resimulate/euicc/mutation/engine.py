@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 
+from resimulate.euicc.mutation.types import MutationType
 from resimulate.euicc.transport.apdu import APDUPacket
 
 
@@ -14,5 +15,19 @@ class MutationEngine(ABC):
     def mutate(
         self,
         apdu: APDUPacket,
+        mutation_type: MutationType,
     ) -> APDUPacket:
         raise NotImplementedError("This method should be overridden in subclasses.")
+
+    def mutate_batch(
+        self,
+        apdu: APDUPacket,
+        mutation_type: MutationType,
+        count: int,
+        start: int = 0,
+    ) -> list[APDUPacket]:
+        """Returns count mutants of the APDU, e.g. to pre-generate a pool of
+        candidates. Engines override this to make mutant i of a batch mutant
+        start + i of the engine, or to generate the batch at once. By default the
+        mutants are mutated one after another and start is ignored."""
+        return [self.mutate(apdu, mutation_type) for _ in range(count)]
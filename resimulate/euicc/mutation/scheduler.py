@@ -0,0 +1,95 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+from resimulate.euicc.mutation.types import MutationType
+
+# Tries a mutation of an operation gets without uncovering a new behaviour
+BASE_ENERGY = 4
+MAX_ENERGY = 64
+
+
+@dataclass
+class MutationStats:
+    tries: int = 0
+    finds: int = 0
+    tries_since_find: int = 0
+
+
+class MutationScheduler:
+    """Schedules the mutations by the new card behaviour they uncover.
+
+    A behaviour is a status word, a response length or a failure which was not
+    seen for the operation before. Like the power schedules of AFL, every
+    (operation, mutation) pair gets an energy, which is doubled for every new
+    behaviour it found. A pair which used up its energy without finding anything
+    new is capped and no longer tried. NONE is never capped, it continues the
+    scenario to the following operations.
+    """
+
+    def __init__(self, base_energy: int = BASE_ENERGY, max_energy: int = MAX_ENERGY):
+        self.base_energy = base_energy
+        self.max_energy = max_energy
+        self.stats: dict[tuple[str, MutationType], MutationStats] = defaultdict(
+            MutationStats
+        )
+        self.behaviours: dict[str, set[tuple[str, str | int]]] = defaultdict(set)
+
+    def score(self, func_name: str, mutation_type: MutationType) -> float:
+        """Share of the tries of the pair which found a new behaviour."""
+        stats = self.stats[func_name, mutation_type]
+        return (stats.finds + 1) / (stats.tries + 2)
+
+    def energy(self, func_name: str, mutation_type: MutationType) -> int:
+        stats = self.stats[func_name, mutation_type]
+        return min(self.max_energy, self.base_energy * 2**stats.finds)
+
+    def is_capped(self, func_name: str, mutation_type: MutationType) -> bool:
+        if mutation_type is MutationType.NONE:
+            return False
+
+        stats = self.stats[func_name, mutation_type]
+        return stats.tries_since_find >= self.energy(func_name, mutation_type)
+
+    def choose(self, func_name: str, mutation_types: set[MutationType]) -> MutationType:
+        """Returns the mutation with the highest score, in order of MutationType on
+        ties."""
+        return max(
+            sorted(mutation_types),
+            key=lambda mutation_type: self.score(func_name, mutation_type),
+        )
+
+    def seed(self, func_name: str, *behaviours: tuple[str, str | int]):
+        """Marks behaviours as known, e.g. from the corpus of a previous campaign."""
+        self.behaviours[func_name].update(behaviours)
+
+    def count_try(self, func_name: str, mutation_type: MutationType):
+        stats = self.stats[func_name, mutation_type]
+        stats.tries += 1
+        stats.tries_since_find += 1
+
+    def observe(
+        self,
+        func_name: str,
+        mutation_type: MutationType,
+        *behaviours: tuple[str, str | int],
+    ) -> bool:
+        """Records the behaviours of a try. Returns True if one of them is new."""
+        seen = self.behaviours[func_name]
+        new_behaviours = [b for b in behaviours if b not in seen]
+        if not new_behaviours:
+            return False
+
+        seen.update(new_behaviours)
+        stats = self.stats[func_name, mutation_type]
+        stats.finds += 1
+        stats.tries_since_find = 0
+        logging.debug(
+            f"{mutation_type} of {func_name} uncovered {new_behaviours}, energy {self.energy(func_name, mutation_type)}"
+        )
+        return True
+
+    def __str__(self) -> str:
+        behaviours = sum(len(seen) for seen in self.behaviours.values())
+        tries = sum(stats.tries for stats in self.stats.values())
+        return f"{behaviours} behaviours in {tries} tries"
@@ -0,0 +1,449 @@
+import logging
+import random
+from collections.abc import Callable, Iterator
+from dataclasses import replace
+from functools import cache
+from typing import Any
+
+from resimulate.asn import asn, codec_cache
+from resimulate.asn.tlv import read_header
+from resimulate.euicc.mutation.engine import MutationEngine
+from resimulate.euicc.mutation.random_engine import RandomMutationEngine
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.transport.apdu import APDUPacket
+
+STORE_DATA_INS = 0xE2
+# Candidates tried before giving the APDU to the fallback engine
+MAX_ATTEMPTS = 8
+MAX_DEFAULT_DEPTH = 8
+
+INTEGER_BOUNDARIES = (
+    0,
+    1,
+    -1,
+    127,
+    128,
+    255,
+    256,
+    -128,
+    -129,
+    32767,
+    32768,
+    65535,
+    65536,
+    2**31 - 1,
+    2**31,
+    2**32 - 1,
+    2**63 - 1,
+    2**64,
+)
+STRING_TYPES = {
+    "UTF8String",
+    "NumericString",
+    "PrintableString",
+    "IA5String",
+    "VisibleString",
+    "GeneralString",
+    "BMPString",
+    "GraphicString",
+    "UniversalString",
+    "TeletexString",
+}
+
+# A path leads from the decoded value to one of its fields, e.g. a member name,
+# a list index or the index of the value in a CHOICE tuple
+Path = tuple[str | int, ...]
+
+
+@cache
+def get_request_types() -> dict[bytes, str]:
+    """Maps the tags of the RSP requests to their type names. Only types with a
+    context or application specific tag are unambiguous, types named *Request win
+    over the other types with the same tag."""
+    request_types = {}
+    types = sorted(
+        asn.modules["RSPDefinitions"].items(),
+        key=lambda item: (not item[0].endswith("Request"), item[0]),
+    )
+    for type_name, compiled_type in types:
+        tag = compiled_type.type.tag
+        if tag and tag[0] & 0xC0:
+            request_types.setdefault(bytes(tag), type_name)
+
+    return request_types
+
+
+def get_tlv_headers(data: bytes) -> list[tuple[int, int, int]]:
+    """Walks the BER TLVs of the data, including the nested ones.
+
+    Returns:
+        list[tuple[int, int, int]]: Offset and size of the length field and the
+            decoded length of every TLV.
+
+    Raises:
+        ValueError: If the data is no valid definite length BER.
+    """
+    headers = []
+    ranges = [(0, len(data))]
+    while ranges:
+        offset, end = ranges.pop()
+        while offset < end:
+            tag_end, value_offset, length = read_header(data, offset, end)
+            headers.append((tag_end, value_offset - tag_end, length))
+            if data[offset] & 0x20:
+                ranges.append((value_offset, value_offset + length))
+            offset = value_offset + length
+
+    return headers
+
+
+def encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+
+    size = (length.bit_length() + 7) // 8
+    return bytes([0x80 | size]) + length.to_bytes(size)
+
+
+def unwrap(asn_type):
+    # Explicit tags and recursive references only wrap the actual type
+    while asn_type.type_name in ("ExplicitTag", "RECURSIVE"):
+        asn_type = asn_type.inner
+
+    return asn_type
+
+
+def get_members(asn_type) -> list:
+    members = list(getattr(asn_type, "root_members", None) or [])
+    for addition in getattr(asn_type, "additions", None) or []:
+        members.extend(addition if isinstance(addition, list) else [addition])
+
+    return members
+
+
+class StructureMutationEngine(MutationEngine):
+    """Mutates the ASN.1 structure of STORE DATA payloads instead of their bytes.
+
+    The payload is decoded with the request type of its tag, one field of the
+    decoded value is mutated and the value is encoded again. The mutant passes the
+    TLV parser of the card and reaches the logic behind it. The mutation types
+    keep their meaning on the structure:
+
+    - BITFLIP flips a bit of a field value
+    - RANDOM_BYTE replaces a field value with a boundary value
+    - ZERO_BLOCK changes the length of a field value
+    - SHUFFLE_BLOCKS switches a CHOICE alternative, changes the number of elements
+      of a SEQUENCE OF or adds or drops an optional member
+    - TRUNCATE rewrites a length field on the TLV layer, the content is kept
+
+    STORE DATA requests without a field for the mutation get a TLV length
+    mutation. APDUs which are no STORE DATA requests or no valid BER are mutated
+    by the fallback engine.
+    """
+
+    def __init__(
+        self,
+        mutation_rate: float = 0.01,
+        seed: int | float | str | bytes | bytearray | None = None,
+        fallback: MutationEngine | None = None,
+    ):
+        self.mutation_rate = mutation_rate
+        self.random = random.Random(seed)
+        self.fallback = fallback or RandomMutationEngine(mutation_rate, seed)
+
+    def mutate(
+        self,
+        apdu: APDUPacket,
+        mutation_type: MutationType,
+    ) -> APDUPacket:
+        if mutation_type is MutationType.NONE:
+            return replace(apdu)
+
+        data = None
+        if apdu.ins == STORE_DATA_INS and apdu.data:
+            if mutation_type is not MutationType.TRUNCATE:
+                data = self.mutate_structure(apdu.data, mutation_type)
+
+            if data is None:
+                # Keeps the tags intact, unlike the byte mutations of the fallback
+                data = self.mutate_tlv_length(apdu.data)
+
+        if data is None:
+            return self.fallback.mutate(apdu, mutation_type)
+
+        return replace(apdu, data=data)
+
+    def mutate_structure(
+        self, data: bytes, mutation_type: MutationType
+    ) -> bytes | None:
+        """Returns the payload with one mutated field, or None if the payload is
+        not a known request or no field could be mutated."""
+        type_name = self.get_type_name(data)
+        if type_name is None:
+            return None
+
+        try:
+            value = codec_cache.decode(type_name, data)
+        except Exception as e:
+            logging.debug(f"Could not decode {type_name} for mutation: {e}")
+            return None
+
+        mutator = {
+            MutationType.BITFLIP: self.flip_value,
+            MutationType.RANDOM_BYTE: self.boundary_value,
+            MutationType.ZERO_BLOCK: self.resize_value,
+            MutationType.SHUFFLE_BLOCKS: self.restructure_value,
+        }[mutation_type]
+
+        fields = list(self.__walk(asn.types[type_name].type, value))
+        self.random.shuffle(fields)
+        attempts = 0
+        for path, asn_type, field_value in fields:
+            mutated_value = mutator(asn_type, field_value)
+            if mutated_value is None:
+                continue
+
+            try:
+                encoded = asn.encode(
+                    type_name, self.__set_value(value, path, mutated_value)
+                )
+            except Exception as e:
+                logging.debug(f"Mutant of {type_name} does not encode: {e}")
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS:
+                    break
+                continue
+
+            if encoded != data:
+                logging.debug(f"Mutated {type_name} at {'.'.join(map(str, path))}")
+                return bytes(encoded)
+
+        return None
+
+    def mutate_tlv_length(self, data: bytes) -> bytes | None:
+        """Returns the payload with one length field which does not match its
+        value, or which is not encoded in its shortest form."""
+        try:
+            headers = get_tlv_headers(data)
+        except ValueError as e:
+            logging.debug(f"Could not walk the TLVs for mutation: {e}")
+            return None
+
+        offset, size, length = self.random.choice(headers)
+        original = data[offset : offset + size]
+        # Candidates equal to the original field would leave the payload unmutated
+        candidates = [
+            length_field
+            for length_field in (
+                encode_length(length + 1),
+                encode_length(max(0, length - 1)) if length else b"\x01",
+                b"\x00",
+                # Not the shortest form, DER forbids it
+                (b"\x82" + length.to_bytes(2)) if length < 0x10000 else b"\x80",
+                # Indefinite length without end-of-contents octets
+                b"\x80",
+                b"\x84\xff\xff\xff\xff",
+            )
+            if length_field != original
+        ]
+        if not candidates:
+            return None
+
+        length_field = self.random.choice(candidates)
+        return data[:offset] + length_field + data[offset + size :]
+
+    def get_type_name(self, data: bytes) -> str | None:
+        tag_end = 1
+        if data[0] & 0x1F == 0x1F:
+            while tag_end < len(data) and data[tag_end] & 0x80:
+                tag_end += 1
+            tag_end += 1
+
+        return get_request_types().get(bytes(data[:tag_end]))
+
+    def flip_value(self, asn_type, value: Any) -> Any:
+        if isinstance(value, bool):
+            return not value
+        if isinstance(value, int):
+            return value ^ (1 << self.random.randrange(max(8, value.bit_length())))
+        if isinstance(value, bytes) and value:
+            return self.__flip_bit(value)
+        if asn_type.type_name == "BIT STRING" and value[0]:
+            return self.__flip_bit(value[0]), value[1]
+        if asn_type.type_name in STRING_TYPES and value:
+            index = self.random.randrange(len(value))
+            char = chr(ord(value[index]) ^ (1 << self.random.randrange(7)))
+            return value[:index] + char + value[index + 1 :]
+
+        return None
+
+    def boundary_value(self, asn_type, value: Any) -> Any:
+        if isinstance(value, bool):
+            return not value
+        if isinstance(value, int):
+            return self.random.choice(INTEGER_BOUNDARIES)
+        if isinstance(value, bytes) and value:
+            return self.__fill(len(value))
+        if asn_type.type_name == "BIT STRING" and value[0]:
+            return self.__fill(len(value[0])), value[1]
+        if asn_type.type_name == "ENUMERATED":
+            names = [name for name in asn_type.data_to_value if name != value]
+            return self.random.choice(names) if names else None
+        if asn_type.type_name in STRING_TYPES and value:
+            return self.__fill(len(value)).decode("latin-1")
+
+        return None
+
+    def resize_value(self, asn_type, value: Any) -> Any:
+        if isinstance(value, bytes):
+            return self.__fill(self.__resize(len(value)), value)
+        if asn_type.type_name == "BIT STRING":
+            data = self.__fill(self.__resize(len(value[0])), value[0])
+            return data, len(data) * 8
+        if asn_type.type_name in STRING_TYPES:
+            length = self.__resize(len(value))
+            return ((value or "A") * (length + 1))[:length]
+
+        return None
+
+    def restructure_value(self, asn_type, value: Any) -> Any:
+        if asn_type.type_name == "CHOICE":
+            alternatives = [m for m in asn_type.members if m.name != value[0]]
+            if not alternatives:
+                return None
+
+            member = self.random.choice(alternatives)
+            try:
+                return member.name, self.__get_default(member)
+            except ValueError:
+                # Keep the value, it encodes if the alternatives are alike
+                return member.name, value[1]
+
+        if isinstance(value, list):
+            elements = list(value)
+            if elements and self.random.random() < 0.5:
+                index = self.random.randrange(len(elements))
+                if self.random.random() < 0.5:
+                    del elements[index]
+                else:
+                    elements[index:index] = [elements[index]] * self.random.randint(
+                        1, 16
+                    )
+            else:
+                elements = [] if elements else None
+            return elements
+
+        if isinstance(value, dict):
+            members = get_members(asn_type)
+            optional = [m for m in members if m.optional or m.has_default()]
+            if not optional:
+                return None
+
+            member = self.random.choice(optional)
+            mutated_value = dict(value)
+            if member.name in mutated_value:
+                del mutated_value[member.name]
+            else:
+                try:
+                    mutated_value[member.name] = self.__get_default(member)
+                except ValueError:
+                    return None
+            return mutated_value
+
+        return None
+
+    def __walk(self, asn_type, value: Any, path: Path = ()) -> Iterator:
+        asn_type = unwrap(asn_type)
+        yield path, asn_type, value
+
+        if asn_type.type_name == "CHOICE" and isinstance(value, tuple):
+            member = asn_type.name_to_member.get(value[0])
+            if member is not None:
+                yield from self.__walk(member, value[1], path + (1,))
+
+        elif isinstance(value, dict):
+            members = {member.name: member for member in get_members(asn_type)}
+            for name, member_value in value.items():
+                if name in members:
+                    yield from self.__walk(members[name], member_value, path + (name,))
+
+        elif isinstance(value, list) and hasattr(asn_type, "element_type"):
+            for index, element in enumerate(value):
+                yield from self.__walk(asn_type.element_type, element, path + (index,))
+
+    def __set_value(self, value: Any, path: Path, field_value: Any) -> Any:
+        """Returns the value with the field at the path replaced. Only the
+        containers on the path are copied."""
+        if not path:
+            return field_value
+
+        key, rest = path[0], path[1:]
+        if isinstance(value, tuple):
+            return value[:key] + (self.__set_value(value[key], rest, field_value),)
+
+        copied_value = value.copy()
+        copied_value[key] = self.__set_value(value[key], rest, field_value)
+        return copied_value
+
+    def __get_default(self, asn_type, depth: int = 0) -> Any:
+        """Returns the smallest value of the type.
+
+        Raises:
+            ValueError: If the type has no default, e.g. it is too deeply nested.
+        """
+        asn_type = unwrap(asn_type)
+        if depth > MAX_DEFAULT_DEPTH:
+            raise ValueError(f"{asn_type.name} is nested too deeply")
+
+        defaults: dict[str, Callable[[], Any]] = {
+            "INTEGER": lambda: 0,
+            "BOOLEAN": lambda: False,
+            "NULL": lambda: None,
+            "OCTET STRING": lambda: b"",
+            "BIT STRING": lambda: (b"", 0),
+            "OBJECT IDENTIFIER": lambda: "1.2",
+            "SEQUENCE OF": list,
+            "SET OF": list,
+        }
+        type_name = asn_type.type_name
+        if type_name in defaults:
+            return defaults[type_name]()
+        if type_name in STRING_TYPES:
+            return ""
+        if type_name == "ENUMERATED":
+            return next(iter(asn_type.data_to_value))
+        if type_name == "CHOICE":
+            member = asn_type.members[0]
+            return member.name, self.__get_default(member, depth + 1)
+        if type_name in ("SEQUENCE", "SET"):
+            return {
+                member.name: self.__get_default(member, depth + 1)
+                for member in get_members(asn_type)
+                if not member.optional and not member.has_default()
+            }
+
+        raise ValueError(f"No default value for {type_name}")
+
+    def __resize(self, length: int) -> int:
+        return self.random.choice(
+            [0, max(0, length - 1), length + 1, length * 2, 127, 128, 255, 256]
+        )
+
+    def __fill(self, length: int, data: bytes = b"") -> bytes:
+        if data:
+            return (data * (length // len(data) + 1))[:length]
+
+        fill = self.random.choice([b"\x00", b"\xff", None])
+        if fill is None:
+            return self.random.randbytes(length)
+        return fill * length
+
+    def __flip_bit(self, data: bytes) -> bytes:
+        mutated_data = bytearray(data)
+        num_flips = max(1, int(len(data) * self.mutation_rate))
+        for _ in range(num_flips):
+            mutated_data[self.random.randrange(len(data))] ^= (
+                1 << self.random.randrange(8)
+            )
+
+        return bytes(mutated_data)
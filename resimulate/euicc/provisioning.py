@@ -0,0 +1,222 @@
+import csv
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+from resimulate.euicc.card import Card
+from resimulate.euicc.models.activation_profile import ActivationProfile
+from resimulate.euicc.models.notification import ProfileInstallationResult
+from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.exceptions import PcscError
+from resimulate.smdp.client import smdp_clients
+from resimulate.util.timing import StageTimings
+
+REPORT_FIELDS = (
+    "activation_code",
+    "device_index",
+    "eid",
+    "iccid",
+    "seq_number",
+    "installed",
+    "notified",
+    "error",
+    "seconds",
+    "stages",
+)
+
+
+@dataclass
+class DownloadResult:
+    activation_code: str
+    device_index: int | None = None
+    eid: str | None = None
+    iccid: str | None = None
+    seq_number: int | None = None
+    notified: bool = False
+    error: str | None = None
+    # Wall clock time of the download, stages like connect overlap others
+    seconds: float | None = None
+    timings: StageTimings = field(default_factory=StageTimings)
+
+    @property
+    def installed(self) -> bool:
+        return self.seq_number is not None
+
+    def to_row(self) -> dict:
+        return {
+            "activation_code": self.activation_code,
+            "device_index": self.device_index,
+            "eid": self.eid,
+            "iccid": self.iccid,
+            "seq_number": self.seq_number,
+            "installed": self.installed,
+            "notified": self.notified,
+            "error": self.error,
+            "seconds": None if self.seconds is None else f"{self.seconds:.3f}",
+            "stages": str(self.timings),
+        }
+
+
+def read_activation_codes(file_path: str) -> list[tuple[str, str | None]]:
+    """Reads the activation codes and optional confirmation codes of a CSV file,
+    one profile per row. A header row and empty rows are skipped."""
+    activation_codes = []
+    with open(file_path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].strip() == "activation_code":
+                continue
+
+            confirmation_code = row[1].strip() if len(row) > 1 else ""
+            activation_codes.append((row[0].strip(), confirmation_code or None))
+
+    return activation_codes
+
+
+def write_report(results: list[DownloadResult], file_path: str):
+    with open(file_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(result.to_row() for result in results)
+
+
+class BulkDownloader:
+    """Downloads many profiles onto the cards of several readers at once.
+
+    Every reader gets a worker thread which takes the next profile as soon as its
+    card is done with the previous one. The threads share the SM-DP+ clients, so
+    the connections to a server are reused across the cards. The notifications
+    of a card are sent after all of its downloads.
+    """
+
+    def __init__(
+        self,
+        device_indices: list[int],
+        apdu_data_size: int = 255,
+        extended_length: bool | None = None,
+        process_notifications: bool = True,
+        notification_concurrency: int | None = None,
+    ):
+        self.device_indices = device_indices
+        self.apdu_data_size = apdu_data_size
+        self.extended_length = extended_length
+        self.process_notifications = process_notifications
+        self.notification_concurrency = notification_concurrency
+
+    def run(
+        self, activation_codes: list[tuple[str, str | None]]
+    ) -> list[DownloadResult]:
+        """
+        Args:
+            activation_codes (list[tuple[str, str | None]]): Activation code and
+                confirmation code of every profile.
+
+        Returns:
+            list[DownloadResult]: The results in the order of the activation codes.
+        """
+        results = [
+            DownloadResult(activation_code) for activation_code, _ in activation_codes
+        ]
+        profiles: queue.Queue[tuple[DownloadResult, ActivationProfile]] = queue.Queue()
+        for result, (activation_code, confirmation_code) in zip(
+            results, activation_codes
+        ):
+            try:
+                profile = ActivationProfile.from_activation_code(activation_code)
+            except (ValueError, AssertionError):
+                result.error = "Invalid activation code"
+                continue
+
+            profile.confirmation_code = confirmation_code
+            profiles.put((result, profile))
+
+        # Every reader may wait for the same SM-DP+, none must time out on the pool
+        smdp_clients.reserve(len(self.device_indices))
+        workers = [
+            threading.Thread(
+                target=self.__work,
+                args=(device_index, profiles),
+                name=f"reader-{device_index}",
+            )
+            for device_index in self.device_indices
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # Left over if every reader failed
+        while not profiles.empty():
+            result, _ = profiles.get_nowait()
+            result.error = "No reader available"
+
+        return results
+
+    def __work(self, device_index: int, profiles: queue.Queue):
+        try:
+            link = PcscLink(
+                device_index=device_index,
+                apdu_data_size=self.apdu_data_size,
+                extended_length=self.extended_length,
+            )
+            link.connect()
+            card = Card(link)
+            eid = card.isd_r.get_eid()
+        except Exception as e:
+            logging.error(f"Failed to open the card of reader {device_index}: {e}")
+            return
+
+        logging.info(f"Reader {device_index} holds eUICC {eid}")
+        notifications: dict[int, tuple[DownloadResult, ProfileInstallationResult]] = {}
+        try:
+            while True:
+                try:
+                    result, profile = profiles.get_nowait()
+                except queue.Empty:
+                    break
+
+                result.device_index = device_index
+                result.eid = eid
+                start = time.perf_counter()
+                try:
+                    notification = card.isd_r.download_profile(profile, result.timings)
+                except Exception as e:
+                    result.error = f"{e.__class__.__name__}: {e}"
+                    logging.error(
+                        f"Failed to download {result.activation_code} on reader {device_index}: {e}"
+                    )
+                    if isinstance(e, PcscError):
+                        # The card is gone, the other readers take the rest
+                        break
+                    continue
+                finally:
+                    result.seconds = time.perf_counter() - start
+
+                result.seq_number = notification.get_notification().seq_number
+                result.iccid = notification.get_notification().iccid
+                notifications[result.seq_number] = (result, notification)
+
+            if self.process_notifications and notifications:
+                self.__notify(card, notifications)
+        finally:
+            link.disconnect()
+
+    def __notify(
+        self,
+        card: Card,
+        notifications: dict[int, tuple[DownloadResult, ProfileInstallationResult]],
+    ):
+        try:
+            seq_numbers = card.isd_r.process_notifications(
+                [notification for _, notification in notifications.values()],
+                remove=True,
+                concurrency=self.notification_concurrency,
+            )
+        except Exception as e:
+            logging.error(f"Failed to process the notifications of {card.name}: {e}")
+            return
+
+        for seq_number in seq_numbers:
+            result, _ = notifications[seq_number]
+            result.notified = True
@@ -0,0 +1,51 @@
+import logging
+import os
+import pickle
+from dataclasses import dataclass, field
+
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.recorder.recorder import OperationRecorder
+from resimulate.exceptions import RecorderException
+
+
+@dataclass
+class Checkpoint:
+    """Intermediate state of a recording, written between two scenario runs."""
+
+    recorder: OperationRecorder
+    runs: int = 0
+    # Paths to the mutations which were being tried on a farm while checkpointing
+    pending: list[list[MutationType]] = field(default_factory=list)
+
+    def save(self, file_path: str):
+        # An interrupted write must never replace the previous checkpoint
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, file_path)
+        logging.debug(f"Saved checkpoint after {self.runs} runs to {file_path}")
+
+    @staticmethod
+    def load(file_path: str) -> "Checkpoint":
+        try:
+            with open(file_path, "rb") as f:
+                checkpoint = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            raise RecorderException(f"Could not load checkpoint {file_path}: {e}")
+
+        if not isinstance(checkpoint, Checkpoint):
+            raise RecorderException(f"{file_path} does not contain a checkpoint")
+
+        # The pending mutations have no recording yet, they are tried again
+        root = checkpoint.recorder.root
+        for path in checkpoint.pending:
+            node = root.get_node(path[:-1])
+            if node is not None:
+                node.release_mutation(path[-1])
+        checkpoint.pending = []
+
+        checkpoint.recorder.reset()
+        logging.debug(
+            f"Loaded checkpoint after {checkpoint.runs} runs from {file_path}"
+        )
+        return checkpoint
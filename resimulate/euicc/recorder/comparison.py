@@ -0,0 +1,156 @@
+import gc
+import logging
+import multiprocessing
+import os
+import pickle
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.recorder.operation import MutationTreeNode
+from resimulate.euicc.recorder.recorder import OperationRecorder
+
+# Operations and mutations leading from the root to a node
+TreePath = tuple[tuple[str, MutationType], ...]
+# Status word and failure reason of a node
+Outcome = tuple[str | None, str | None]
+
+
+@dataclass
+class TreeDiff:
+    """Divergent paths of the mutation trees of several cards for one scenario.
+
+    Every row holds the outcome of the path on each card, or None if the card
+    never reached it. A path diverges if the cards which reached it disagree.
+    """
+
+    scenario_name: str
+    card_names: list[str]
+    paths: int = 0
+    rows: list[tuple[TreePath, list[Outcome | None]]] = field(default_factory=list)
+
+
+class PathTable:
+    """Flat table of the outcomes of several trees, one row per path and one column
+    per tree.
+
+    Paths are interned: a row is keyed by the row of its parent node, the operation
+    and the mutation, so indexing a node costs the same at any depth.
+    """
+
+    def __init__(self, columns: int):
+        self.columns = columns
+        self.keys: dict[tuple[int, str, str], int] = {}
+        # Parent row, operation and mutation of every row, the root is row -1
+        self.parents: list[tuple[int, str, str]] = []
+        self.outcomes: list[list[Outcome | None]] = []
+
+    def __len__(self) -> int:
+        return len(self.outcomes)
+
+    def add_tree(self, column: int, root: MutationTreeNode):
+        """Adds the outcome of every node below the root, without recursion."""
+        stack: list[tuple[int, MutationTreeNode]] = [(-1, root)]
+        while stack:
+            parent_row, node = stack.pop()
+            for child in node.children:
+                # Enum hashing is slow, the plain value is hashed instead
+                key = (parent_row, child.func_name, child.mutation_type.value)
+                row = self.keys.get(key)
+                if row is None:
+                    row = self.keys[key] = len(self.outcomes)
+                    self.parents.append(key)
+                    self.outcomes.append([None] * self.columns)
+
+                sw = child.recording.response_sw if child.recording else None
+                self.outcomes[row][column] = (sw, child.failure_reason)
+                stack.append((row, child))
+
+    def get_path(self, row: int) -> TreePath:
+        path = []
+        while row >= 0:
+            row, func_name, mutation = self.parents[row]
+            path.append((func_name, MutationType(mutation)))
+
+        return tuple(reversed(path))
+
+    def get_divergent_rows(self) -> Iterator[int]:
+        for row, outcomes in enumerate(self.outcomes):
+            if len({outcome for outcome in outcomes if outcome is not None}) > 1:
+                yield row
+
+
+def release_tree(root: MutationTreeNode):
+    """Breaks the cycles of the parent links, so the tree is freed as soon as it is
+    no longer referenced instead of by the next collection of the cyclic garbage
+    collector. The tree must not be used afterwards."""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for child in node.children:
+            child.parent = None
+        stack.extend(node.children)
+
+
+def diff_recordings(scenario_name: str, recordings: list[tuple[str, str]]) -> TreeDiff:
+    """Diffs the recordings of one scenario in a single pass over each tree.
+
+    The trees are loaded one at a time and flattened into a table with one column
+    per card, so only the outcomes of all trees are held in memory, not the trees.
+
+    Args:
+        recordings (list[tuple[str, str]]): Card name and file path of every
+            recording.
+    """
+    table = PathTable(len(recordings))
+    # Unpickling a tree allocates an object per field of every node, which keeps
+    # triggering the cyclic garbage collector for nothing to collect
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for column, (card_name, file_path) in enumerate(recordings):
+            with open(file_path, "rb") as f:
+                recorder: OperationRecorder = pickle.load(f)
+
+            table.add_tree(column, recorder.root)
+            logging.debug(f"Indexed {file_path} of {card_name}")
+            release_tree(recorder.root)
+            del recorder
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    diff = TreeDiff(
+        scenario_name,
+        [card_name for card_name, _ in recordings],
+        paths=len(table),
+    )
+    for row in table.get_divergent_rows():
+        diff.rows.append((table.get_path(row), table.outcomes[row]))
+
+    diff.rows.sort(key=lambda item: item[0])
+    return diff
+
+
+def diff_scenarios(
+    scenarios: dict[str, list[tuple[str, str]]], jobs: int | None = None
+) -> list[TreeDiff]:
+    """Diffs the recordings of every scenario, one worker process per scenario.
+
+    Args:
+        scenarios (dict[str, list[tuple[str, str]]]): Card names and file paths of
+            the recordings per scenario name.
+        jobs (int | None, optional): Number of worker processes, the number of
+            CPUs if None.
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(scenarios))
+    if jobs <= 1:
+        return [
+            diff_recordings(scenario_name, recordings)
+            for scenario_name, recordings in scenarios.items()
+        ]
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        return list(executor.map(diff_recordings, scenarios.keys(), scenarios.values()))
@@ -0,0 +1,206 @@
+import logging
+import pickle
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+try:
+    import numpy as np
+except ImportError:  # Optional, only needed to export
+    np = None
+
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.recorder.operation import MutationTreeNode
+from resimulate.euicc.recorder.recorder import OperationRecorder
+from resimulate.exceptions import RecorderException
+
+# Columns with few distinct values, stored as codes into a table of the values
+DICTIONARY_COLUMNS = (
+    "card_name",
+    "atr",
+    "scenario",
+    "path",
+    "func_name",
+    "mutation_type",
+    "response_sw",
+    "failure_reason",
+)
+# Columns of variable length bytes, stored as one buffer and the row offsets
+BYTES_COLUMNS = ("original_apdu", "mutated_apdu")
+# The row of the parent node, -1 for the operations of the root
+NUMERIC_COLUMNS = ("parent", "depth", "leaf")
+
+
+def check_numpy():
+    if np is None:
+        raise RecorderException(
+            "Exporting recordings needs NumPy, install the 'export' extra"
+        )
+
+
+@dataclass
+class ColumnBuilder:
+    """Collects the rows of a ResultTable before they are turned into arrays."""
+
+    values: dict[str, list] = field(
+        default_factory=lambda: {
+            column: []
+            for column in DICTIONARY_COLUMNS + BYTES_COLUMNS + NUMERIC_COLUMNS
+        }
+    )
+
+    def add_tree(self, root: MutationTreeNode, card_name: str, atr: str, scenario: str):
+        offset = len(self.values["parent"])
+        rows = 0
+        stack: list[tuple[int, int, str, MutationTreeNode]] = [(-1, 0, "", root)]
+        while stack:
+            parent, depth, parent_path, node = stack.pop()
+            for child in node.children:
+                recording = child.recording
+                path = f"{parent_path}/{child.func_name}:{child.mutation_type}"
+                row = {
+                    "card_name": card_name,
+                    "atr": atr,
+                    "scenario": scenario,
+                    "path": path,
+                    "func_name": child.func_name,
+                    "mutation_type": child.mutation_type.value,
+                    "response_sw": recording.response_sw if recording else None,
+                    "failure_reason": child.failure_reason,
+                    "original_apdu": recording.original_apdu.to_bytes()
+                    if recording
+                    else b"",
+                    "mutated_apdu": recording.mutated_apdu.to_bytes()
+                    if recording
+                    else b"",
+                    "parent": parent,
+                    "depth": depth,
+                    "leaf": child.leaf,
+                }
+                for column, value in row.items():
+                    self.values[column].append(value)
+
+                stack.append((offset + rows, depth + 1, path, child))
+                rows += 1
+
+        return rows
+
+
+class ResultTable:
+    """Columnar table of the nodes of many mutation trees, one row per node.
+
+    The columns are NumPy arrays, so thousands of recordings are queried with
+    vectorized filters instead of walking the trees. Strings are dictionary
+    encoded like in Arrow: the column holds int32 codes into a sorted table of
+    the distinct values, None is code -1. APDUs are kept in one uint8 buffer with
+    the offsets of every row. The tree path of a row is stored as a string like
+    "/get_euicc_info_2:none/get_euicc_info_1:bitflip" and as the row of its
+    parent.
+    """
+
+    def __init__(self, arrays: dict[str, "np.ndarray"]):
+        self.arrays = arrays
+
+    def __len__(self) -> int:
+        return len(self.arrays["parent"])
+
+    @classmethod
+    def from_builder(cls, builder: ColumnBuilder) -> "ResultTable":
+        check_numpy()
+        arrays = {}
+        for column in DICTIONARY_COLUMNS:
+            values = builder.values[column]
+            distinct = sorted({value for value in values if value is not None})
+            codes = {value: code for code, value in enumerate(distinct)}
+            codes[None] = -1
+            arrays[column] = np.fromiter(
+                (codes[value] for value in values), dtype=np.int32, count=len(values)
+            )
+            arrays[f"{column}_values"] = np.array(distinct, dtype=np.str_)
+
+        for column in BYTES_COLUMNS:
+            values = builder.values[column]
+            lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+            arrays[f"{column}_offsets"] = np.concatenate(([0], np.cumsum(lengths)))
+            arrays[f"{column}_data"] = np.frombuffer(b"".join(values), dtype=np.uint8)
+
+        arrays["parent"] = np.array(builder.values["parent"], dtype=np.int64)
+        arrays["depth"] = np.array(builder.values["depth"], dtype=np.int32)
+        arrays["leaf"] = np.array(builder.values["leaf"], dtype=np.bool_)
+        return cls(arrays)
+
+    @classmethod
+    def from_recordings(
+        cls, recordings: Iterable[tuple[str, str, str]]
+    ) -> "ResultTable":
+        """Flattens recordings into a table. Only one tree is loaded at a time.
+
+        Args:
+            recordings (Iterable[tuple[str, str, str]]): File path, card name and
+                scenario name of every recording.
+        """
+        check_numpy()
+        builder = ColumnBuilder()
+        for file_path, card_name, scenario in recordings:
+            with open(file_path, "rb") as f:
+                recorder: OperationRecorder = pickle.load(f)
+
+            rows = builder.add_tree(
+                recorder.root, card_name, recorder.answer_to_request, scenario
+            )
+            logging.debug(f"Exported {rows} nodes of {file_path}")
+
+        return cls.from_builder(builder)
+
+    def save(self, file_path: str):
+        np.savez_compressed(file_path, **self.arrays)
+
+    @classmethod
+    def load(cls, file_path: str) -> "ResultTable":
+        check_numpy()
+        with np.load(file_path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def equals(self, column: str, value: str | None) -> "np.ndarray":
+        """Returns the mask of the rows with the value in a dictionary column."""
+        if value is None:
+            return self.arrays[column] == -1
+
+        values = self.arrays[f"{column}_values"]
+        code = np.searchsorted(values, value)
+        if code == len(values) or values[code] != value:
+            return np.zeros(len(self), dtype=np.bool_)
+
+        return self.arrays[column] == code
+
+    def get_value(self, column: str, row: int) -> str | bytes | int | bool | None:
+        if column in BYTES_COLUMNS:
+            offsets = self.arrays[f"{column}_offsets"]
+            data = self.arrays[f"{column}_data"]
+            return data[offsets[row] : offsets[row + 1]].tobytes()
+
+        value = self.arrays[column][row]
+        if column in DICTIONARY_COLUMNS:
+            return None if value == -1 else str(self.arrays[f"{column}_values"][value])
+
+        return value.item()
+
+    def get_path(self, row: int) -> list[tuple[str, MutationType]]:
+        """Returns the operations and mutations leading from the root to the row."""
+        path = []
+        while row >= 0:
+            path.append(
+                (
+                    self.get_value("func_name", row),
+                    MutationType(self.get_value("mutation_type", row)),
+                )
+            )
+            row = self.arrays["parent"][row]
+
+        return path[::-1]
+
+    def get_rows(self, mask: "np.ndarray | None" = None) -> Iterator[dict]:
+        """Yields the rows of the mask as dicts, e.g. to print them."""
+        rows = range(len(self)) if mask is None else np.flatnonzero(mask)
+        columns = DICTIONARY_COLUMNS + BYTES_COLUMNS + NUMERIC_COLUMNS
+        for row in rows:
+            yield {column: self.get_value(column, int(row)) for column in columns}
@@ -11,6 +11,7 @@ class MutationRecording:
     original_apdu: APDUPacket
     mutated_apdu: APDUPacket
     response_sw: str
+    response_data: bytes | None = None
 
     def is_different(self, other: MutationRecording) -> bool:
         return self.response_sw != other.response_sw
@@ -18,6 +19,14 @@ class MutationRecording:
 
 @dataclass
 class MutationTreeNode:
+    """Node of the mutation tree, one per tried mutation of an operation.
+
+    Every node tracks its untried mutations and the number of untried mutations
+    in its subtree, so the frontier of the tree is found without rescanning it.
+    The counters are only kept up to date by add_child, take_mutation, set_leaf
+    and set_failure, the fields must not be modified directly.
+    """
+
     func_name: str
     mutation_type: MutationType
     failure_reason: str | None = None
@@ -25,31 +34,134 @@ class MutationTreeNode:
     parent: MutationTreeNode | None = None
     recording: MutationRecording | None = None
     children: list["MutationTreeNode"] = field(default_factory=list)
+    untried: set[MutationType] = field(default_factory=lambda: set(MutationType))
+    # Untried mutations of this node and of the open nodes below it
+    open_mutations: int = len(MutationType)
+
+    def is_closed(self) -> bool:
+        """Failed and finished nodes are never continued."""
+        return bool(self.failure_reason or self.leaf)
+
+    def is_open(self) -> bool:
+        return not self.is_closed() and self.open_mutations > 0
 
     def add_child(self, child: MutationTreeNode) -> None:
         self.children.append(child)
         child.parent = self
 
-    def get_not_tried_mutations(self) -> set[MutationType]:
-        tried_mutations = [node.mutation_type for node in self.children]
-        return set(MutationType).difference(tried_mutations)
+        delta = 0 if child.is_closed() else child.open_mutations
+        if child.mutation_type in self.untried:
+            self.untried.remove(child.mutation_type)
+            delta -= 1
 
-    def has_not_tried_mutations(self) -> bool:
-        not_tried_mutations = self.get_not_tried_mutations()
-        return bool(not_tried_mutations)
+        self.__update_open_mutations(delta)
 
-    def tree_has_not_tried_mutations(self) -> bool:
-        if self.failure_reason or self.leaf:
+    def take_mutation(self, mutation_type: MutationType) -> bool:
+        """Marks a mutation as tried before its node exists, e.g. while it is being
+        tried on another reader."""
+        if mutation_type not in self.untried:
             return False
 
-        if self.has_not_tried_mutations():
-            return True
+        self.untried.remove(mutation_type)
+        self.__update_open_mutations(-1)
+        return True
 
-        for child in self.children:
-            if child.tree_has_not_tried_mutations():
-                return True
+    def release_mutation(self, mutation_type: MutationType) -> bool:
+        """Reverts take_mutation for a mutation which was never tried."""
+        if mutation_type in self.untried or self.get_child(mutation_type):
+            return False
 
-        return False
+        self.untried.add(mutation_type)
+        self.__update_open_mutations(1)
+        return True
+
+    def get_node(self, path: list[MutationType]) -> MutationTreeNode | None:
+        """Returns the node reached by following the path from this node."""
+        node = self
+        for mutation_type in path:
+            node = node.get_child(mutation_type)
+            if node is None:
+                return None
+
+        return node
+
+    def set_leaf(self) -> None:
+        self.__close()
+        self.leaf = True
+
+    def set_failure(self, failure_reason: str) -> None:
+        self.__close()
+        self.failure_reason = failure_reason
+
+    def get_child(self, mutation_type: MutationType) -> MutationTreeNode | None:
+        return next(
+            (child for child in self.children if child.mutation_type == mutation_type),
+            None,
+        )
+
+    def get_open_child(self) -> MutationTreeNode | None:
+        """Returns a child with untried mutations in its subtree."""
+        return next((child for child in self.children if child.is_open()), None)
+
+    def find_untried(self) -> MutationTreeNode | None:
+        """Returns a node of the subtree with untried mutations. Follows the subtree
+        counters, so it only visits the nodes on the path to it."""
+        if not self.is_open():
+            return None
+
+        node = self
+        while not node.untried:
+            node = node.get_open_child()
+
+        return node
+
+    def get_path(self) -> list[MutationType]:
+        """Returns the mutations leading from the root to this node."""
+        path = []
+        node = self
+        while node.parent is not None:
+            path.append(node.mutation_type)
+            node = node.parent
+
+        return path[::-1]
+
+    def merge(self, other: MutationTreeNode) -> None:
+        """Merges another tree into this one. Subtrees which only exist in the other
+        tree are moved over, nodes which exist in both trees are kept."""
+        for other_child in list(other.children):
+            child = self.get_child(other_child.mutation_type)
+            if child is None:
+                self.add_child(other_child)
+            else:
+                child.merge(other_child)
+
+    def get_not_tried_mutations(self) -> set[MutationType]:
+        return set(self.untried)
+
+    def has_not_tried_mutations(self) -> bool:
+        return bool(self.untried)
+
+    def tree_has_not_tried_mutations(self) -> bool:
+        return self.is_open()
+
+    def __close(self) -> None:
+        if not self.is_closed():
+            # The subtree no longer counts towards the ancestors
+            self.__update_parents(-self.open_mutations)
+
+    def __update_open_mutations(self, delta: int) -> None:
+        self.open_mutations += delta
+        if not self.is_closed():
+            self.__update_parents(delta)
+
+    def __update_parents(self, delta: int) -> None:
+        node = self.parent
+        while node is not None and delta:
+            node.open_mutations += delta
+            if node.is_closed():
+                break
+
+            node = node.parent
 
     def is_different(self, other: MutationTreeNode) -> bool:
         if self.mutation_type != other.mutation_type:
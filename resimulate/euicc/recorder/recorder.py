@@ -1,6 +1,8 @@
 import logging
+import os
 import pickle
 
+from resimulate.euicc.mutation.scheduler import MutationScheduler
 from resimulate.euicc.mutation.types import MutationType
 from resimulate.euicc.recorder.operation import (
     MutationRecording,
@@ -12,67 +14,123 @@ from resimulate.util.name_generator import generate_name
 class OperationRecorder:
     answer_to_request = None
     name = None
+    scheduler: MutationScheduler | None = None
     root: MutationTreeNode
     current_node: MutationTreeNode
-
-    def __init__(self):
+    # True while the current run follows nodes which were already recorded
+    replaying: bool = True
+
+    def __init__(self, scheduler: MutationScheduler | None = None):
+        """
+        Args:
+            scheduler (MutationScheduler | None, optional): Orders and caps the
+                mutations by the behaviour they uncover. All mutations are tried
+                in order if None.
+        """
+        self.scheduler = scheduler
         self.clear()
 
     def record(self, recording: MutationRecording):
-        self.current_node.recording = recording
+        node = self.current_node
+        # Replayed nodes send their mutation again, it was counted the first time
+        explored = not self.replaying or node.recording is None
+        node.recording = recording
+        if self.scheduler and explored:
+            self.scheduler.count_try(node.func_name, node.mutation_type)
+            self.scheduler.observe(
+                node.func_name,
+                node.mutation_type,
+                ("sw", recording.response_sw),
+                ("length", len(recording.response_data or b"")),
+            )
+
+    def record_leaf(self):
+        self.current_node.set_leaf()
+
+    def record_failure(self, failure_reason: str):
+        node = self.current_node
+        node.set_failure(failure_reason)
+        if self.scheduler:
+            self.scheduler.observe(
+                node.func_name, node.mutation_type, ("failure", failure_reason)
+            )
 
     def add_new_mutation_node(self, func_name: str, mutation_type: MutationType):
         node = MutationTreeNode(func_name=func_name, mutation_type=mutation_type)
         self.current_node.add_child(node)
         self.current_node = node
+        self.replaying = False
+
+    def get_next_mutation(self, func_name: str) -> MutationType:
+        node = self.current_node
+        if self.scheduler:
+            self.__cap_mutations(node, func_name)
 
-    def get_next_mutation(self, func_name: str) -> MutationTreeNode | None:
-        not_tried_mutations = self.current_node.get_not_tried_mutations()
-        if not_tried_mutations:
+        if node.untried:
             logging.debug("Current node has not tried mutations...")
-            mutation_type = not_tried_mutations.pop()
+            if self.scheduler:
+                mutation_type = self.scheduler.choose(func_name, node.untried)
+            else:
+                mutation_type = min(node.untried)
             self.add_new_mutation_node(
                 func_name=func_name,
                 mutation_type=mutation_type,
             )
             return mutation_type
 
-        none_mutation_node = None
-        for child in self.current_node.children:
-            if child.failure_reason:
-                continue
-
-            not_tried_mutations = child.get_not_tried_mutations()
-
-            if not_tried_mutations:
-                self.current_node = child
-                logging.debug(
-                    f"Found a child with not tried mutations: {child.func_name} -> {child.mutation_type}"
-                )
-                return child.mutation_type
-
-            if child.mutation_type is MutationType.NONE:
-                none_mutation_node = child
+        if child := self.__get_open_child(node):
+            logging.debug(
+                f"Found a child with not tried mutations: {child.func_name} -> {child.mutation_type}"
+            )
+            self.current_node = child
+            return child.mutation_type
 
+        none_mutation_node = node.get_child(MutationType.NONE)
         assert none_mutation_node is not None, "No child with NONE mutation node found!"
         logging.debug(
             "Could not find a child with not tried mutations, continuing with NONE mutation node!"
         )
-        return none_mutation_node
+        self.current_node = none_mutation_node
+        return MutationType.NONE
+
+    def __cap_mutations(self, node: MutationTreeNode, func_name: str):
+        for mutation_type in sorted(node.untried):
+            if self.scheduler.is_capped(func_name, mutation_type):
+                logging.debug(
+                    f"Skipping {mutation_type} of {func_name}, it uncovered nothing new"
+                )
+                node.take_mutation(mutation_type)
+
+    def __get_open_child(self, node: MutationTreeNode) -> MutationTreeNode | None:
+        if not self.scheduler:
+            return node.get_open_child()
+
+        open_children = [child for child in node.children if child.is_open()]
+        return max(
+            open_children,
+            key=lambda child: self.scheduler.score(
+                child.func_name, child.mutation_type
+            ),
+            default=None,
+        )
 
     def clear(self):
         self.root = MutationTreeNode(func_name="root", mutation_type=MutationType.NONE)
         self.current_node = self.root
+        self.replaying = True
         logging.debug("Cleared all recorded operations")
 
     def reset(self):
         logging.debug("Resetting recorder")
         self.current_node = self.root
+        self.replaying = True
 
     def save_file(self, file_path: str):
         logging.debug(f"Saving recording to {file_path}")
-        with open(file_path, "wb") as f:
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
             pickle.dump(self, f)
+        os.replace(temp_path, file_path)
 
     def compare(
         self,
@@ -125,3 +183,27 @@ class OperationRecorder:
             main_recorder,
             compare_recordings,
         )
+
+
+class GuidedOperationRecorder(OperationRecorder):
+    """Follows a fixed path of mutations from the root, then explores untried
+    mutations like the OperationRecorder. The recorded tree is a single chain,
+    which is merged into the full tree by the caller."""
+
+    def __init__(self, path: list[MutationType]):
+        super().__init__()
+        self.path = path
+
+    def get_next_mutation(self, func_name: str) -> MutationType:
+        depth = 0
+        node = self.current_node
+        while node.parent is not None:
+            depth += 1
+            node = node.parent
+
+        if depth < len(self.path):
+            mutation_type = self.path[depth]
+            self.add_new_mutation_node(func_name=func_name, mutation_type=mutation_type)
+            return mutation_type
+
+        return super().get_next_mutation(func_name)
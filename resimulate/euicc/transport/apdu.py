@@ -55,6 +55,9 @@ class APDUPacket:
         return [self]
 
     def to_hex(self) -> str:
+        return self.to_bytes().hex()
+
+    def to_bytes(self) -> bytes:
         apdu = bytearray([self.cla, self.ins, self.p1, self.p2])
 
         if self.data and len(self.data) > 255 or self.le > 255:
@@ -65,10 +68,10 @@ class APDUPacket:
                 apdu.extend(lc.to_bytes(2, "big"))
                 apdu.extend(self.data)
 
-                if self.le > 255:
+                # Le follows an extended Lc with two bytes, 0000 expects up to
+                # 65536 bytes like 00 does for 256 after a short Lc
+                if self.le is not None:
                     apdu.extend(self.le.to_bytes(2, "big"))
-                else:
-                    apdu.append(self.le)
             else:
                 if self.le > 255:
                     # No Lc, but extended Le -> Prepend 0x00
@@ -89,11 +92,14 @@ class APDUPacket:
             elif self.le is not None:
                 apdu.append(self.le)
 
-        return apdu.hex()
+        return bytes(apdu)
 
     @classmethod
     def from_hex(cls, hex_str: str) -> "APDUPacket":
-        data = bytes.fromhex(hex_str)
+        return cls.from_bytes(bytes.fromhex(hex_str))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "APDUPacket":
         if len(data) < 4:
             raise ValueError("APDU must be at least 4 bytes long")
 
@@ -0,0 +1,54 @@
+import logging
+
+# Compact-TLV tag of the card capabilities in the historical bytes (ISO/IEC 7816-4)
+CARD_CAPABILITIES_TAG = 0x7
+EXTENDED_LENGTH_FLAG = 0x40
+
+
+def get_historical_bytes(atr: bytes) -> bytes:
+    """Returns the historical bytes of an ATR by skipping the interface bytes."""
+    if len(atr) < 2:
+        return b""
+
+    historical_length = atr[1] & 0x0F
+    indicator = atr[1] >> 4
+    index = 2
+    while True:
+        # TA, TB and TC are present depending on the indicator bits, TD announces
+        # the next group of interface bytes.
+        index += bin(indicator & 0x07).count("1")
+        if not indicator & 0x08 or index >= len(atr):
+            break
+
+        indicator = atr[index] >> 4
+        index += 1
+
+    return atr[index : index + historical_length]
+
+
+def supports_extended_length(atr: bytes) -> bool:
+    """Checks the card capabilities of the ATR for extended Lc and Le support."""
+    historical_bytes = get_historical_bytes(atr)
+    if not historical_bytes:
+        return False
+
+    if historical_bytes[0] == 0x80:
+        objects = historical_bytes[1:]
+    elif historical_bytes[0] == 0x00:
+        # The last three bytes are a mandatory status indicator
+        objects = historical_bytes[1:-3]
+    else:
+        return False
+
+    index = 0
+    while index < len(objects):
+        tag, length = objects[index] >> 4, objects[index] & 0x0F
+        value = objects[index + 1 : index + 1 + length]
+        if tag == CARD_CAPABILITIES_TAG and len(value) >= 3:
+            supported = bool(value[2] & EXTENDED_LENGTH_FLAG)
+            logging.debug("ATR card capabilities: extended length %s", supported)
+            return supported
+
+        index += 1 + length
+
+    return False
@@ -3,7 +3,7 @@ import logging
 from osmocom.utils import Hexstr, h2i, i2h
 from pySim.exceptions import SwMatchError
 from pySim.transport import LinkBaseTpdu
-from pySim.utils import ResTuple
+from pySim.utils import ResTuple, sw_match
 from smartcard import System
 from smartcard.CardConnection import CardConnection
 from smartcard.CardRequest import CardRequest
@@ -16,10 +16,24 @@ from smartcard.ExclusiveConnectCardConnection import ExclusiveConnectCardConnect
 from smartcard.pcsc.PCSCReader import PCSCReader
 
 from resimulate.euicc.mutation.engine import MutationEngine
-from resimulate.euicc.recorder.operation import MutationRecording
+from resimulate.euicc.recorder.operation import MutationRecording, MutationTreeNode
 from resimulate.euicc.recorder.recorder import OperationRecorder
 from resimulate.euicc.transport.apdu import APDUPacket
-from resimulate.exceptions import PcscError
+from resimulate.euicc.transport.atr import supports_extended_length
+from resimulate.exceptions import PcscError, StateRestoreError
+
+MAX_EXTENDED_DATA_SIZE = 65535
+# Operations whose replies are fresh on every run and feed later requests, e.g.
+# the challenge signed by the SM-DP+. They are always sent to the card.
+FRESH_OPERATIONS = frozenset(
+    {
+        "get_euicc_challenge",
+        "authenticate_server",
+        "prepare_download",
+        "get_notifications",
+        "retrieve_notification_list",
+    }
+)
 
 
 class PcscLink(LinkBaseTpdu):
@@ -29,22 +43,43 @@ class PcscLink(LinkBaseTpdu):
         recorder: OperationRecorder | None = None,
         device_index: int = 0,
         apdu_data_size: int = 255,
+        extended_length: bool | None = None,
+        card_connection: CardConnection | None = None,
+        prefix_replay: bool = False,
     ):
+        """
+        Args:
+            extended_length (bool | None, optional): Send segmented commands as
+                extended length APDUs. Detected from the ATR if None.
+            card_connection (CardConnection | None, optional): Connection to use
+                instead of the PC/SC reader at device_index, e.g. a simulated card.
+            prefix_replay (bool, optional): Answer the operations which are already
+                recorded in the mutation tree from their recordings, and only bring
+                the card to their state once the run diverges from the tree. The
+                state of a real card is restored by sending the prefix again, so
+                this only saves time on cards which can be snapshotted.
+        """
         super().__init__()
 
-        readers: list[PCSCReader] = System.readers()
-        if device_index > len(readers):
-            raise PcscError(f"Device with index {device_index} not found.")
-
         if apdu_data_size > 255:
             logging.warning(
                 "An APDU data size greater than 255 can cause issues with some cards."
             )
 
-        self.pcsc_device = readers[device_index]
-        self.card_connection = ExclusiveConnectCardConnection(
-            self.pcsc_device.createConnection()
-        )
+        if card_connection is None:
+            readers: list[PCSCReader] = System.readers()
+            if device_index > len(readers):
+                raise PcscError(f"Device with index {device_index} not found.")
+
+            card_connection = ExclusiveConnectCardConnection(
+                readers[device_index].createConnection()
+            )
+
+        self.card_connection = card_connection
+        self.pcsc_device = card_connection.getReader()
+        self.extended_length = extended_length
+        self.extended_length_supported = False
+        self.is_t1 = False
         if recorder:
             logging.debug("Initializing recorder...")
             self.connect()
@@ -54,6 +89,11 @@ class PcscLink(LinkBaseTpdu):
         self.mutation_engine = mutation_engine
         self.recorder = recorder
         self.apdu_data_size = apdu_data_size
+        self.prefix_replay = prefix_replay
+        # Last node answered from its recording, the card has not seen it yet
+        self.replayed_node: MutationTreeNode | None = None
+        # Operation, APDU and status word of the last operation sent to the card
+        self.last_operation: tuple[str, APDUPacket, str] | None = None
 
     def __str__(self) -> str:
         return "PCSC[%s]" % (self.pcsc_device)
@@ -89,11 +129,27 @@ class PcscLink(LinkBaseTpdu):
             )
 
             self.card_connection.connect(protocol=protocol)
+            self.is_t1 = protocol == CardConnection.T1_protocol
+            self.extended_length_supported = supports_extended_length(
+                bytes(self.card_connection.getATR())
+            )
         except (CardConnectionException, NoCardException) as e:
             logging.error("Failed to connect to device")
             raise PcscError("Failed to connect to device") from e
 
-        logging.debug("Connected to device %s", self.pcsc_device)
+        logging.debug(
+            "Connected to device %s (extended length: %s)",
+            self.pcsc_device,
+            self.use_extended_length,
+        )
+
+    @property
+    def use_extended_length(self) -> bool:
+        """Extended length APDUs are only sent over T=1, T=0 would need ENVELOPEs."""
+        if self.extended_length is not None:
+            return self.extended_length and self.is_t1
+
+        return self.extended_length_supported and self.is_t1
 
     def disconnect(self):
         try:
@@ -133,35 +189,148 @@ class PcscLink(LinkBaseTpdu):
         )
         return i2h(data), i2h([sw1, sw2])
 
-    def send_apdu_with_mutation(self, func_name: str, apdu: APDUPacket) -> ResTuple:
-        def handle_apdu_transmission(apdu: APDUPacket) -> tuple[str | None, str]:
-            logging.debug("Sending %s", str(apdu))
+    def transmit(self, apdu: bytes | memoryview) -> tuple[bytes, int, int]:
+        """Bytes-native counterpart of send_apdu. Sends the APDU as is and collects
+        the response, taking care of the T=0 specifics and of GET RESPONSE.
 
-            short_apdus = apdu.to_short_apdu(data_size=self.apdu_data_size)
-            if len(short_apdus) > 1:
-                logging.debug("Splitting APDU into %d short APDUs", len(short_apdus))
+        Returns:
+            tuple[bytes, int, int]: The response data, SW1 and SW2.
+        """
+        if self.replayed_node is not None:
+            node, self.replayed_node = self.replayed_node, None
+            self.restore_state(node)
 
-            for short_apdu in short_apdus:
-                try:
-                    data, sw = self.send_apdu_checksw(short_apdu.to_hex())
-                except SwMatchError as exception:
-                    return None, exception.sw_actual
+        if not self.is_t1 and len(apdu) > 5 and len(apdu) == 6 + apdu[4]:
+            # T=0 cannot send Lc and Le in one TPDU, the Le of a case 4 APDU is
+            # dropped and the response is fetched with GET RESPONSE below.
+            apdu = apdu[:-1]
 
-            return data, sw
+        data, sw1, sw2 = self.__transmit(apdu)
+        if sw1 == 0x6C and len(apdu) <= 5:
+            # Wrong Le, the card tells us the right one
+            data, sw1, sw2 = self.__transmit(bytes(apdu[:4]) + bytes([sw2]))
+
+        response = bytearray(data)
+        while sw1 == 0x61:
+            data, sw1, sw2 = self.__transmit(bytes([apdu[0], 0xC0, 0x00, 0x00, sw2]))
+            response += bytes(data)
+
+        return bytes(response), sw1, sw2
+
+    def send_bytes_checksw(
+        self, apdu: bytes | memoryview, sw: str | None = "9000"
+    ) -> tuple[bytes, str]:
+        """Bytes-native counterpart of send_apdu_checksw.
+
+        Raises:
+            SwMatchError: If the status word does not match the sw pattern.
+        """
+        data, sw1, sw2 = self.transmit(apdu)
+        sw_actual = f"{sw1:02x}{sw2:02x}"
+        if sw is not None and not sw_match(sw_actual, sw):
+            raise SwMatchError(sw_actual, sw.lower())
+
+        return data, sw_actual
+
+    def __transmit(self, apdu: bytes | memoryview) -> tuple[list[int], int, int]:
+        # Only produce hex strings if they are actually logged
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if debug:
+            logging.debug("Sending TPDU: %s", bytes(apdu).hex().upper())
 
+        data, sw1, sw2 = self.card_connection.transmit(list(apdu))
+        if debug:
+            logging.debug(
+                "Received Data: %s, SW: %02x%02x", bytes(data).hex() or None, sw1, sw2
+            )
+
+        return data, sw1, sw2
+
+    def save_state(self, node: MutationTreeNode):
+        """Called after the operation of the node was sent to the card. A real card
+        cannot be snapshotted, its state is restored by restore_state."""
+
+    def restore_state(self, node: MutationTreeNode):
+        """Brings the card from its reset state to the state after the operation of
+        the node, by replaying the recorded APDUs leading to it.
+
+        Raises:
+            StateRestoreError: If the card does not answer like it was recorded.
+        """
+        path = []
+        while node.parent is not None:
+            path.append(node)
+            node = node.parent
+
+        logging.debug("Restoring the card state by replaying %d APDUs", len(path))
+        for node in reversed(path):
+            recording = node.recording
+            data, sw = self.__send_segmented(recording.mutated_apdu)
+            if sw != recording.response_sw or data != recording.response_data:
+                raise StateRestoreError(
+                    f"Card answered {node.func_name} with {sw} instead of {recording.response_sw} while restoring its state"
+                )
+
+    def __send_segmented(self, apdu: APDUPacket) -> tuple[bytes | None, str]:
+        logging.debug("Sending %s", apdu)
+
+        data_size = self.apdu_data_size
+        if self.use_extended_length:
+            data_size = MAX_EXTENDED_DATA_SIZE
+
+        short_apdus = apdu.to_short_apdu(data_size=data_size)
+        if len(short_apdus) > 1:
+            logging.debug("Splitting APDU into %d short APDUs", len(short_apdus))
+
+        for short_apdu in short_apdus:
+            try:
+                data, sw = self.send_bytes_checksw(short_apdu.to_bytes())
+            except SwMatchError as exception:
+                return None, exception.sw_actual
+
+        return data, sw
+
+    def send_apdu_with_mutation(
+        self, func_name: str, apdu: APDUPacket
+    ) -> tuple[bytes | None, str]:
         if not self.mutation_engine:
-            return handle_apdu_transmission(apdu)
+            data, sw = self.__send_segmented(apdu)
+            self.last_operation = (func_name, apdu, sw)
+            return data, sw
+
+        if isinstance(apdu.data, memoryview):
+            # The recording is pickled and outlives the buffer of the view
+            apdu.data = apdu.data.tobytes()
 
         mutation_type = self.recorder.get_next_mutation(func_name)
+        node = self.recorder.current_node
+        if self.prefix_replay and self.recorder.replaying:
+            recording = node.recording
+            if (
+                recording is not None
+                and recording.original_apdu == apdu
+                and func_name not in FRESH_OPERATIONS
+            ):
+                logging.debug("Answering %s from its recording", func_name)
+                self.replayed_node = node
+                return recording.response_data, recording.response_sw
+
+            # The scenario took another turn or needs a fresh reply of the card
+            self.recorder.replaying = False
+
         mutated_apdu = self.mutation_engine.mutate(apdu, mutation_type=mutation_type)
-        logging.debug(f"Mutating apdu with {mutation_type}: {mutated_apdu}")
-        data, sw = handle_apdu_transmission(mutated_apdu)
+        logging.debug("Mutating apdu with %s: %s", mutation_type, mutated_apdu)
+        data, sw = self.__send_segmented(mutated_apdu)
+        self.last_operation = (func_name, mutated_apdu, sw)
         self.recorder.record(
             MutationRecording(
                 original_apdu=apdu,
                 mutated_apdu=mutated_apdu,
                 response_sw=sw,
+                response_data=data,
             )
         )
+        if self.prefix_replay:
+            self.save_state(node)
 
         return data, sw
@@ -0,0 +1,695 @@
+import copy
+import logging
+import random
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from smartcard.CardConnection import CardConnection
+
+from resimulate.asn import codec_cache
+from resimulate.euicc.models.info import EuiccRspCapability, UICCCapability
+from resimulate.euicc.models.notification import NotificationEvent, NotificationType
+from resimulate.euicc.models.profile import ProfileClass, ProfileState
+from resimulate.euicc.models.reset_option import ResetOptionBitString
+from resimulate.euicc.mutation.engine import MutationEngine
+from resimulate.euicc.recorder.operation import MutationTreeNode
+from resimulate.euicc.recorder.recorder import OperationRecorder
+from resimulate.euicc.transport.apdu import APDUPacket
+from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.util.enums import ISDR_AID
+
+# T=1 card, the card capabilities (73) announce extended Lc and Le fields
+SIMULATED_ATR = bytes.fromhex("3B888001807300004031FE0075")
+SIMULATED_EID = bytes.fromhex("89049032123451234512345678901235")
+SIMULATED_ROOT_DS_ADDRESS = "lpa.ds.gsma.com"
+# GSMA test CI (SGP.26)
+SIMULATED_CI_PKID = bytes.fromhex("F54172BDF98A95D65CBEB88A38A1C11D800A85C3")
+
+# Snapshots kept by a SimulatedEuiccLink, the least recently used are dropped
+MAX_SNAPSHOTS = 256
+
+# Status words
+SW_OK = 0x9000
+SW_WRONG_LENGTH = 0x6700
+SW_CONDITIONS_NOT_SATISFIED = 0x6985
+SW_WRONG_DATA = 0x6A80
+SW_FILE_NOT_FOUND = 0x6A82
+SW_WRONG_P1_P2 = 0x6A86
+SW_REFERENCED_DATA_NOT_FOUND = 0x6A88
+SW_INS_NOT_SUPPORTED = 0x6D00
+
+INS_SELECT = 0xA4
+INS_STORE_DATA = 0xE2
+INS_GET_RESPONSE = 0xC0
+
+# Certificates are not checked by the LPA, an empty SEQUENCE is enough
+EMPTY_SEQUENCE = b"\x30\x00"
+UNDEFINED_ERROR = 127
+
+# Tags of the ProfileInfo fields, used to apply the tagList of ProfileInfoListRequest
+PROFILE_INFO_TAGS = {
+    "iccid": 0x5A,
+    "isdpAid": 0x4F,
+    "profileState": 0x9F70,
+    "profileNickname": 0x90,
+    "serviceProviderName": 0x91,
+    "profileName": 0x92,
+    "profileClass": 0x95,
+}
+
+
+def read_tag(data: bytes, index: int = 0) -> tuple[int, int]:
+    """Reads a BER-TLV tag, returning the tag and the index after it."""
+    tag = data[index]
+    index += 1
+    if tag & 0x1F == 0x1F:
+        while True:
+            byte = data[index]
+            tag = tag << 8 | byte
+            index += 1
+            if not byte & 0x80:
+                break
+
+    return tag, index
+
+
+def read_tags(data: bytes) -> set[int]:
+    tags = set()
+    index = 0
+    while index < len(data):
+        tag, index = read_tag(data, index)
+        tags.add(tag)
+
+    return tags
+
+
+def bit_string(flag: int) -> tuple[bytes, int]:
+    return NotificationEvent.serialize(NotificationEvent.from_flags([flag]))
+
+
+@dataclass
+class SimulatedProfile:
+    iccid: bytes
+    isdp_aid: bytes
+    profile_name: str
+    service_provider_name: str
+    profile_class: ProfileClass = ProfileClass.PRODUCTION
+    state: ProfileState = ProfileState.DISABLED
+    nickname: str | None = None
+    notification_address: str | None = None
+
+    def to_profile_info(self) -> dict:
+        profile_info = {
+            "iccid": self.iccid,
+            "isdpAid": self.isdp_aid,
+            "profileState": self.state.value,
+            "serviceProviderName": self.service_provider_name,
+            "profileName": self.profile_name,
+            "profileClass": self.profile_class.value,
+        }
+        if self.nickname is not None:
+            profile_info["profileNickname"] = self.nickname
+
+        return profile_info
+
+
+@dataclass
+class SimulatedNotification:
+    seq_number: int
+    event: NotificationType
+    address: str
+    iccid: bytes
+
+    def to_metadata(self) -> dict:
+        return {
+            "seqNumber": self.seq_number,
+            "profileManagementOperation": bit_string(self.event),
+            "notificationAddress": self.address,
+            "iccid": self.iccid,
+        }
+
+    def to_pending_notification(self) -> tuple[str, dict]:
+        return (
+            "otherSignedNotification",
+            {
+                "tbsOtherNotification": self.to_metadata(),
+                "euiccNotificationSignature": bytes(64),
+                "euiccCertificate": EMPTY_SEQUENCE,
+                "nextCertInChain": EMPTY_SEQUENCE,
+            },
+        )
+
+
+def default_profiles() -> list[SimulatedProfile]:
+    return [
+        SimulatedProfile(
+            iccid=bytes.fromhex("98940000000000000010"),
+            isdp_aid=bytes.fromhex("A0000005591010FFFFFFFF8900001000"),
+            profile_name="Simulated Operational",
+            service_provider_name="ReSIMulate",
+            state=ProfileState.ENABLED,
+            notification_address="smdp.simulated.invalid",
+        ),
+        SimulatedProfile(
+            iccid=bytes.fromhex("98940000000000000020"),
+            isdp_aid=bytes.fromhex("A0000005591010FFFFFFFF8900001100"),
+            profile_name="Simulated Test",
+            service_provider_name="ReSIMulate",
+            profile_class=ProfileClass.TEST,
+        ),
+    ]
+
+
+class SimulatedIsdR:
+    """Stateful model of an ISD-R, answering reassembled ES10 requests.
+
+    Profiles, pending notifications and the default SM-DP+ address are kept in
+    memory. Requests that need the eUICC credentials (AuthenticateServer,
+    PrepareDownload) are answered with an undefinedError, profile downloads are
+    therefore not simulated.
+    """
+
+    def __init__(
+        self,
+        profiles: list[SimulatedProfile] | None = None,
+        eid: bytes = SIMULATED_EID,
+        default_dp_address: str = "",
+        seed: int | None = None,
+    ):
+        self.profiles = default_profiles() if profiles is None else profiles
+        self.eid = eid
+        self.default_dp_address = default_dp_address
+        self.initial_default_dp_address = default_dp_address
+        self.notifications: list[SimulatedNotification] = []
+        self.next_seq_number = 1
+        self.random = random.Random(seed)
+
+        self.handlers: dict[int, tuple[str, str, Callable[[Any], Any]]] = {
+            0xBF2E: (
+                "GetEuiccChallengeRequest",
+                "GetEuiccChallengeResponse",
+                self.get_euicc_challenge,
+            ),
+            0xBF20: ("GetEuiccInfo1Request", "EUICCInfo1", self.get_euicc_info_1),
+            0xBF22: ("GetEuiccInfo2Request", "EUICCInfo2", self.get_euicc_info_2),
+            0xBF3C: (
+                "EuiccConfiguredDataRequest",
+                "EuiccConfiguredDataResponse",
+                self.get_configured_data,
+            ),
+            0xBF3E: ("GetEuiccDataRequest", "GetEuiccDataResponse", self.get_eid),
+            0xBF2D: (
+                "ProfileInfoListRequest",
+                "ProfileInfoListResponse",
+                self.get_profiles,
+            ),
+            0xBF31: (
+                "EnableProfileRequest",
+                "EnableProfileResponse",
+                self.enable_profile,
+            ),
+            0xBF32: (
+                "DisableProfileRequest",
+                "DisableProfileResponse",
+                self.disable_profile,
+            ),
+            0xBF33: (
+                "DeleteProfileRequest",
+                "DeleteProfileResponse",
+                self.delete_profile,
+            ),
+            0xBF28: (
+                "ListNotificationRequest",
+                "ListNotificationResponse",
+                self.list_notifications,
+            ),
+            0xBF2B: (
+                "RetrieveNotificationsListRequest",
+                "RetrieveNotificationsListResponse",
+                self.retrieve_notifications,
+            ),
+            0xBF30: (
+                "NotificationSentRequest",
+                "NotificationSentResponse",
+                self.remove_notification,
+            ),
+            0xBF29: ("SetNicknameRequest", "SetNicknameResponse", self.set_nickname),
+            0xBF3F: (
+                "SetDefaultDpAddressRequest",
+                "SetDefaultDpAddressResponse",
+                self.set_default_dp_address,
+            ),
+            0xBF34: (
+                "EuiccMemoryResetRequest",
+                "EuiccMemoryResetResponse",
+                self.reset_euicc_memory,
+            ),
+            0xBF38: (
+                "AuthenticateServerRequest",
+                "AuthenticateServerResponse",
+                self.authenticate_server,
+            ),
+            0xBF21: (
+                "PrepareDownloadRequest",
+                "PrepareDownloadResponse",
+                self.prepare_download,
+            ),
+        }
+
+    def handle(self, request: bytes) -> tuple[bytes, int]:
+        """Answers an encoded ES10 request, returning the encoded response and the
+        status word."""
+        try:
+            tag, _ = read_tag(request)
+        except IndexError:
+            return b"", SW_WRONG_DATA
+
+        if tag not in self.handlers:
+            logging.debug("Simulated ISD-R: unsupported request tag %X", tag)
+            return b"", SW_REFERENCED_DATA_NOT_FOUND
+
+        request_type, response_type, handler = self.handlers[tag]
+        try:
+            decoded = codec_cache.decode(request_type, request)
+        except Exception as e:
+            logging.debug("Simulated ISD-R: invalid %s: %s", request_type, e)
+            return b"", SW_WRONG_DATA
+
+        logging.debug("Simulated ISD-R: %s %s", request_type, decoded)
+        return codec_cache.encode(response_type, handler(decoded)), SW_OK
+
+    def get_euicc_challenge(self, request: dict) -> dict:
+        return {"euiccChallenge": self.random.randbytes(16)}
+
+    def get_euicc_info_1(self, request: dict) -> dict:
+        return {
+            "lowestSvn": b"\x02\x02\x00",
+            "euiccCiPKIdListForVerification": [SIMULATED_CI_PKID],
+            "euiccCiPKIdListForSigning": [SIMULATED_CI_PKID],
+        }
+
+    def get_euicc_info_2(self, request: dict) -> dict:
+        uicc_capability = UICCCapability.from_flags(
+            [UICCCapability.USIM_SUPPORT, UICCCapability.ISIM_SUPPORT]
+        )
+        rsp_capability = EuiccRspCapability.from_flags(
+            [
+                EuiccRspCapability.ADDITIONAL_PROFILE,
+                EuiccRspCapability.TEST_PROFILE_SUPPORT,
+            ]
+        )
+        return {
+            "baseProfilePackageVersion": b"\x02\x03\x01",
+            "lowestSvn": b"\x02\x02\x00",
+            "euiccFirmwareVersion": b"\x01\x00\x00",
+            # ETSI TS 102 226: installed applications, free NVM and free RAM
+            "extCardResource": bytes.fromhex("810100820400010000830200FF"),
+            "uiccCapability": UICCCapability.serialize(uicc_capability),
+            "euiccRspCapability": EuiccRspCapability.serialize(rsp_capability),
+            "euiccCiPKIdListForVerification": [SIMULATED_CI_PKID],
+            "euiccCiPKIdListForSigning": [SIMULATED_CI_PKID],
+            "ppVersion": b"\x01\x00\x00",
+            "sasAcreditationNumber": "SIMULATED",
+        }
+
+    def get_configured_data(self, request: dict) -> dict:
+        return {
+            "defaultDpAddress": self.default_dp_address,
+            "rootDsAddress": SIMULATED_ROOT_DS_ADDRESS,
+        }
+
+    def get_eid(self, request: dict) -> dict:
+        return {"eidValue": self.eid}
+
+    def get_profiles(self, request: dict) -> tuple[str, Any]:
+        profiles = self.profiles
+        if search_criteria := request.get("searchCriteria"):
+            key, value = search_criteria
+            if key == "profileClass":
+                profiles = [p for p in profiles if p.profile_class == value]
+            else:
+                profile = self.__find_profile(search_criteria)
+                profiles = [profile] if profile else []
+
+        profile_infos = [profile.to_profile_info() for profile in profiles]
+        if (tag_list := request.get("tagList")) is not None:
+            try:
+                tags = read_tags(tag_list)
+            except IndexError:
+                return "profileInfoListError", 1
+
+            profile_infos = [
+                {
+                    key: value
+                    for key, value in profile_info.items()
+                    if PROFILE_INFO_TAGS[key] in tags
+                }
+                for profile_info in profile_infos
+            ]
+
+        return "profileInfoListOk", profile_infos
+
+    def enable_profile(self, request: dict) -> dict:
+        profile = self.__find_profile(request["profileIdentifier"])
+        if profile is None:
+            return {"enableResult": 1}
+        if profile.state == ProfileState.ENABLED:
+            return {"enableResult": 2}
+
+        for enabled_profile in self.profiles:
+            if enabled_profile.state == ProfileState.ENABLED:
+                enabled_profile.state = ProfileState.DISABLED
+                self.__add_notification(enabled_profile, NotificationType.LOCAL_DISABLE)
+
+        profile.state = ProfileState.ENABLED
+        self.__add_notification(profile, NotificationType.LOCAL_ENABLE)
+        return {"enableResult": 0}
+
+    def disable_profile(self, request: dict) -> dict:
+        profile = self.__find_profile(request["profileIdentifier"])
+        if profile is None:
+            return {"disableResult": 1}
+        if profile.state != ProfileState.ENABLED:
+            return {"disableResult": 2}
+
+        profile.state = ProfileState.DISABLED
+        self.__add_notification(profile, NotificationType.LOCAL_DISABLE)
+        return {"disableResult": 0}
+
+    def delete_profile(self, request: tuple) -> dict:
+        profile = self.__find_profile(request)
+        if profile is None:
+            return {"deleteResult": 1}
+        if profile.state == ProfileState.ENABLED:
+            return {"deleteResult": 2}
+
+        self.profiles.remove(profile)
+        self.__add_notification(profile, NotificationType.LOCAL_DELETE)
+        return {"deleteResult": 0}
+
+    def list_notifications(self, request: dict) -> tuple[str, list]:
+        notifications = self.notifications
+        if operation := request.get("profileManagementOperation"):
+            notifications = self.__filter_notifications(operation)
+
+        return "notificationMetadataList", [n.to_metadata() for n in notifications]
+
+    def retrieve_notifications(self, request: dict) -> tuple[str, list]:
+        notifications = self.notifications
+        if search_criteria := request.get("searchCriteria"):
+            key, value = search_criteria
+            if key == "seqNumber":
+                notifications = [n for n in notifications if n.seq_number == value]
+            else:
+                notifications = self.__filter_notifications(value)
+
+        return "notificationList", [
+            notification.to_pending_notification() for notification in notifications
+        ]
+
+    def remove_notification(self, request: dict) -> dict:
+        for notification in self.notifications:
+            if notification.seq_number == request["seqNumber"]:
+                self.notifications.remove(notification)
+                return {"deleteNotificationStatus": 0}
+
+        return {"deleteNotificationStatus": 1}
+
+    def set_nickname(self, request: dict) -> dict:
+        profile = self.__find_profile(("iccid", request["iccid"]))
+        if profile is None:
+            return {"setNicknameResult": 1}
+
+        profile.nickname = request["profileNickname"]
+        return {"setNicknameResult": 0}
+
+    def set_default_dp_address(self, request: dict) -> dict:
+        self.default_dp_address = request["defaultDpAddress"]
+        return {"setDefaultDpAddressResult": 0}
+
+    def reset_euicc_memory(self, request: dict) -> dict:
+        options = ResetOptionBitString(*request["resetOptions"])
+        profile_classes = set()
+        if options.is_set("DELETE_OPERATIONAL_PROFILES"):
+            profile_classes.add(ProfileClass.PRODUCTION)
+        if options.is_set("DELETE_FIELD_LOADED_TEST_PROFILES") or options.is_set(
+            "DELETE_PRE_LOADED_TEST_PROFILES"
+        ):
+            profile_classes.add(ProfileClass.TEST)
+        if options.is_set("DELETE_PROVISIONING_PROFILES"):
+            profile_classes.add(ProfileClass.PROVISIONING)
+
+        profiles = [p for p in self.profiles if p.profile_class not in profile_classes]
+        deleted = len(self.profiles) - len(profiles)
+        self.profiles = profiles
+
+        address_reset = False
+        if options.is_set("RESET_DEFAULT_SMDP_ADDRESS"):
+            address_reset = self.default_dp_address != self.initial_default_dp_address
+            self.default_dp_address = self.initial_default_dp_address
+
+        if not deleted and not address_reset:
+            return {"resetResult": 1}
+
+        return {"resetResult": 0}
+
+    def authenticate_server(self, request: dict) -> tuple[str, dict]:
+        transaction_id = self.__get_transaction_id(
+            "ServerSigned1", request["serverSigned1"]
+        )
+        return "authenticateResponseError", {
+            "transactionId": transaction_id,
+            "authenticateErrorCode": UNDEFINED_ERROR,
+        }
+
+    def prepare_download(self, request: dict) -> tuple[str, dict]:
+        transaction_id = self.__get_transaction_id(
+            "SmdpSigned2", request["smdpSigned2"]
+        )
+        return "downloadResponseError", {
+            "transactionId": transaction_id,
+            "downloadErrorCode": UNDEFINED_ERROR,
+        }
+
+    def __get_transaction_id(self, signed_type: str, signed_data: bytes) -> bytes:
+        try:
+            return codec_cache.decode(signed_type, signed_data)["transactionId"]
+        except Exception:
+            return b"\x00"
+
+    def __find_profile(
+        self, profile_identifier: tuple[str, Any]
+    ) -> SimulatedProfile | None:
+        key, value = profile_identifier
+        for profile in self.profiles:
+            if key == "iccid" and profile.iccid == value:
+                return profile
+            if key == "isdpAid" and profile.isdp_aid == value:
+                return profile
+
+        return None
+
+    def __filter_notifications(
+        self, operation: tuple[bytes, int]
+    ) -> list[SimulatedNotification]:
+        events = NotificationEvent(*operation)
+        return [n for n in self.notifications if events.is_set(n.event.name)]
+
+    def __add_notification(self, profile: SimulatedProfile, event: NotificationType):
+        if not profile.notification_address:
+            return
+
+        self.notifications.append(
+            SimulatedNotification(
+                seq_number=self.next_seq_number,
+                event=event,
+                address=profile.notification_address,
+                iccid=profile.iccid,
+            )
+        )
+        self.next_seq_number += 1
+
+
+class SimulatedEuicc:
+    """Card connection to an in-process eUICC, so the LPA, the fuzzers and the
+    replayer can run without a reader.
+
+    Only the ISD-R is simulated. STORE DATA blocks are reassembled before the
+    request is answered, responses that do not fit into a short APDU are chained
+    with GET RESPONSE like on a T=1 card.
+    """
+
+    def __init__(self, isd_r: SimulatedIsdR | None = None):
+        self.isd_r = isd_r or SimulatedIsdR()
+        self.isd_r_aids = {bytes.fromhex(member.aid) for member in ISDR_AID}
+        self.connected = False
+        self.__reset()
+
+    def getReader(self) -> str:
+        return "Simulated eUICC"
+
+    def getProtocol(self) -> int:
+        return CardConnection.T1_protocol
+
+    def getATR(self) -> list[int]:
+        return list(SIMULATED_ATR)
+
+    def connect(self, protocol: int | None = None):
+        # A new connection resets the card, the volatile state is lost
+        self.connected = True
+        self.__reset()
+
+    def disconnect(self):
+        self.connected = False
+
+    def transmit(
+        self, apdu: list[int], protocol: int | None = None
+    ) -> tuple[list[int], int, int]:
+        data, sw = self.__process(bytes(apdu))
+        return list(data), sw >> 8, sw & 0xFF
+
+    def snapshot(self) -> tuple[SimulatedIsdR, bool]:
+        """Returns a copy of the state of the card between two commands."""
+        return copy.deepcopy(self.isd_r), self.selected
+
+    def restore(self, snapshot: tuple[SimulatedIsdR, bool]):
+        isd_r, selected = snapshot
+        self.isd_r = copy.deepcopy(isd_r)
+        self.__reset()
+        self.selected = selected
+
+    def __reset(self):
+        self.selected = False
+        self.blocks: list[bytes] = []
+        self.pending_response = b""
+
+    def __process(self, raw_apdu: bytes) -> tuple[bytes, int]:
+        try:
+            apdu = APDUPacket.from_bytes(raw_apdu)
+        except (ValueError, IndexError):
+            return b"", SW_WRONG_LENGTH
+
+        if apdu.ins == INS_GET_RESPONSE:
+            return self.__get_response(apdu.le or 256)
+
+        self.pending_response = b""
+        if apdu.ins == INS_SELECT:
+            return self.__select(apdu)
+        if apdu.ins == INS_STORE_DATA:
+            data, sw = self.__store_data(apdu)
+            extended = len(raw_apdu) > 5 and raw_apdu[4] == 0x00
+            if sw != SW_OK or extended or len(data) <= 256:
+                return data, sw
+
+            self.pending_response = data[256:]
+            return data[:256], 0x6100 | (min(len(self.pending_response), 256) & 0xFF)
+
+        return b"", SW_INS_NOT_SUPPORTED
+
+    def __select(self, apdu: APDUPacket) -> tuple[bytes, int]:
+        # A failed SELECT keeps the current selection
+        if apdu.p1 != 0x04 or apdu.data not in self.isd_r_aids:
+            return b"", SW_FILE_NOT_FOUND
+
+        self.selected = True
+        self.blocks = []
+
+        if apdu.p2 & 0x0C == 0x0C:
+            return b"", SW_OK
+
+        # FCI template with the DF name
+        aid = apdu.data
+        return bytes([0x6F, len(aid) + 2, 0x84, len(aid)]) + aid, SW_OK
+
+    def __store_data(self, apdu: APDUPacket) -> tuple[bytes, int]:
+        if not self.selected:
+            return b"", SW_CONDITIONS_NOT_SATISFIED
+
+        if apdu.p1 & 0x7F != 0x11 or apdu.p2 != len(self.blocks):
+            self.blocks = []
+            return b"", SW_WRONG_P1_P2
+
+        self.blocks.append(apdu.data)
+        if not apdu.p1 & 0x80:
+            return b"", SW_OK
+
+        request = b"".join(self.blocks)
+        self.blocks = []
+        return self.isd_r.handle(request)
+
+    def __get_response(self, le: int) -> tuple[bytes, int]:
+        if not self.pending_response:
+            return b"", SW_CONDITIONS_NOT_SATISFIED
+
+        data = self.pending_response[:le]
+        self.pending_response = self.pending_response[le:]
+        if self.pending_response:
+            return data, 0x6100 | (min(len(self.pending_response), 256) & 0xFF)
+
+        return data, SW_OK
+
+
+class SimulatedEuiccLink(PcscLink):
+    """PcscLink talking to a SimulatedEuicc instead of a PC/SC reader."""
+
+    def __init__(
+        self,
+        mutation_engine: MutationEngine | None = None,
+        recorder: OperationRecorder | None = None,
+        apdu_data_size: int = 255,
+        extended_length: bool | None = None,
+        euicc: SimulatedEuicc | None = None,
+        prefix_replay: bool = False,
+    ):
+        self.euicc = euicc or SimulatedEuicc()
+        # Snapshots of the card after the operation of a node, by node id. The node
+        # is only referenced weakly, so its id is checked against reuse.
+        self.snapshots: OrderedDict[
+            int, tuple[weakref.ref[MutationTreeNode], tuple]
+        ] = OrderedDict()
+        super().__init__(
+            mutation_engine=mutation_engine,
+            recorder=recorder,
+            apdu_data_size=apdu_data_size,
+            extended_length=extended_length,
+            card_connection=self.euicc,
+            prefix_replay=prefix_replay,
+        )
+
+    def wait_for_card(self, timeout: int | None = None, newcardonly: bool = False):
+        self.connect()
+
+    def save_state(self, node: MutationTreeNode):
+        self.snapshots[id(node)] = (weakref.ref(node), self.euicc.snapshot())
+        self.snapshots.move_to_end(id(node))
+        if len(self.snapshots) > MAX_SNAPSHOTS:
+            self.__prune_snapshots()
+
+    def restore_state(self, node: MutationTreeNode):
+        """Restores the snapshot of the node instead of replaying its prefix."""
+        saved_node, snapshot = self.snapshots.get(id(node), (None, None))
+        if saved_node is None or saved_node() is not node:
+            # E.g. recorded before resuming from a checkpoint or dropped
+            super().restore_state(node)
+            return
+
+        logging.debug("Restoring the snapshot after %s", node.func_name)
+        self.euicc.restore(snapshot)
+        if node.tree_has_not_tried_mutations():
+            self.snapshots.move_to_end(id(node))
+        else:
+            # No run continues below the node anymore
+            del self.snapshots[id(node)]
+
+    def __prune_snapshots(self):
+        """Drops the snapshots of collected nodes and of nodes without untried
+        mutations below them, then the least recently used ones."""
+        for node_id, (saved_node, _) in list(self.snapshots.items()):
+            node = saved_node()
+            if node is None or not node.tree_has_not_tried_mutations():
+                del self.snapshots[node_id]
+
+        while len(self.snapshots) > MAX_SNAPSHOTS:
+            self.snapshots.popitem(last=False)
@@ -2,6 +2,10 @@ class PcscError(Exception):
     pass
 
 
+class StateRestoreError(PcscError):
+    pass
+
+
 class CardTypeException(Exception):
     pass
 
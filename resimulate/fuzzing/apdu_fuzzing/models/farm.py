@@ -0,0 +1,352 @@
+import logging
+import multiprocessing
+import queue
+import time
+from dataclasses import dataclass
+from multiprocessing.process import BaseProcess
+
+from resimulate.euicc.card import Card
+from resimulate.euicc.mutation.engine import MutationEngine
+from resimulate.euicc.mutation.scheduler import MutationScheduler
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.recorder.checkpoint import Checkpoint
+from resimulate.euicc.recorder.operation import MutationTreeNode
+from resimulate.euicc.recorder.recorder import (
+    GuidedOperationRecorder,
+    OperationRecorder,
+)
+from resimulate.exceptions import PcscError
+from resimulate.fuzzing.apdu_fuzzing.models.scenario import Scenario
+from resimulate.fuzzing.apdu_fuzzing.models.scenario_runner import (
+    CHECKPOINT_INTERVAL,
+    ScenarioRunner,
+    clear_card,
+    create_link,
+    get_checkpoint_path,
+    get_recording_path,
+    get_scenario_name,
+    is_recorded,
+    load_checkpoint,
+    remove_checkpoint,
+    run_scenario,
+    save_recording,
+)
+from resimulate.fuzzing.corpus import Corpus
+
+# Seconds between liveness checks of the workers while waiting for a result
+POLL_INTERVAL = 1.0
+
+
+@dataclass
+class FarmTask:
+    scenario_cls: type[Scenario]
+    path: list[MutationType]
+
+
+@dataclass
+class FarmResult:
+    worker_id: int
+    root: MutationTreeNode | None = None
+    atr: str | None = None
+    error: str | None = None
+    # The worker takes no further tasks, e.g. because its reader is gone
+    stopped: bool = False
+
+
+def farm_worker(
+    worker_id: int,
+    device_index: int,
+    simulate: bool,
+    mutation_engine: MutationEngine,
+    apdu_data_size: int,
+    tasks: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    corpus: Corpus | None = None,
+):
+    """Runs the tasks handed out by the coordinator on a single reader, until it
+    receives None."""
+    try:
+        link = create_link(
+            simulate, device_index=device_index, apdu_data_size=apdu_data_size
+        )
+        link.connect()
+        card = Card(link)
+        clear_card(card)
+    except Exception as e:
+        results.put(FarmResult(worker_id, error=f"{e.__class__.__name__}: {e}"))
+        return
+
+    results.put(FarmResult(worker_id, atr=link.get_atr()))
+
+    link.mutation_engine = mutation_engine
+    scenario_cls = None
+    while (task := tasks.get()) is not None:
+        if scenario_cls is not None and task.scenario_cls is not scenario_cls:
+            link._reset_card()
+        scenario_cls = task.scenario_cls
+
+        recorder = GuidedOperationRecorder(task.path)
+        link.recorder = recorder
+        try:
+            run_scenario(
+                link, card, task.scenario_cls, recorder, mutation_engine, corpus
+            )
+        except Exception as e:
+            stopped = isinstance(e, PcscError)
+            results.put(
+                FarmResult(
+                    worker_id, error=f"{e.__class__.__name__}: {e}", stopped=stopped
+                )
+            )
+            if stopped:
+                break
+            continue
+
+        results.put(FarmResult(worker_id, root=recorder.root))
+
+    link.disconnect()
+
+
+class FarmScenarioRunner(ScenarioRunner):
+    """Records the scenarios on a farm of readers with identical cards.
+
+    The coordinator owns the mutation tree and hands out the untried mutations of
+    its frontier, one scenario run per task. Every reader is driven by a worker
+    process, which replays the path to its frontier node, explores below it and
+    sends the recorded chain back to be merged into the tree.
+    """
+
+    def __init__(
+        self,
+        scenarios: list[type[Scenario]],
+        readers: list[int],
+        simulate: bool = False,
+    ):
+        super().__init__(scenarios, simulate)
+        self.readers = readers
+
+    def record_card(
+        self,
+        card_name: str,
+        mutation_engine: MutationEngine,
+        path: str | None = None,
+        overwrite: bool = False,
+        apdu_data_size: int = 255,
+        resume: bool = False,
+        checkpoint_interval: float = CHECKPOINT_INTERVAL,
+        scheduler: MutationScheduler | None = None,
+        corpus: Corpus | None = None,
+    ):
+        if scheduler:
+            # The workers explore below their frontier without the coordinator
+            logging.warning(
+                "Mutation scheduling is not supported on a farm, ignoring it"
+            )
+
+        # PC/SC contexts must not be inherited, start the workers from scratch
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        workers: dict[int, tuple[BaseProcess, multiprocessing.Queue]] = {}
+        for worker_id, device_index in enumerate(self.readers):
+            tasks = context.Queue()
+            process = context.Process(
+                target=farm_worker,
+                args=(
+                    worker_id,
+                    device_index,
+                    self.simulate,
+                    mutation_engine,
+                    apdu_data_size,
+                    tasks,
+                    results,
+                    corpus,
+                ),
+                daemon=True,
+            )
+            process.start()
+            workers[worker_id] = (process, tasks)
+
+        try:
+            atr = self.__wait_for_workers(workers, results)
+            logging.info(f"Recording on a farm of {len(workers)} readers")
+
+            for scenario_cls in self.scenarios:
+                scenario_name = get_scenario_name(scenario_cls, mutation_engine)
+                recording_path = get_recording_path(card_name, scenario_name, path)
+                checkpoint_path = get_checkpoint_path(recording_path)
+                if is_recorded(recording_path, resume, overwrite):
+                    logging.info(
+                        f"Scenario {scenario_name} is already recorded in {recording_path}, skipping"
+                    )
+                    continue
+
+                checkpoint = load_checkpoint(checkpoint_path) if resume else None
+                if checkpoint is None:
+                    recorder = OperationRecorder()
+                    recorder.answer_to_request = atr
+                    checkpoint = Checkpoint(recorder)
+
+                logging.info(f"Recording scenario: {scenario_name}")
+                self.__record_scenario(
+                    scenario_cls,
+                    checkpoint,
+                    checkpoint_path,
+                    checkpoint_interval,
+                    workers,
+                    results,
+                )
+                logging.info(
+                    f"Scenario {scenario_name} finished with all mutations tried after {checkpoint.runs} runs!"
+                )
+                recorder = checkpoint.recorder
+                recorder.root.print_tree()
+
+                save_recording(recorder, card_name, scenario_name, path, overwrite)
+                remove_checkpoint(checkpoint_path)
+        finally:
+            for process, tasks in workers.values():
+                tasks.put(None)
+
+            for process, _ in workers.values():
+                process.join(timeout=POLL_INTERVAL * 10)
+                if process.is_alive():
+                    process.terminate()
+
+    def __wait_for_workers(
+        self,
+        workers: dict[int, tuple[BaseProcess, multiprocessing.Queue]],
+        results: multiprocessing.Queue,
+    ) -> str:
+        atr = None
+        pending = set(workers)
+        while pending:
+            result = self.__get_result(workers, pending, results)
+            pending.discard(result.worker_id)
+            if result.error:
+                logging.error(
+                    f"Reader {self.readers[result.worker_id]} could not be initialized: {result.error}"
+                )
+                workers.pop(result.worker_id, None)
+                continue
+
+            if atr is None:
+                atr = result.atr
+            elif result.atr != atr:
+                logging.warning(
+                    f"Reader {self.readers[result.worker_id]} holds a different card (ATR {result.atr})"
+                )
+
+        if not workers:
+            raise PcscError("No reader of the farm could be initialized")
+
+        return atr
+
+    def __record_scenario(
+        self,
+        scenario_cls: type[Scenario],
+        checkpoint: Checkpoint,
+        checkpoint_path: str,
+        checkpoint_interval: float,
+        workers: dict[int, tuple[BaseProcess, multiprocessing.Queue]],
+        results: multiprocessing.Queue,
+    ):
+        recorder = checkpoint.recorder
+        busy: dict[int, tuple[MutationTreeNode, MutationType]] = {}
+        # Mutations handed out again after their reader failed, by node id
+        retried: set[tuple[int, MutationType]] = set()
+        last_checkpoint = time.monotonic()
+        try:
+            while True:
+                for worker_id, (_, tasks) in workers.items():
+                    if worker_id in busy:
+                        continue
+
+                    node = recorder.root.find_untried()
+                    if node is None:
+                        break
+
+                    # Reserve the mutation, so it is not handed out twice
+                    mutation_type = min(node.untried)
+                    node.take_mutation(mutation_type)
+                    busy[worker_id] = (node, mutation_type)
+                    tasks.put(FarmTask(scenario_cls, node.get_path() + [mutation_type]))
+
+                if not busy:
+                    return
+
+                result = self.__get_result(workers, set(busy), results)
+                node, mutation_type = busy.pop(result.worker_id)
+                checkpoint.runs += 1
+                if result.error:
+                    logging.error(
+                        f"Reader {self.readers[result.worker_id]} failed: {result.error}"
+                    )
+
+                if result.root is not None:
+                    recorder.root.merge(result.root)
+
+                if node.get_child(mutation_type) is None:
+                    if result.error and (id(node), mutation_type) not in retried:
+                        # The reader failed, e.g. it was unplugged, another one
+                        # tries the mutation once more
+                        retried.add((id(node), mutation_type))
+                        node.release_mutation(mutation_type)
+                    else:
+                        # The run failed before reaching the frontier node, e.g.
+                        # because the card behaved differently on the path. It stays
+                        # reserved, so it is not handed out again.
+                        logging.warning(
+                            f"Could not try {mutation_type} after {node.func_name}, skipping it"
+                        )
+
+                if result.stopped:
+                    workers.pop(result.worker_id)
+                    if not workers:
+                        raise PcscError("All readers of the farm failed")
+
+                if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                    self.__save_checkpoint(checkpoint, checkpoint_path, busy)
+                    last_checkpoint = time.monotonic()
+        except BaseException:
+            # Keep the progress of an interrupted recording for --resume
+            self.__save_checkpoint(checkpoint, checkpoint_path, busy)
+            logging.info(
+                f"Saved checkpoint after {checkpoint.runs} runs to {checkpoint_path}"
+            )
+            raise
+
+    def __save_checkpoint(
+        self,
+        checkpoint: Checkpoint,
+        checkpoint_path: str,
+        busy: dict[int, tuple[MutationTreeNode, MutationType]],
+    ):
+        checkpoint.pending = [
+            node.get_path() + [mutation_type] for node, mutation_type in busy.values()
+        ]
+        checkpoint.save(checkpoint_path)
+
+    def __get_result(
+        self,
+        workers: dict[int, tuple[BaseProcess, multiprocessing.Queue]],
+        expected: set[int],
+        results: multiprocessing.Queue,
+    ) -> FarmResult:
+        """Waits for the result of one of the expected workers. A worker that died
+        in the meantime is removed from the farm and reported as failed."""
+        while True:
+            try:
+                return results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+            for worker_id in expected:
+                process, _ = workers[worker_id]
+                if not process.is_alive():
+                    workers.pop(worker_id)
+                    if not workers:
+                        raise PcscError("All readers of the farm failed")
+
+                    return FarmResult(
+                        worker_id, error=f"Worker exited with {process.exitcode}"
+                    )
@@ -1,21 +1,252 @@
 import logging
 import os
+import time
 
+from resimulate.asn import codec_cache
 from resimulate.euicc import exceptions
 from resimulate.euicc.card import Card
 from resimulate.euicc.models.reset_option import ResetOption
 from resimulate.euicc.mutation.engine import MutationEngine
+from resimulate.euicc.mutation.scheduler import MutationScheduler
+from resimulate.euicc.mutation.types import MutationType
+from resimulate.euicc.recorder.checkpoint import Checkpoint
+from resimulate.euicc.recorder.operation import MutationTreeNode
 from resimulate.euicc.recorder.recorder import OperationRecorder
 from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.euicc.transport.simulated_link import SimulatedEuiccLink
+from resimulate.exceptions import StateRestoreError
 from resimulate.fuzzing.apdu_fuzzing.models.scenario import Scenario
+from resimulate.fuzzing.corpus import Corpus, CorpusObservation
+
+# Seconds between two checkpoints of a recording
+CHECKPOINT_INTERVAL = 60.0
+RECORDING_SUFFIX = ".resim"
+
+
+def create_link(simulate: bool = False, **kwargs) -> PcscLink:
+    if simulate:
+        logging.info("Running against a simulated eUICC")
+        kwargs.pop("device_index", None)
+        return SimulatedEuiccLink(**kwargs)
+
+    return PcscLink(**kwargs)
+
+
+def clear_card(card: Card):
+    notifications = card.isd_r.retrieve_notification_list()
+    if notifications:
+        card.isd_r.process_notifications(notifications)
+
+    try:
+        card.isd_r.reset_euicc_memory(reset_options=ResetOption.all())
+    except exceptions.NothingToDeleteError:
+        pass
+
+
+def run_scenario(
+    link: PcscLink,
+    card: Card,
+    scenario_cls: type[Scenario],
+    recorder: OperationRecorder,
+    mutation_engine: MutationEngine | None,
+    corpus: Corpus | None = None,
+):
+    """Runs the scenario once, recording the mutations into the tree of the
+    recorder. The card is reset afterwards without mutating the reset."""
+    try:
+        scenario_cls(link).run(card)
+        recorder.record_leaf()
+        if corpus is not None:
+            add_to_corpus(corpus, card, scenario_cls, recorder.current_node)
+    except (exceptions.EuiccException, AssertionError) as e:
+        logging.debug(
+            f"Scenario {scenario_cls.__qualname__} failed on operation {recorder.current_node.func_name}... Resetting and continuing!"
+        )
+        recorder.record_failure(e.__class__.__name__)
+        if corpus is not None:
+            add_to_corpus(
+                corpus, card, scenario_cls, recorder.current_node, e.__class__.__name__
+            )
+    except StateRestoreError as e:
+        # The node stays untried and is run from a reset card next time
+        logging.warning(f"{e}, running the following scenarios in full")
+        link.prefix_replay = False
+    finally:
+        # Nothing left to restore, the recorded rest of the run was never sent
+        link.replayed_node = None
+        link.mutation_engine = None
+        try:
+            card.isd_r.reset_euicc_memory(reset_options=ResetOption.all())
+        except Exception:
+            logging.debug("Failed to reset card after scenario execution")
+
+        link.mutation_engine = mutation_engine
+        recorder.reset()
+
+
+def add_to_corpus(
+    corpus: Corpus,
+    card: Card,
+    scenario_cls: type[Scenario],
+    node: MutationTreeNode,
+    exception: str | None = None,
+):
+    """Adds the mutated APDUs of the run which ended at the node to the corpus, the
+    exception is attributed to the last one."""
+    while node.parent is not None:
+        if node.recording and node.mutation_type is not MutationType.NONE:
+            corpus.add(
+                node.recording.mutated_apdu.to_bytes(),
+                node.func_name,
+                CorpusObservation(
+                    card_name=card.name,
+                    atr=card.atr,
+                    sw=node.recording.response_sw,
+                    exception=exception,
+                    scenario=scenario_cls.__qualname__,
+                    mutation_type=node.mutation_type,
+                ),
+            )
+
+        exception = None
+        node = node.parent
+
+
+def seed_scheduler(scheduler: MutationScheduler, corpus: Corpus):
+    """Behaviours of previous campaigns are no longer new to the scheduler."""
+    entries = 0
+    for entry in corpus.entries():
+        entries += 1
+        for observation in entry.observations:
+            behaviours = [("sw", observation.sw)]
+            if observation.exception:
+                behaviours.append(("failure", observation.exception))
+            scheduler.seed(entry.func_name, *behaviours)
+
+    logging.info(f"Seeded the mutation scheduler from {entries} corpus entries")
+
+
+def get_scenario_name(
+    scenario_cls: type[Scenario], mutation_engine: MutationEngine | None
+) -> str:
+    scenario_name = scenario_cls.__qualname__
+    if mutation_engine:
+        scenario_name = f"{scenario_name}_{type(mutation_engine).__qualname__}"
+
+    return scenario_name
+
+
+def get_recording_path(
+    card_name: str, scenario_name: str, path: str | None = None
+) -> str:
+    file_name = f"{card_name}_{scenario_name}{RECORDING_SUFFIX}"
+    if path:
+        return os.path.join(path, file_name)
+
+    return file_name
+
+
+def split_recording_name(
+    recording_path: str, scenario_names: list[str]
+) -> tuple[str, str] | None:
+    """Reverts get_recording_path. Card names may contain underscores, so the
+    scenario is found by its name.
+
+    Returns:
+        tuple[str, str] | None: The card and scenario name, or None if the file
+            is no recording of one of the scenarios.
+    """
+    file_name = os.path.basename(recording_path).removesuffix(RECORDING_SUFFIX)
+    for scenario_name in sorted(scenario_names, key=len, reverse=True):
+        card_name, separator, rest = file_name.partition(f"_{scenario_name}")
+        if separator and (not rest or rest.startswith("_")):
+            return card_name, scenario_name + rest
+
+    return None
+
+
+def find_recordings(paths: list[str]) -> list[str]:
+    """Returns the recording files, directories are searched for them."""
+    recording_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            recording_paths.extend(
+                os.path.join(path, file_name)
+                for file_name in sorted(os.listdir(path))
+                if file_name.endswith(RECORDING_SUFFIX)
+            )
+        else:
+            recording_paths.append(path)
+
+    return recording_paths
+
+
+def get_checkpoint_path(recording_path: str) -> str:
+    return f"{recording_path}.checkpoint"
+
+
+def load_checkpoint(checkpoint_path: str) -> Checkpoint | None:
+    if not os.path.exists(checkpoint_path):
+        return None
+
+    checkpoint = Checkpoint.load(checkpoint_path)
+    logging.info(
+        f"Resuming from checkpoint {checkpoint_path} after {checkpoint.runs} runs"
+    )
+    return checkpoint
+
+
+def remove_checkpoint(checkpoint_path: str):
+    try:
+        os.remove(checkpoint_path)
+    except FileNotFoundError:
+        pass
+
+
+def save_recording(
+    recorder: OperationRecorder,
+    card_name: str,
+    scenario_name: str,
+    path: str | None = None,
+    overwrite: bool = False,
+):
+    file_path = get_recording_path(card_name, scenario_name, path)
+    if os.path.exists(file_path):
+        if not overwrite:
+            logging.debug(f"File {file_path} already exists. Skipping.")
+            return
+
+        logging.debug(f"File {file_path} already exists. Overwriting.")
+
+    recorder.save_file(file_path)
+
+
+def is_recorded(recording_path: str, resume: bool, overwrite: bool) -> bool:
+    """Recordings which are already finished are not repeated when resuming."""
+    return resume and not overwrite and os.path.exists(recording_path)
 
 
 class ScenarioRunner:
-    def __init__(self, scenarios: list[type[Scenario]]):
+    def __init__(
+        self,
+        scenarios: list[type[Scenario]],
+        simulate: bool = False,
+        prefix_replay: bool = False,
+    ):
+        """
+        Args:
+            prefix_replay (bool, optional): Answer the already recorded operations
+                of a run from the mutation tree and only restore the card state
+                where the run diverges, instead of running every branch in full.
+                Only a simulated card is snapshotted, a real one gets the prefix
+                sent again.
+        """
         self.scenarios = scenarios
+        self.simulate = simulate
+        self.prefix_replay = prefix_replay
 
     def run_scenarios(self):
-        with PcscLink() as link:
+        with create_link(self.simulate) as link:
             card = Card(link)
             for scenario in self.scenarios:
                 logging.debug(f"Running scenario: {scenario}")
@@ -29,16 +260,6 @@ class ScenarioRunner:
                 finally:
                     link._reset_card()
 
-    def __clear_card(self, card: Card):
-        notifications = card.isd_r.retrieve_notification_list()
-        if notifications:
-            card.isd_r.process_notifications(notifications)
-
-        try:
-            card.isd_r.reset_euicc_memory(reset_options=ResetOption.all())
-        except exceptions.NothingToDeleteError:
-            pass
-
     def record_card(
         self,
         card_name: str,
@@ -46,68 +267,73 @@ class ScenarioRunner:
         path: str | None = None,
         overwrite: bool = False,
         apdu_data_size: int = 255,
+        resume: bool = False,
+        checkpoint_interval: float = CHECKPOINT_INTERVAL,
+        scheduler: MutationScheduler | None = None,
+        corpus: Corpus | None = None,
     ):
-        recorder = OperationRecorder()
-        with PcscLink(recorder=recorder, apdu_data_size=apdu_data_size) as link:
+        if scheduler and corpus is not None:
+            seed_scheduler(scheduler, corpus)
+
+        recorder = OperationRecorder(scheduler)
+        with create_link(
+            self.simulate,
+            recorder=recorder,
+            apdu_data_size=apdu_data_size,
+            prefix_replay=self.prefix_replay,
+        ) as link:
             card = Card(link)
-            self.__clear_card(card)
+            clear_card(card)
 
             link.mutation_engine = mutation_engine
             for scenario_cls in self.scenarios:
-                scenario_name = scenario_cls.__qualname__
-                if mutation_engine:
-                    scenario_name = (
-                        f"{scenario_name}_{type(mutation_engine).__qualname__}"
+                scenario_name = get_scenario_name(scenario_cls, mutation_engine)
+                recording_path = get_recording_path(card_name, scenario_name, path)
+                checkpoint_path = get_checkpoint_path(recording_path)
+                if is_recorded(recording_path, resume, overwrite):
+                    logging.info(
+                        f"Scenario {scenario_name} is already recorded in {recording_path}, skipping"
                     )
+                    continue
+
+                runs = 0
+                checkpoint = load_checkpoint(checkpoint_path) if resume else None
+                if checkpoint is not None:
+                    recorder = checkpoint.recorder
+                    link.recorder = recorder
+                    runs = checkpoint.runs
+
                 logging.info(f"Recording scenario: {scenario_name}")
-                while True:
-                    try:
-                        scenario_cls(link).run(card)
-                        recorder.current_node.leaf = True
-                    except (exceptions.EuiccException, AssertionError) as e:
-                        logging.debug(
-                            f"Scenario {scenario_name} failed on operation {recorder.current_node.func_name}... Resetting and continuing!"
-                        )
-                        recorder.current_node.failure_reason = e.__class__.__name__
-                        continue
-                    finally:
-                        link.mutation_engine = None
-                        try:
-                            card.isd_r.reset_euicc_memory(
-                                reset_options=ResetOption.all()
-                            )
-                        except Exception:
-                            logging.debug(
-                                "Failed to reset card after scenario execution"
-                            )
-
-                        link.mutation_engine = mutation_engine
-                        recorder.reset()
-
-                    if not recorder.root.tree_has_not_tried_mutations():
-                        logging.info(
-                            f"Scenario {scenario_name} finished with all mutations tried!"
+                last_checkpoint = time.monotonic()
+                try:
+                    while recorder.root.tree_has_not_tried_mutations():
+                        run_scenario(
+                            link, card, scenario_cls, recorder, mutation_engine, corpus
                         )
-                        recorder.root.print_tree()
-                        break
+                        runs += 1
 
-                    logging.debug(
-                        f"Scenario {scenario_name} finished with untried mutations! Continuing..."
+                        if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                            Checkpoint(recorder, runs).save(checkpoint_path)
+                            last_checkpoint = time.monotonic()
+                except BaseException:
+                    # Keep the progress of an interrupted recording for --resume
+                    recorder.reset()
+                    Checkpoint(recorder, runs).save(checkpoint_path)
+                    logging.info(
+                        f"Saved checkpoint after {runs} runs to {checkpoint_path}"
                     )
+                    raise
 
-                file_name = f"{card_name}_{scenario_name}.resim"
-                if path:
-                    file_path = os.path.join(path, file_name)
-                else:
-                    file_path = file_name
+                logging.info(
+                    f"Scenario {scenario_name} finished with all mutations tried after {runs} runs!"
+                )
+                recorder.root.print_tree()
+                if recorder.scheduler:
+                    logging.info(f"Mutation scheduler: {recorder.scheduler}")
 
-                if os.path.exists(file_path):
-                    if not overwrite:
-                        logging.debug(f"File {file_path} already exists. Skipping.")
-                        continue
-
-                    logging.debug(f"File {file_path} already exists. Overwriting.")
-
-                recorder.save_file(file_path)
+                save_recording(recorder, card_name, scenario_name, path, overwrite)
+                remove_checkpoint(checkpoint_path)
                 recorder.clear()
                 link._reset_card()
+
+        logging.info(f"ASN.1 codec cache: {codec_cache}")
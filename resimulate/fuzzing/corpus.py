@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from pydantic import BaseModel, ValidationError
+
+try:
+    import fcntl
+except ImportError:  # Windows, where a corpus has a single writer
+    fcntl = None
+
+APDU_SUFFIX = ".apdu"
+METADATA_SUFFIX = ".json"
+# Shared by the entries of a directory, guards their metadata across processes
+LOCK_NAME = ".lock"
+
+
+class CorpusObservation(BaseModel):
+    card_name: str
+    atr: str | None = None
+    sw: str | None = None
+    exception: str | None = None
+    scenario: str | None = None
+    mutation_type: str | None = None
+
+
+class CorpusEntry(BaseModel):
+    digest: str
+    func_name: str
+    size: int
+    observations: list[CorpusObservation] = []
+
+    def get_behaviours(self) -> set[tuple[str, str | None, str | None]]:
+        return {
+            (self.func_name, observation.sw, observation.exception)
+            for observation in self.observations
+        }
+
+
+class Corpus:
+    """Content-addressed store of interesting APDUs.
+
+    Every APDU is stored once, under the SHA-256 of its bytes, next to a JSON file
+    with the cards, status words and exceptions it was observed with. The files
+    are spread over two levels of directories, so a lookup stays a single stat
+    no matter how many millions of entries the corpus holds.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Observations already written by this process, repeated adds are free
+        self.known: set[tuple[str, str]] = set()
+
+    def __contains__(self, apdu: bytes) -> bool:
+        return self.__get_path(self.get_digest(apdu), APDU_SUFFIX).exists()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.path.glob(f"*/*/*{METADATA_SUFFIX}"))
+
+    @staticmethod
+    def get_digest(apdu: bytes) -> str:
+        return hashlib.sha256(apdu).hexdigest()
+
+    def add(self, apdu: bytes, func_name: str, observation: CorpusObservation) -> bool:
+        """Adds the APDU with the observation. Returns False if both were already
+        in the corpus."""
+        digest = self.get_digest(apdu)
+        key = (digest, observation.model_dump_json())
+        if key in self.known:
+            return False
+        self.known.add(key)
+
+        with self.__lock(digest):
+            entry = self.get(digest)
+            if entry is None:
+                entry = CorpusEntry(digest=digest, func_name=func_name, size=len(apdu))
+                self.__write(self.__get_path(digest, APDU_SUFFIX), apdu)
+            elif observation in entry.observations:
+                return False
+
+            entry.observations.append(observation)
+            self.__write(
+                self.__get_path(digest, METADATA_SUFFIX),
+                entry.model_dump_json().encode(),
+            )
+        logging.debug(f"Added {func_name} APDU {digest[:12]} to the corpus")
+        return True
+
+    def get(self, digest: str) -> CorpusEntry | None:
+        try:
+            return CorpusEntry.model_validate_json(
+                self.__get_path(digest, METADATA_SUFFIX).read_bytes()
+            )
+        except FileNotFoundError:
+            return None
+        except ValidationError as e:
+            logging.warning(f"Ignoring broken corpus entry {digest}: {e}")
+            return None
+
+    def get_apdu(self, digest: str) -> bytes:
+        return self.__get_path(digest, APDU_SUFFIX).read_bytes()
+
+    def entries(self) -> Iterator[CorpusEntry]:
+        for metadata_path in self.path.glob(f"*/*/*{METADATA_SUFFIX}"):
+            entry = self.get(metadata_path.stem)
+            if entry is not None:
+                yield entry
+
+    def remove(self, digest: str):
+        with self.__lock(digest):
+            for suffix in (METADATA_SUFFIX, APDU_SUFFIX):
+                try:
+                    self.__get_path(digest, suffix).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def minimize(self) -> int:
+        """Keeps the smallest APDU of every behaviour, i.e. every combination of
+        operation, status word and exception. Only the metadata is read.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        smallest: dict[tuple, CorpusEntry] = {}
+        digests = set()
+        for entry in self.entries():
+            digests.add(entry.digest)
+            for behaviour in entry.get_behaviours():
+                current = smallest.get(behaviour)
+                if current is None or (entry.size, entry.digest) < (
+                    current.size,
+                    current.digest,
+                ):
+                    smallest[behaviour] = entry
+
+        keep = {entry.digest for entry in smallest.values()}
+        for digest in digests - keep:
+            self.remove(digest)
+
+        self.known.clear()
+        return len(digests - keep)
+
+    def __get_path(self, digest: str, suffix: str) -> Path:
+        return self.path / digest[:2] / digest[2:4] / f"{digest}{suffix}"
+
+    @contextmanager
+    def __lock(self, digest: str):
+        """Holds the lock of the directory of the digest, so the workers of a farm
+        do not lose each other's observations of the same APDU."""
+        directory = self.__get_path(digest, "").parent
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / LOCK_NAME, "ab") as lock_file:
+            if fcntl is not None:
+                # Released when the file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def __write(self, path: Path, data: bytes):
+        # Concurrent writers, e.g. the workers of a farm, never see partial files
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
@@ -6,13 +6,13 @@ from hypothesis import strategies as st
 
 from resimulate.euicc.card import Card
 from resimulate.euicc.exceptions import EuiccException, UndefinedError
-from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.fuzzing.data_fuzzing import link
 
 
 class FuzzEuicc(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.link = PcscLink()
+        cls.link = link.create_link()
         cls.link.connect()
         cls.card = Card(cls.link)
 
@@ -26,7 +26,8 @@ class FuzzEuicc(unittest.TestCase):
     def test_set_default_dp_address(self, address: str):
         try:
             self.card.isd_r.set_default_dp_address(address=address)
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(f"Found interesting input: address={address}")
             return
         except EuiccException:
@@ -45,7 +46,8 @@ class FuzzEuicc(unittest.TestCase):
     def test_reset_euicc_memory(self, reset_options: list[int]):
         try:
             self.card.isd_r.reset_euicc_memory(reset_options=reset_options)
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(f"Found interesting input: reset_euicc_memory={reset_options}")
             return
         except EuiccException:
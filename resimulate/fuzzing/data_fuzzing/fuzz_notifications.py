@@ -8,13 +8,16 @@ from resimulate.euicc.card import Card
 from resimulate.euicc.exceptions import EuiccException, UndefinedError
 from resimulate.euicc.models.activation_profile import ActivationProfile
 from resimulate.euicc.models.reset_option import ResetOption
-from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.fuzzing.data_fuzzing import link
 
 
 class FuzzNotifications(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.link = PcscLink()
+        if link.simulate:
+            raise unittest.SkipTest("Needs a profile download from an SM-DP+")
+
+        cls.link = link.create_link()
         cls.link.connect()
         cls.card = Card(cls.link)
         profile = ActivationProfile.from_activation_code(
@@ -41,7 +44,8 @@ class FuzzNotifications(unittest.TestCase):
             pending_notifications = self.card.isd_r.retrieve_notification_list(
                 seq_number=seq_number, notification_type=notification_type
             )
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(
                 f"Found interesting input: notification_type={notification_type}"
             )
@@ -75,7 +79,8 @@ class FuzzNotifications(unittest.TestCase):
             notifications = self.card.isd_r.get_notifications(
                 notification_type=notification_type
             )
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(
                 f"Found interesting input: notification_type={notification_type}"
             )
@@ -9,13 +9,16 @@ from resimulate.euicc.card import Card
 from resimulate.euicc.exceptions import EuiccException, UndefinedError
 from resimulate.euicc.models.activation_profile import ActivationProfile
 from resimulate.euicc.models.reset_option import ResetOption
-from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.fuzzing.data_fuzzing import link
 
 
 class FuzzProfiles(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.link = PcscLink()
+        if link.simulate:
+            raise unittest.SkipTest("Needs a profile download from an SM-DP+")
+
+        cls.link = link.create_link()
         cls.link.connect()
         cls.card = Card(cls.link)
         profile = ActivationProfile.from_activation_code(
@@ -61,7 +64,8 @@ class FuzzProfiles(unittest.TestCase):
                 profile_class=profile_class,
                 tags=tags,
             )
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(
                 f"Found interesting input: profile_class={profile_class}, tags={tags}, iccid={iccid}"
             )
@@ -92,7 +96,8 @@ class FuzzProfiles(unittest.TestCase):
         iccid = self.iccid if iccid is None else iccid
         try:
             self.card.isd_r.set_nickname(iccid=iccid, nickname=nickname)
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(f"Found interesting input: iccid={iccid}, nickname={nickname}")
             return
         except EuiccException:
@@ -6,7 +6,7 @@ from hypothesis import strategies as st
 
 from resimulate.euicc.card import Card
 from resimulate.euicc.exceptions import EuiccException, UndefinedError
-from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.fuzzing.data_fuzzing import link
 from resimulate.smdp.models import (
     AuthenticateClientResponse,
     FunctionExecutionStatus,
@@ -37,7 +37,7 @@ header_strategy = st.builds(
 class FuzzRsp(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.link = PcscLink()
+        cls.link = link.create_link()
         cls.link.connect()
         cls.card = Card(cls.link)
 
@@ -67,7 +67,8 @@ class FuzzRsp(unittest.TestCase):
                 authenticate_client_response=authenticate_client_response,
                 confirmation_code=confirmation_code,
             )
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(
                 f"Found interesting input: authenticate_client_response={authenticate_client_response}, confirmation_code={confirmation_code}"
             )
@@ -100,7 +101,8 @@ class FuzzRsp(unittest.TestCase):
                 matching_id=matching_id,
                 imei=imei,
             )
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info(
                 f"Found interesting input: initiate_authentication_response={initiate_authentication_response}"
             )
@@ -123,7 +125,8 @@ class FuzzRsp(unittest.TestCase):
             self.card.isd_r.load_bound_profile_package(
                 get_bpp_response=get_bpp_response
             )
-        except UndefinedError:
+        except UndefinedError as e:
+            link.add_to_corpus(self.card, self._testMethodName, e)
             logging.info("Found interesting input: load_bound_profile_package")
             return
         except (EuiccException, TypeError):
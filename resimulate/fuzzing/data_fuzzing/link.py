@@ -0,0 +1,35 @@
+from resimulate.euicc.card import Card
+from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.euicc.transport.simulated_link import SimulatedEuiccLink
+from resimulate.fuzzing.corpus import Corpus, CorpusObservation
+
+# Set by 'fuzzer fuzz --simulate' before the fuzzing groups are run
+simulate = False
+# Set by 'fuzzer fuzz --corpus', interesting inputs are stored in it
+corpus: Corpus | None = None
+
+
+def create_link() -> PcscLink:
+    if simulate:
+        return SimulatedEuiccLink()
+
+    return PcscLink()
+
+
+def add_to_corpus(card: Card, scenario: str, exception: Exception):
+    """Stores the last APDU sent to the card as an interesting input."""
+    if corpus is None or card.link.last_operation is None:
+        return
+
+    func_name, apdu, sw = card.link.last_operation
+    corpus.add(
+        apdu.to_bytes(),
+        func_name,
+        CorpusObservation(
+            card_name=card.name,
+            atr=card.atr,
+            sw=sw,
+            exception=exception.__class__.__name__,
+            scenario=scenario,
+        ),
+    )
@@ -1,5 +1,9 @@
+import atexit
 import base64
 import logging
+import threading
+import time
+from importlib.util import find_spec
 
 import httpx
 
@@ -19,20 +23,102 @@ from resimulate.smdp.models import (
 )
 
 
+# Connections per SM-DP+, the LPA talks to a server one request at a time
+MAX_CONNECTIONS = 4
+MAX_KEEPALIVE_CONNECTIONS = 2
+KEEPALIVE_EXPIRY = 30.0
+# HTTP/2 needs the optional h2 package
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "gsma-rsp-lpad",
+    "X-Admin-Protocol": "gsma/rsp/v3.1.0",
+}
+HANDLE_NOTIFICATION_URL = "/gsma/rsp2/es9plus/handleNotification"
+
+
+def get_limits(max_connections: int = MAX_CONNECTIONS) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(MAX_KEEPALIVE_CONNECTIONS, max_connections),
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def encode_notification(pending_notification: PendingNotification) -> tuple[int, dict]:
+    """Encodes the notification for handleNotification.
+
+    Returns:
+        tuple[int, dict]: The sequence number and the JSON body of the request.
+    """
+    data = pending_notification.model_dump()
+    if isinstance(pending_notification, ProfileInstallationResult):
+        notification = ("profileInstallationResult", data)
+        seq_number = pending_notification.data.notification.seq_number
+    elif isinstance(pending_notification, OtherSignedNotification):
+        notification = ("otherSignedNotification", data)
+        seq_number = pending_notification.tbs_other_notification.seq_number
+    elif isinstance(pending_notification, LoadRpmPackageResultSigned):
+        notification = ("loadRpmPackageResultDataSigned", data)
+        seq_number = pending_notification.load_rpm_package_result_data_signed.notification.seq_number
+    else:
+        raise SmdpException(
+            f"Unsupported notification type: {type(pending_notification)}"
+        )
+
+    encoded_notification = asn.encode(
+        "PendingNotification",
+        notification,
+        check_constraints=True,
+    )
+    b64_pending_notification = base64.b64encode(encoded_notification).decode()
+    return seq_number, {"pendingNotification": b64_pending_notification}
+
+
 class SmdpClient(httpx.Client):
-    def __init__(self, smdp_address: str, verify_ssl: bool = True):
+    def __init__(
+        self,
+        smdp_address: str,
+        verify_ssl: bool = True,
+        limits: httpx.Limits | None = None,
+    ):
         self.smdp_address = smdp_address
 
         super().__init__(
             base_url=f"https://{smdp_address}",
             verify=verify_ssl,
-            headers={
-                "Content-Type": "application/json",
-                "User-Agent": "gsma-rsp-lpad",
-                "X-Admin-Protocol": "gsma/rsp/v3.1.0",
-            },
+            http2=HTTP2_AVAILABLE,
+            limits=limits or get_limits(),
+            headers=HEADERS,
+            event_hooks={"response": [self.__on_response]},
+        )
+        self.last_response: float | None = None
+
+    def __on_response(self, response: httpx.Response):
+        self.last_response = time.monotonic()
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether a connection is probably still kept alive by the pool."""
+        return (
+            self.last_response is not None
+            and time.monotonic() - self.last_response < KEEPALIVE_EXPIRY
         )
 
+    def preconnect(self):
+        """Resolves the address and does the TLS handshake ahead of the first
+        request, e.g. while the card is busy. The response of the server is
+        irrelevant, failures surface with the first real request."""
+        if self.is_connected:
+            return
+
+        try:
+            self.head("/")
+        except httpx.HTTPError as e:
+            logging.debug(f"Failed to connect to {self.smdp_address} in advance: {e}")
+
     def initiate_authentication(
         self, euicc_challenge: str, euicc_info_1: EuiccInfo1
     ) -> InitiateAuthenticationResponse:
@@ -64,10 +150,10 @@ class SmdpClient(httpx.Client):
         return authentication_response
 
     def authenticate_client(
-        self, transaction_id: str, authenticate_server_response: str
+        self, transaction_id: str, authenticate_server_response: bytes
     ) -> AuthenticateClientResponse:
         b64_authenticate_server = base64.b64encode(
-            bytes.fromhex(authenticate_server_response)
+            authenticate_server_response
         ).decode()
 
         response = self.post(
@@ -99,10 +185,10 @@ class SmdpClient(httpx.Client):
     def get_bound_profile_package(
         self,
         transaction_id: str,
-        prepare_download_response: str,
+        prepare_download_response: bytes,
     ) -> GetBoundProfilePackageResponse:
         b64_prepare_download_response = base64.b64encode(
-            bytes.fromhex(prepare_download_response)
+            prepare_download_response
         ).decode()
 
         response = self.post(
@@ -113,7 +199,7 @@ class SmdpClient(httpx.Client):
             },
         )
         if response.status_code != 200:
-            raise SmdpClient(
+            raise SmdpException(
                 f"Failed to get bound profile package: {response.status_code} - {response.text}"
             )
 
@@ -126,38 +212,101 @@ class SmdpClient(httpx.Client):
         self,
         pending_notification: PendingNotification,
     ) -> None:
-        data = pending_notification.model_dump()
-        seq_number = None
-        if isinstance(pending_notification, ProfileInstallationResult):
-            notification = ("profileInstallationResult", data)
-            seq_number = pending_notification.data.notification.seq_number
-        elif isinstance(pending_notification, OtherSignedNotification):
-            notification = ("otherSignedNotification", data)
-            seq_number = pending_notification.tbs_other_notification.seq_number
-        elif isinstance(pending_notification, LoadRpmPackageResultSigned):
-            notification = ("loadRpmPackageResultDataSigned", data)
-            seq_number = pending_notification.load_rpm_package_result_data_signed.notification.seq_number
-        else:
+        seq_number, body = encode_notification(pending_notification)
+        response = self.post(url=HANDLE_NOTIFICATION_URL, json=body)
+        if response.status_code != 204:
             raise SmdpException(
-                f"Unsupported notification type: {type(pending_notification)}"
+                f"Failed to handle notification: {response.status_code} - {response.text}"
             )
 
-        encoded_notification = asn.encode(
-            "PendingNotification",
-            notification,
-            check_constraints=True,
+        logging.debug(f"Handled notification with sequence number {seq_number}")
+
+
+class AsyncSmdpClient(httpx.AsyncClient):
+    """Asynchronous counterpart of the SmdpClient for the requests which do not
+    need the card, i.e. handleNotification."""
+
+    def __init__(
+        self,
+        smdp_address: str,
+        verify_ssl: bool = True,
+        limits: httpx.Limits | None = None,
+    ):
+        self.smdp_address = smdp_address
+
+        super().__init__(
+            base_url=f"https://{smdp_address}",
+            verify=verify_ssl,
+            http2=HTTP2_AVAILABLE,
+            limits=limits or get_limits(),
+            headers=HEADERS,
         )
-        b64_pending_notification = base64.b64encode(encoded_notification).decode()
 
-        response = self.post(
-            url="/gsma/rsp2/es9plus/handleNotification",
-            json={
-                "pendingNotification": b64_pending_notification,
-            },
+    async def post_notification(self, body: dict) -> httpx.Response:
+        return await self.post(url=HANDLE_NOTIFICATION_URL, json=body)
+
+
+class SmdpClientPool:
+    """Registry of SM-DP+ clients, one per address, which are reused across
+    downloads and notifications. Each client keeps its connections alive, so
+    talking to a server again skips the TCP and TLS handshakes.
+    """
+
+    def __init__(self, limits: httpx.Limits | None = None):
+        self.limits = limits
+        self.clients: dict[tuple[str, bool], SmdpClient] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, smdp_address: str, verify_ssl: bool = True) -> SmdpClient:
+        key = (smdp_address.lower(), verify_ssl)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None or client.is_closed:
+                logging.debug(f"Creating client for SM-DP+ {smdp_address}")
+                client = SmdpClient(smdp_address, verify_ssl, limits=self.limits)
+                self.clients[key] = client
+
+        return client
+
+    def reserve(self, connections: int):
+        """Allows as many requests to every SM-DP+ at once, e.g. one per thread
+        sharing the clients. Clients with fewer connections are closed and
+        replaced on their next get, so this is called before the threads start.
+        """
+        max_connections = (
+            self.limits.max_connections if self.limits else MAX_CONNECTIONS
         )
-        if response.status_code != 204:
-            raise SmdpException(
-                f"Failed to handle notification: {response.status_code} - {response.text}"
-            )
+        if max_connections is not None and connections <= max_connections:
+            return
 
-        logging.debug(f"Handled notification with sequence number {seq_number}")
+        with self.lock:
+            self.limits = get_limits(connections)
+            clients = list(self.clients.values())
+            self.clients.clear()
+
+        for client in clients:
+            client.close()
+
+    def close(self):
+        with self.lock:
+            clients = list(self.clients.values())
+            self.clients.clear()
+
+        for client in clients:
+            client.close()
+
+        if clients:
+            logging.debug(f"Closed {len(clients)} SM-DP+ clients")
+
+
+smdp_clients = SmdpClientPool()
+atexit.register(smdp_clients.close)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import random
+from collections.abc import Callable
+
+import httpx
+
+from resimulate.euicc.models.notification import PendingNotification
+from resimulate.smdp.client import AsyncSmdpClient, encode_notification, get_limits
+from resimulate.smdp.exceptions import SmdpException
+
+# Notifications posted at the same time to one SM-DP+
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 3
+# Seconds before the first retry, doubled for every further retry
+BACKOFF = 0.5
+
+
+class NotificationDrain:
+    """Posts pending notifications to their SM-DP+ servers concurrently.
+
+    Every server gets its own client with at most `concurrency` requests in
+    flight. Failed requests are retried with exponential backoff if the failure
+    is transient, i.e. a transport error, a 429 or a 5xx. Acknowledged
+    notifications are handed to a callback one at a time in the order the
+    acknowledgements arrive, so the card stays serialized while the network
+    requests overlap.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF,
+        verify_ssl: bool = True,
+    ):
+        if concurrency < 1:
+            raise ValueError("The concurrency must be at least 1")
+
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.verify_ssl = verify_ssl
+
+    def run(
+        self,
+        pending_notifications: list[PendingNotification],
+        acknowledge: Callable[[int], bool] | None = None,
+    ) -> list[int]:
+        """Blocking wrapper of drain, for callers without an event loop."""
+        return asyncio.run(self.drain(pending_notifications, acknowledge))
+
+    async def drain(
+        self,
+        pending_notifications: list[PendingNotification],
+        acknowledge: Callable[[int], bool] | None = None,
+    ) -> list[int]:
+        """Posts the notifications and calls acknowledge with the sequence number of
+        every notification the SM-DP+ accepted. Acknowledge returns whether it
+        handled the notification, e.g. removed it from the card.
+
+        Returns:
+            list[int]: The sequence numbers of the acknowledged notifications, in
+                the order they were acknowledged, without those acknowledge returned
+                False for.
+        """
+        # Encode everything first, a broken notification fails before any request
+        requests = [
+            (pending_notification.get_notification().address, *encoded)
+            for pending_notification in pending_notifications
+            for encoded in [encode_notification(pending_notification)]
+        ]
+
+        clients: dict[str, AsyncSmdpClient] = {}
+        for address, _, _ in requests:
+            if address.lower() not in clients:
+                clients[address.lower()] = AsyncSmdpClient(
+                    address, self.verify_ssl, limits=get_limits(self.concurrency)
+                )
+        semaphores = {
+            address: asyncio.Semaphore(self.concurrency) for address in clients
+        }
+
+        async def send(address: str, seq_number: int, body: dict) -> int | None:
+            async with semaphores[address.lower()]:
+                try:
+                    await self.__post(clients[address.lower()], seq_number, body)
+                    return seq_number
+                except (SmdpException, httpx.HTTPError) as e:
+                    logging.error(f"Failed to process notification {seq_number}: {e}")
+                    return None
+
+        acknowledged = []
+        tasks: list[asyncio.Task] = []
+        try:
+            tasks.extend(asyncio.create_task(send(*request)) for request in requests)
+            for task in asyncio.as_completed(tasks):
+                seq_number = await task
+                if seq_number is None:
+                    continue
+
+                # The card is slow and blocking, the requests go on meanwhile
+                if acknowledge is not None and not await asyncio.to_thread(
+                    acknowledge, seq_number
+                ):
+                    continue
+
+                acknowledged.append(seq_number)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+        return acknowledged
+
+    async def __post(self, client: AsyncSmdpClient, seq_number: int, body: dict):
+        for attempt in range(self.retries + 1):
+            retry = attempt < self.retries
+            try:
+                response = await client.post_notification(body)
+            except httpx.TransportError as e:
+                if not retry:
+                    raise
+                logging.debug(f"Retrying notification {seq_number} after {e!r}")
+            else:
+                if response.status_code == 204:
+                    logging.debug(
+                        f"Handled notification with sequence number {seq_number}"
+                    )
+                    return
+
+                transient = response.status_code == 429 or response.status_code >= 500
+                if not transient or not retry:
+                    raise SmdpException(
+                        f"Failed to handle notification: {response.status_code} - {response.text}"
+                    )
+                logging.debug(
+                    f"Retrying notification {seq_number} after {response.status_code}"
+                )
+
+            # Full jitter, retries of many notifications do not arrive at once
+            await asyncio.sleep(random.uniform(0, self.backoff * 2**attempt))
@@ -0,0 +1,185 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from pySim.apdu import Apdu
+from rich.live import Live
+from rich.progress import (
+    BarColumn,
+    MofNCompleteColumn,
+    Progress,
+    TextColumn,
+    TimeElapsedColumn,
+)
+
+from resimulate.trace.models.recorded_apdu import RecordedApdu
+from resimulate.trace.models.recording import (
+    RawRecord,
+    RecordingWriter,
+    Recording,
+    RecordKind,
+)
+from resimulate.trace.tracer import TraceDecoder
+
+# State of a decoding worker process, set up once by init_worker
+worker_recording: Recording | None = None
+worker_decoder: TraceDecoder | None = None
+
+
+def segment_bounds(recording: Recording) -> Iterator[tuple[int, int | None]]:
+    """Yields the file offsets (start, stop) of the reset-delimited segments of a
+    recording. A reset brings the card back into a known state, so every segment
+    can be decoded without knowing the previous ones. The reset itself starts the
+    segment it belongs to."""
+    start = recording.data_offset
+    for reset_offset in recording.indices[RecordKind.CARD_RESET]:
+        if reset_offset > start:
+            yield start, reset_offset
+        start = reset_offset
+
+    yield start, None
+
+
+def init_worker(input_path: str):
+    global worker_recording, worker_decoder
+    worker_recording = Recording(input_path)
+    worker_decoder = TraceDecoder(worker_recording.src_isd_r_aid)
+
+
+def decode_worker(start: int, stop: int | None) -> list[RecordedApdu | RawRecord]:
+    # Segments are scheduled on any worker, start every one from a clean state
+    worker_decoder.reset()
+    return decode_segment(worker_decoder, worker_recording.records(start, stop))
+
+
+def decode_segment(
+    decoder: TraceDecoder, segment: Iterable[RawRecord]
+) -> list[RecordedApdu | RawRecord]:
+    """Decodes a reset-delimited segment. Card resets and APDUs that cannot be
+    decoded are returned unchanged, so they are kept in the decoded recording."""
+    decoded: list[RecordedApdu | RawRecord] = []
+    for record in segment:
+        if record.kind == RecordKind.CARD_RESET:
+            decoder.reset()
+            decoded.append(record)
+            continue
+
+        apdu = Apdu(record.data, record.response)
+        try:
+            apdu_command = decoder.decode(apdu)
+        except Exception as e:
+            logging.debug("Error decoding APDU (%s): %s", apdu, e)
+            decoded.append(record)
+            continue
+
+        decoded.append(RecordedApdu(apdu, apdu_command, record.sequence_number))
+
+    return decoded
+
+
+class Decoder:
+    """Decodes a recording offline, e.g. one captured with 'trace record --raw'.
+
+    The reset-delimited segments of the recording are decoded in parallel on a
+    process pool, every worker with its own runtime state. Results are written
+    in the order of the segments.
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+
+    def decode(self, input_path: str, output_path: str):
+        # The writer truncates the output while the input is still being read
+        if os.path.exists(output_path) and os.path.samefile(input_path, output_path):
+            raise ValueError("The output file must not be the input file.")
+
+        progress = Progress(
+            TimeElapsedColumn(),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TextColumn("{task.description}"),
+        )
+
+        with (
+            Live(progress),
+            Recording.load_file(input_path) as recording,
+            RecordingWriter(
+                output_path, recording.src_isd_r_aid, recording.atr
+            ) as writer,
+        ):
+            total = sum(
+                len(recording.indices[kind])
+                for kind in (RecordKind.APDU, RecordKind.RAW_APDU)
+            )
+            progress_id = progress.add_task(
+                f"[bold green]Decoding APDUs from {input_path}...", total=total
+            )
+
+            segments = list(segment_bounds(recording))
+            logging.debug(
+                "Decoding %d segments with %d workers", len(segments), self.workers
+            )
+
+            if self.workers == 1 or len(segments) == 1:
+                decoder = TraceDecoder(recording.src_isd_r_aid)
+                for start, stop in segments:
+                    decoded = decode_segment(decoder, recording.records(start, stop))
+                    self.__write_segment(writer, decoded, progress, progress_id)
+            else:
+                with ProcessPoolExecutor(
+                    self.workers, initializer=init_worker, initargs=(input_path,)
+                ) as executor:
+                    # Only keep a few segments in flight, so the decoded results of a
+                    # large recording do not pile up in memory before being written.
+                    pending: deque[Future] = deque()
+                    for start, stop in segments:
+                        pending.append(executor.submit(decode_worker, start, stop))
+                        if len(pending) >= 2 * self.workers:
+                            decoded = pending.popleft().result()
+                            self.__write_segment(writer, decoded, progress, progress_id)
+
+                    while pending:
+                        decoded = pending.popleft().result()
+                        self.__write_segment(writer, decoded, progress, progress_id)
+
+            undecoded = len(writer.offsets[RecordKind.RAW_APDU])
+            decoded = len(writer) - undecoded
+            logging.info("Decoded %d of %d APDUs from %s", decoded, total, input_path)
+            progress.update(
+                progress_id,
+                completed=total,
+                description=f"[bold green]Decoded {decoded} APDUs, "
+                f"{undecoded} could not be decoded.",
+            )
+
+    def __write_segment(
+        self,
+        writer: RecordingWriter,
+        decoded: list[RecordedApdu | RawRecord],
+        progress: Progress,
+        progress_id: int,
+    ):
+        apdus = 0
+        for record in decoded:
+            self.__write(writer, record)
+            if isinstance(record, RecordedApdu) or record.kind == RecordKind.RAW_APDU:
+                apdus += 1
+
+        progress.advance(progress_id, apdus)
+
+    def __write(self, writer: RecordingWriter, record: RecordedApdu | RawRecord):
+        if isinstance(record, RecordedApdu):
+            writer.append(record)
+        elif record.kind == RecordKind.CARD_RESET:
+            if writer.atr is None and record.data:
+                writer.set_atr(record.data)
+            writer.append_reset(record.sequence_number, record.timestamp, record.data)
+        else:
+            writer.append_raw(
+                record.sequence_number,
+                record.timestamp,
+                record.data,
+                record.response,
+            )
@@ -52,7 +52,7 @@ class Card:
                 if hasattr(app_cls, "_" + app_cls.__name__ + "__intermediate"):
                     continue
                 if app_cls == CardApplicationISDR:
-                    isdr = app_cls(aid=target_isd_r.value)
+                    isdr = app_cls(aid=target_isd_r.aid)
                     self.profile.add_application(isdr)
                 else:
                     self.profile.add_application(app_cls())
@@ -71,7 +71,7 @@ class Card:
         self.sim_link.set_sw_interpreter(self.runtime_state)
 
         # try to obtain the EID, if any
-        isd_r = self.runtime_state.mf.applications.get(target_isd_r.value.lower(), None)
+        isd_r = self.runtime_state.mf.applications.get(target_isd_r.aid.lower(), None)
         if isd_r:
             self.runtime_state.lchan[0].select_file(isd_r)
             try:
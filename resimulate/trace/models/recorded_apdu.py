@@ -3,8 +3,11 @@ from pySim.apdu import Apdu, ApduCommand
 
 
 class RecordedApdu:
-    def __init__(self, apdu: Apdu, command: ApduCommand) -> None:
+    def __init__(
+        self, apdu: Apdu, command: ApduCommand, sequence_number: int = 0
+    ) -> None:
         self.apdu = apdu
+        self.sequence_number = sequence_number
         self.name = command._name
         self.path = command.path_str
         self.command_dict = command.to_dict()
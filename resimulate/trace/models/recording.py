@@ -1,37 +1,443 @@
+import bisect
+import heapq
 import logging
+import mmap
+import os
 import pickle
+import struct
+from array import array
+from dataclasses import dataclass
+from enum import IntEnum
 from os.path import exists, isfile
+from typing import BinaryIO, Iterator, Sequence
 
 from resimulate.trace.models.recorded_apdu import RecordedApdu
 from resimulate.util import get_version
 from resimulate.util.enums import ISDR_AID
 
+MAGIC = b"RESIMREC"
+FOOTER_MAGIC = b"RESIMIDX"
+FORMAT_VERSION = 3
+
+# Fixed size slot for the ATR so it can be filled in once the first card reset
+# has been observed, without rewriting the rest of the file.
+ATR_MAX_LENGTH = 33
+
+LENGTH_PREFIX = struct.Struct("<H")
+ATR_SLOT = struct.Struct(f"<B{ATR_MAX_LENGTH}s")
+RECORD_HEADER = struct.Struct("<IBQ")
+INDEX_ENTRY = struct.Struct("<Q")
+INDEX_TABLE_ENTRY = struct.Struct("<BQQ")
+FOOTER = struct.Struct("<QQ8s")
+RAW_APDU_HEADER = struct.Struct("<dH")
+CARD_RESET_HEADER = struct.Struct("<d")
+
+
+class RecordKind(IntEnum):
+    APDU = 1
+    RAW_APDU = 2
+    CARD_RESET = 3
+
+
+@dataclass
+class RawRecord:
+    """An undecoded APDU (command and response bytes) or a card reset (ATR)."""
+
+    kind: RecordKind
+    sequence_number: int
+    timestamp: float
+    data: bytes
+    response: bytes = b""
+
+
+class RecordingWriter:
+    """Append-only writer for the indexed recording format.
+
+    File layout::
+
+        header  MAGIC | format version | ReSIMulate version | ISD-R AID | ATR slot
+        records (length, kind, sequence number, payload)*
+        index   offsets of the records of each kind as u64
+        table   (kind, index offset, record count) per kind
+        footer  table offset | table entries | FOOTER_MAGIC
+
+    Besides decoded APDUs, the raw bytes of APDUs that could not (or should not)
+    be decoded and card resets are stored, so nothing that was captured is lost.
+
+    Every record is flushed as soon as it is appended, so a crash during the
+    capture leaves a readable prefix behind. The index and footer are only
+    written on close; readers rebuild the index by scanning if they are missing.
+    """
+
+    def __init__(
+        self, file_path: str, src_isd_r: ISDR_AID, atr: bytes | None = None
+    ) -> None:
+        self.file_path = file_path
+        self.src_isd_r_aid = src_isd_r
+        self.atr = atr
+        self.offsets = {kind: array("Q") for kind in RecordKind}
+        self.has_manage_channel = False
+
+        self.file: BinaryIO = open(file_path, "wb")
+        self.__write_header()
+
+    def __len__(self) -> int:
+        return len(self.offsets[RecordKind.APDU]) + len(
+            self.offsets[RecordKind.RAW_APDU]
+        )
+
+    def __enter__(self) -> "RecordingWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __write_header(self) -> None:
+        version = (get_version() or "").encode()
+        aid = self.src_isd_r_aid.aid.encode()
+
+        self.file.write(MAGIC)
+        self.file.write(LENGTH_PREFIX.pack(FORMAT_VERSION))
+        self.file.write(LENGTH_PREFIX.pack(len(version)) + version)
+        self.file.write(LENGTH_PREFIX.pack(len(aid)) + aid)
+
+        self.atr_offset = self.file.tell()
+        self.file.write(ATR_SLOT.pack(0, b""))
+        if self.atr:
+            self.set_atr(self.atr)
+
+        self.file.flush()
+
+    def set_atr(self, atr: bytes) -> None:
+        if len(atr) > ATR_MAX_LENGTH:
+            raise ValueError(f"ATR too long: {len(atr)} > {ATR_MAX_LENGTH} bytes")
+
+        self.atr = atr
+        position = self.file.tell()
+        self.file.seek(self.atr_offset)
+        self.file.write(ATR_SLOT.pack(len(atr), atr))
+        self.file.seek(position)
+        self.file.flush()
+
+    def __write_record(
+        self, kind: RecordKind, sequence_number: int, *payload: bytes
+    ) -> None:
+        self.offsets[kind].append(self.file.tell())
+        length = sum(len(part) for part in payload)
+        self.file.write(RECORD_HEADER.pack(length, kind, sequence_number))
+        for part in payload:
+            self.file.write(part)
+        self.file.flush()
+
+    def append(self, recorded_apdu: RecordedApdu) -> None:
+        # The name is stored in front of the pickled APDU so that lookups by name
+        # do not have to unpickle the record.
+        name = recorded_apdu.name.encode()
+        self.__write_record(
+            RecordKind.APDU,
+            recorded_apdu.sequence_number,
+            LENGTH_PREFIX.pack(len(name)),
+            name,
+            pickle.dumps(recorded_apdu),
+        )
+
+        if "MANAGE CHANNEL" in recorded_apdu.name:
+            self.has_manage_channel = True
+
+    def append_raw(
+        self, sequence_number: int, timestamp: float, command: bytes, response: bytes
+    ) -> None:
+        self.__write_record(
+            RecordKind.RAW_APDU,
+            sequence_number,
+            RAW_APDU_HEADER.pack(timestamp, len(command)),
+            command,
+            response,
+        )
+
+    def append_reset(self, sequence_number: int, timestamp: float, atr: bytes) -> None:
+        self.__write_record(
+            RecordKind.CARD_RESET,
+            sequence_number,
+            CARD_RESET_HEADER.pack(timestamp),
+            atr,
+        )
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+
+        if len(self) == 0:
+            logging.info("No APDUs captured, not saving to file.")
+            self.file.close()
+            os.remove(self.file_path)
+            return
+
+        if self.offsets[RecordKind.APDU] and not self.has_manage_channel:
+            logging.warning(
+                "No MANAGE CHANNEL APDU found in recording. This may lead to issues during replay."
+            )
+
+        logging.info(
+            "Saving %s captured APDU commands to %s", len(self), self.file_path
+        )
+        table = []
+        for kind, offsets in self.offsets.items():
+            table.append(INDEX_TABLE_ENTRY.pack(kind, self.file.tell(), len(offsets)))
+            offsets.tofile(self.file)
+
+        table_offset = self.file.tell()
+        self.file.write(b"".join(table))
+        self.file.write(FOOTER.pack(table_offset, len(table), FOOTER_MAGIC))
+        self.file.close()
+
 
 class Recording:
-    apdus: list[RecordedApdu]
+    """Read access to a recording written by :class:`RecordingWriter`.
+
+    The file is memory-mapped and the offset index is used in place, so opening
+    a recording takes constant time regardless of its size. APDUs are only
+    unpickled when they are accessed; use :meth:`view` or slicing to work on a
+    window of the recording.
+    """
+
     src_isd_r_aid: ISDR_AID
-    version = get_version()
+    atr: bytes | None
+    version: str | None
 
-    def __init__(self, src_isd_r: ISDR_AID):
-        self.src_isd_r_aid = src_isd_r
-        self.apdus = []
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        with open(file_path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.__read_header()
+            self.indices = self.__read_index()
+            self.offsets = self.indices[RecordKind.APDU]
+        except Exception:
+            self.buffer.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __iter__(self) -> Iterator[RecordedApdu]:
+        return iter(self.view())
+
+    def __getitem__(self, index: int | slice) -> "RecordedApdu | RecordingView":
+        return self.view()[index]
+
+    def __enter__(self) -> "Recording":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for offsets in self.indices.values():
+            if isinstance(offsets, memoryview):
+                offsets.release()
+        self.buffer.close()
+
+    def view(
+        self, start: int | None = None, stop: int | None = None
+    ) -> "RecordingView":
+        return RecordingView(self, range(len(self))[start:stop])
+
+    def __read_header(self) -> None:
+        if self.buffer[: len(MAGIC)] != MAGIC:
+            raise TypeError(
+                f"File {self.file_path} is not a ReSIMulate recording. "
+                "Recordings in the old pickle format have to be recorded again."
+            )
+
+        offset = len(MAGIC)
+        (format_version,) = LENGTH_PREFIX.unpack_from(self.buffer, offset)
+        if format_version != FORMAT_VERSION:
+            raise TypeError(
+                f"Unsupported recording format version {format_version} in {self.file_path}"
+            )
+
+        version, offset = self.__read_string(offset + LENGTH_PREFIX.size)
+        aid, offset = self.__read_string(offset)
+        self.version = version or None
+        self.src_isd_r_aid = ISDR_AID.from_aid(aid)
+
+        atr_length, atr = ATR_SLOT.unpack_from(self.buffer, offset)
+        self.atr = atr[:atr_length] if atr_length else None
+        self.data_offset = offset + ATR_SLOT.size
+
+    def __read_string(self, offset: int) -> tuple[str, int]:
+        (length,) = LENGTH_PREFIX.unpack_from(self.buffer, offset)
+        offset += LENGTH_PREFIX.size
+        return self.buffer[offset : offset + length].decode(), offset + length
+
+    def __read_index(self) -> dict[RecordKind, Sequence[int]]:
+        file_size = len(self.buffer)
+        indices: dict[RecordKind, Sequence[int]] = {
+            kind: array("Q") for kind in RecordKind
+        }
+
+        if file_size - self.data_offset >= FOOTER.size:
+            table_offset, table_entries, magic = FOOTER.unpack_from(
+                self.buffer, file_size - FOOTER.size
+            )
+            if magic == FOOTER_MAGIC:
+                for entry in range(table_entries):
+                    kind, index_offset, count = INDEX_TABLE_ENTRY.unpack_from(
+                        self.buffer, table_offset + entry * INDEX_TABLE_ENTRY.size
+                    )
+                    index_end = index_offset + count * INDEX_ENTRY.size
+                    indices[RecordKind(kind)] = memoryview(self.buffer)[
+                        index_offset:index_end
+                    ].cast("Q")
+
+                return indices
+
+        logging.warning(
+            "Recording %s has no index, it was probably not closed properly. Scanning records...",
+            self.file_path,
+        )
+        offset = self.data_offset
+        while offset + RECORD_HEADER.size <= file_size:
+            length, kind, _ = RECORD_HEADER.unpack_from(self.buffer, offset)
+            if offset + RECORD_HEADER.size + length > file_size:
+                logging.warning("Dropping truncated record at offset %d", offset)
+                break
+
+            try:
+                record_kind = RecordKind(kind)
+            except ValueError:
+                # E.g. the start of an index which was not completely written
+                logging.warning("Dropping unknown record at offset %d", offset)
+                break
+
+            indices[record_kind].append(offset)
+            offset += RECORD_HEADER.size + length
+
+        logging.debug(
+            "Recovered %d records from %s",
+            sum(len(offsets) for offsets in indices.values()),
+            self.file_path,
+        )
+        return indices
+
+    def read_sequence_number(self, index: int) -> int:
+        _, _, sequence_number = RECORD_HEADER.unpack_from(
+            self.buffer, self.offsets[index]
+        )
+        return sequence_number
+
+    def read_name(self, index: int) -> str:
+        offset = self.offsets[index]
+        self.__check_kind(offset)
+        name, _ = self.__read_string(offset + RECORD_HEADER.size)
+        return name
+
+    def read_apdu(self, index: int) -> RecordedApdu:
+        offset = self.offsets[index]
+        length, _, _ = self.__check_kind(offset)
+
+        payload_offset = offset + RECORD_HEADER.size
+        (name_length,) = LENGTH_PREFIX.unpack_from(self.buffer, payload_offset)
+        pickle_offset = payload_offset + LENGTH_PREFIX.size + name_length
+        return pickle.loads(self.buffer[pickle_offset : payload_offset + length])
+
+    def __check_kind(
+        self, offset: int, kind: RecordKind = RecordKind.APDU
+    ) -> tuple[int, int, int]:
+        header = RECORD_HEADER.unpack_from(self.buffer, offset)
+        if header[1] != kind:
+            raise TypeError(f"Unexpected record kind {header[1]} at offset {offset}")
+
+        return header
+
+    def raw_records(self) -> Iterator[RawRecord]:
+        """Yields the raw APDUs and card resets in the order they were captured."""
+        for offset in heapq.merge(
+            self.indices[RecordKind.RAW_APDU], self.indices[RecordKind.CARD_RESET]
+        ):
+            yield self.read_raw(offset)
+
+    def records(
+        self, start: int | None = None, stop: int | None = None
+    ) -> Iterator[RawRecord]:
+        """Yields every record in the order it was captured, optionally limited to
+        the records between the file offsets start (inclusive) and stop (exclusive).
+        Decoded APDUs are turned back into their raw bytes, so the whole recording
+        can be decoded again from scratch."""
+        windows = {}
+        for kind, offsets in self.indices.items():
+            first = 0 if start is None else bisect.bisect_left(offsets, start)
+            last = len(offsets) if stop is None else bisect.bisect_left(offsets, stop)
+            # Index the offsets instead of slicing them, slices of the memory-mapped
+            # index would keep the mmap from being closed.
+            windows[kind] = map(offsets.__getitem__, range(first, last))
+
+        apdu_index = 0 if start is None else bisect.bisect_left(self.offsets, start)
+        for offset in heapq.merge(*windows.values()):
+            _, kind, sequence_number = RECORD_HEADER.unpack_from(self.buffer, offset)
+            if kind != RecordKind.APDU:
+                yield self.read_raw(offset)
+                continue
+
+            apdu = self.read_apdu(apdu_index).apdu
+            apdu_index += 1
+            yield RawRecord(
+                RecordKind.RAW_APDU,
+                sequence_number,
+                0.0,
+                bytes(apdu.cmd),
+                bytes(apdu.rsp or b""),
+            )
+
+    def read_raw(self, offset: int) -> RawRecord:
+        length, kind, sequence_number = RECORD_HEADER.unpack_from(self.buffer, offset)
+        payload_offset = offset + RECORD_HEADER.size
+        payload_end = payload_offset + length
+
+        if kind == RecordKind.CARD_RESET:
+            (timestamp,) = CARD_RESET_HEADER.unpack_from(self.buffer, payload_offset)
+            atr_offset = payload_offset + CARD_RESET_HEADER.size
+            return RawRecord(
+                RecordKind.CARD_RESET,
+                sequence_number,
+                timestamp,
+                self.buffer[atr_offset:payload_end],
+            )
+
+        self.__check_kind(offset, RecordKind.RAW_APDU)
+        timestamp, command_length = RAW_APDU_HEADER.unpack_from(
+            self.buffer, payload_offset
+        )
+        command_offset = payload_offset + RAW_APDU_HEADER.size
+        response_offset = command_offset + command_length
+        return RawRecord(
+            RecordKind.RAW_APDU,
+            sequence_number,
+            timestamp,
+            self.buffer[command_offset:response_offset],
+            self.buffer[response_offset:payload_end],
+        )
 
     @staticmethod
     def load_file(file_path: str) -> "Recording":
         if not exists(file_path) or not isfile(file_path):
             raise FileNotFoundError(f"File {file_path} not found.")
 
-        with open(file_path, "rb") as f:
-            recording = pickle.load(f)
-
-        if not isinstance(recording, Recording):
-            raise TypeError(f"File {file_path} does not contain a Recording object.")
+        recording = Recording(file_path)
 
-        logging.debug("Loaded %d APDUs from %s", len(recording.apdus), file_path)
+        logging.debug("Loaded %d APDUs from %s", len(recording), file_path)
+        if raw_count := len(recording.indices[RecordKind.RAW_APDU]):
+            logging.warning(
+                "%d APDUs in %s are not decoded and will be skipped. Use 'trace decode' to decode them.",
+                raw_count,
+                file_path,
+            )
         if recording.src_isd_r_aid != ISDR_AID.DEFAULT:
             logging.debug(
                 "Recording used ISD-R AID: %s (%s)",
-                recording.src_isd_r_aid.value,
+                recording.src_isd_r_aid.aid,
                 recording.src_isd_r_aid.name,
             )
 
@@ -41,28 +447,64 @@ class Recording:
                 file_path,
             )
 
-        if recording.__has_open_channel():
-            logging.warning(
-                "No MANAGE CHANNEL APDU found in recording. This may lead to issues during replay."
-            )
-
         return recording
 
-    def __has_open_channel(self) -> bool:
-        return any("MANAGE CHANNEL" in apdu.name for apdu in self.apdus)
 
-    def save_file(self, file_path: str) -> None:
-        if len(self.apdus) == 0:
-            logging.info("No APDUs captured, not saving to file.")
-            return
+class RecordingView:
+    """A window over the APDUs of a :class:`Recording`.
 
-        if self.__has_open_channel():
-            logging.warning(
-                "No MANAGE CHANNEL APDU found in recording. This may lead to issues during replay."
-            )
+    Indexing returns the decoded :class:`RecordedApdu`, slicing returns another
+    view without decoding anything. Lookups by name or sequence number only read
+    the record headers.
+    """
 
-        logging.info(
-            "Saving %s captured APDU commands to %s", len(self.apdus), file_path
+    def __init__(self, recording: Recording, indices: range) -> None:
+        self.recording = recording
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __iter__(self) -> Iterator[RecordedApdu]:
+        for index in self.indices:
+            yield self.recording.read_apdu(index)
+
+    def __getitem__(self, index: int | slice) -> "RecordedApdu | RecordingView":
+        if isinstance(index, slice):
+            return RecordingView(self.recording, self.indices[index])
+
+        return self.recording.read_apdu(self.indices[index])
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.recording.file_path}, {self.indices.start}:{self.indices.stop})"
+
+    def find(self, name: str) -> list[int]:
+        """Returns the positions (relative to this view) of all APDUs with the given name."""
+        return [
+            position
+            for position, index in enumerate(self.indices)
+            if self.recording.read_name(index) == name
+        ]
+
+    def by_name(self, name: str) -> Iterator[RecordedApdu]:
+        for position in self.find(name):
+            yield self[position]
+
+    def position_of_sequence_number(self, sequence_number: int) -> int:
+        """Returns the position (relative to this view) of the APDU with the given
+        sequence number. Sequence numbers grow monotonically within a recording,
+        so the lookup is a binary search over the record headers."""
+        position = bisect.bisect_left(
+            self.indices, sequence_number, key=self.recording.read_sequence_number
         )
-        with open(file_path, "wb") as f:
-            pickle.dump(self, f)
+        if (
+            position == len(self.indices)
+            or self.recording.read_sequence_number(self.indices[position])
+            != sequence_number
+        ):
+            raise KeyError(f"No APDU with sequence number {sequence_number}")
+
+        return position
+
+    def by_sequence_number(self, sequence_number: int) -> RecordedApdu:
+        return self[self.position_of_sequence_number(sequence_number)]
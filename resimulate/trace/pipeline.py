@@ -0,0 +1,80 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from queue import Empty, ShutDown
+from typing import Generic, TypeVar
+
+from pySim.apdu import Apdu, CardReset
+
+T = TypeVar("T")
+
+
+@dataclass
+class CapturedApdu:
+    """An APDU or card reset as read from the source, before any decoding."""
+
+    sequence_number: int
+    timestamp: float
+    apdu: Apdu | CardReset
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    dropped: int = 0
+    errors: int = 0
+    depth: int = 0
+
+    def __str__(self) -> str:
+        return f"processed={self.processed} depth={self.depth} dropped={self.dropped} errors={self.errors}"
+
+
+class RingBuffer(Generic[T]):
+    """Bounded FIFO between two pipeline stages.
+
+    Unlike a bounded Queue, putting never blocks: if the consumer falls behind,
+    the oldest entry is overwritten and counted as dropped. This keeps the
+    producer (the socket reader) draining the socket at all times.
+    """
+
+    def __init__(self, maxlen: int):
+        self.buffer: deque[T] = deque(maxlen=maxlen)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def put(self, item: T) -> None:
+        """Appends the entry, a buffer which was shut down takes no new ones."""
+        with self.condition:
+            if self.closed:
+                return
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(item)
+            self.condition.notify()
+
+    def get(self, timeout: float | None = None) -> T:
+        """Returns the oldest entry.
+
+        Raises:
+            Empty: If no entry arrived within the timeout.
+            ShutDown: If the buffer was shut down and is drained.
+        """
+        with self.condition:
+            if not self.condition.wait_for(
+                lambda: self.buffer or self.closed, timeout=timeout
+            ):
+                raise Empty
+
+            if not self.buffer:
+                raise ShutDown
+
+            return self.buffer.popleft()
+
+    def shutdown(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -3,7 +3,7 @@ import signal
 from queue import Empty, Queue, ShutDown
 from threading import Thread
 
-from pySim.apdu import Apdu, ApduCommand
+from pySim.apdu import ApduCommand, CardReset
 from pySim.apdu_source.gsmtap import ApduSource
 from rich.align import Align
 from rich.console import Group
@@ -12,26 +12,44 @@ from rich.progress import BarColumn, Progress, TextColumn, TimeElapsedColumn
 from rich.text import Text
 
 from resimulate.trace.models.recorded_apdu import RecordedApdu
-from resimulate.trace.models.recording import Recording
-from resimulate.trace.tracer import Tracer
+from resimulate.trace.models.recording import RecordingWriter
+from resimulate.trace.pipeline import CapturedApdu
+from resimulate.trace.tracer import DEFAULT_BUFFER_SIZE, Tracer
 from resimulate.util.enums import ISDR_AID
 
 
 class Recorder:
-    def __init__(self, source: ApduSource, src_isd_r: ISDR_AID):
-        self.tracer = Tracer(source, isd_r_aid=src_isd_r.aid)
+    def __init__(
+        self,
+        source: ApduSource,
+        src_isd_r: ISDR_AID,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        raw: bool = False,
+    ):
+        self.tracer = Tracer(
+            source, isd_r_aid=src_isd_r, buffer_size=buffer_size, decode=not raw
+        )
         self.src_isd_r_aid = src_isd_r
+        self.raw = raw
 
-        self.package_queue: Queue[tuple[Apdu, ApduCommand]] = Queue()
+        self.package_queue: Queue[tuple[CapturedApdu, ApduCommand | None]] = Queue(
+            maxsize=buffer_size
+        )
         self.tracer_thread = Thread(
             target=self.tracer.main, args=(self.package_queue,), daemon=True
         )
-        self.recording = Recording(src_isd_r=src_isd_r.aid)
         signal.signal(signal.SIGINT, self.__signal_handler)
 
     def __signal_handler(self, sig, frame):
-        logging.debug("Received signal %s, shutting down capture.", sig)
-        self.package_queue.shutdown(immediate=True)
+        if self.tracer.stopped.is_set():
+            # Pressed again while draining, the buffered APDUs are given up
+            logging.debug("Received signal %s again, discarding buffered APDUs.", sig)
+            self.package_queue.shutdown(immediate=True)
+            return
+
+        # Decode and sink drain the buffered APDUs before the writer is closed
+        logging.debug("Received signal %s, stopping capture.", sig)
+        self.tracer.stop()
 
     def record(self, output_path: str, timeout: int):
         overall_progress = Progress(
@@ -54,29 +72,23 @@ class Recorder:
         )
 
         overall_task_id = overall_progress.add_task(
-            f"[bold red]{len(self.recording.apdus)} packets captured!",
+            "[bold red]0 packets captured!",
             start=True,
             total=None,
         )
 
-        with Live(main_group):
+        with (
+            Live(main_group),
+            RecordingWriter(output_path, self.src_isd_r_aid) as writer,
+        ):
             self.tracer_thread.start()
 
-            while self.tracer_thread.is_alive():
+            sink_stats = self.tracer.stats["sink"]
+            while True:
                 try:
-                    apdu, apdu_command = self.package_queue.get(timeout=timeout)
-
-                    if apdu is None:
-                        logging.debug("No more APDU packets to capture.")
-                        break
-
-                    logging.info(
-                        "Captured %s %s %s",
-                        apdu_command._name,
-                        apdu_command.path_str,
-                        apdu,
-                    )
-                    self.recording.apdus.append(RecordedApdu(apdu, apdu_command))
+                    captured, apdu_command = self.package_queue.get(timeout=timeout)
+                    self.__write(writer, captured, apdu_command)
+                    sink_stats.processed += 1
                 except TimeoutError:
                     logging.debug("Timeout reached, stopping capture.")
                     break
@@ -90,20 +102,55 @@ class Recorder:
                     logging.debug("Error capturing APDU packets: %s", e)
                     break
 
+                stats = self.tracer.get_stats()
                 overall_progress.update(
                     overall_task_id,
-                    description=f"[bold green]{len(self.recording.apdus)} packet(s) captured!",
+                    description=f"[bold green]{len(writer)} packet(s) captured! "
+                    f"[dim](decode: depth {stats['decode'].depth}, dropped {stats['decode'].dropped}, "
+                    f"errors {stats['decode'].errors} | sink: depth {stats['sink'].depth})",
                 )
 
+            for stage, stats in self.tracer.get_stats().items():
+                logging.debug("Pipeline stage %s: %s", stage, stats)
+
             overall_progress.update(
                 overall_task_id,
-                description="[bold yellow]Saving captured APDU commands...",
+                description="[bold green]Captured %s APDU packets!" % len(writer),
             )
 
-            self.recording.save_file(output_path)
-
-            overall_progress.update(
-                overall_task_id,
-                description="[bold green]Captured %s APDU packets!"
-                % len(self.recording.apdus),
+    def __write(
+        self,
+        writer: RecordingWriter,
+        captured: CapturedApdu,
+        apdu_command: ApduCommand | None,
+    ):
+        apdu = captured.apdu
+        if isinstance(apdu, CardReset):
+            atr = bytes(apdu.atr or b"")
+            if writer.atr is None and atr:
+                logging.debug("Recording ATR %s", atr.hex())
+                writer.set_atr(atr)
+
+            writer.append_reset(captured.sequence_number, captured.timestamp, atr)
+            return
+
+        if apdu_command is None:
+            if self.raw:
+                logging.debug("Captured raw APDU %s", apdu)
+            else:
+                logging.info("Captured undecoded APDU %s", apdu)
+            writer.append_raw(
+                captured.sequence_number,
+                captured.timestamp,
+                bytes(apdu.cmd),
+                bytes(apdu.rsp or b""),
             )
+            return
+
+        logging.info(
+            "Captured %s %s %s",
+            apdu_command._name,
+            apdu_command.path_str,
+            apdu,
+        )
+        writer.append(RecordedApdu(apdu, apdu_command, captured.sequence_number))
@@ -11,33 +11,42 @@ from rich.progress import BarColumn, Progress, TextColumn, TimeElapsedColumn
 from rich.text import Text
 
 from resimulate.euicc.transport.pcsc_link import PcscLink
+from resimulate.euicc.transport.simulated_link import SimulatedEuiccLink
 from resimulate.trace.models.recording import Recording
 from resimulate.trace.legacy_card import Card
 from resimulate.util.enums import ISDR_AID
 
 
 class Replayer:
-    def __init__(self, device: int, target_isd_r: str, mutate: bool = False):
+    def __init__(
+        self,
+        device: int,
+        target_isd_r: ISDR_AID,
+        mutate: bool = False,
+        simulate: bool = False,
+    ):
         self.device = device
-        self.target_isd_r_aid = ISDR_AID.get_aid(target_isd_r)
+        self.target_isd_r_aid = target_isd_r
         self.mutate = mutate
+        self.simulate = simulate
 
     def __send_apdu(self, link: PcscLink, apdu: Apdu) -> ResTuple:
         if (self.recording.src_isd_r_aid and self.target_isd_r_aid) and (
             self.recording.src_isd_r_aid != self.target_isd_r_aid
         ):
-            cmd_data = b2h(apdu.cmd_data)
-            if self.recording.src_isd_r_aid.value in cmd_data:
-                cmd_data = cmd_data.replace(
-                    self.recording.src_isd_r_aid.value, self.target_isd_r_aid.value
-                )
+            cmd_data = b2h(apdu.cmd_data).lower()
+            src_aid = self.recording.src_isd_r_aid.aid.lower()
+            if src_aid in cmd_data:
+                cmd_data = cmd_data.replace(src_aid, self.target_isd_r_aid.aid.lower())
                 apdu.cmd_data = h2b(cmd_data)
 
         data, resp = link.send_apdu_checksw(b2h(apdu.cmd), sw="????")
         logging.debug("Received Data: %s, SW: %s", data, resp)
         return data, resp
 
-    def replay(self, input_path: str):
+    def replay(
+        self, input_path: str, start: int | None = None, stop: int | None = None
+    ):
         progress = Progress(
             TimeElapsedColumn(), BarColumn(), TextColumn("{task.description}")
         )
@@ -58,12 +67,17 @@ class Replayer:
 
         with Live(main_group):
             self.recording = Recording.load_file(input_path)
+            apdus = self.recording.view(start, stop)
+            logging.debug("Replaying %s", apdus)
             progress.update(
                 progress_id, description="[bold green]Initializing PC/SC link..."
             )
 
             try:
-                pcsc_link = PcscLink(device_index=self.device)
+                if self.simulate:
+                    pcsc_link = SimulatedEuiccLink()
+                else:
+                    pcsc_link = PcscLink(device_index=self.device)
                 logging.debug("PC/SC link initialized: %s", pcsc_link)
                 card = Card(pcsc_link)
                 initialized_card = card.init_card(target_isd_r=self.target_isd_r_aid)
@@ -75,22 +89,23 @@ class Replayer:
                 progress.update(
                     progress_id, description=":x: [bold red]Failed to initialize card."
                 )
+                self.recording.close()
                 return
 
             successful_replays = 0
             try:
                 with pcsc_link as link:
                     logging.debug("Replaying APDUs...")
-                    for idx, recorded_apdu in enumerate(self.recording.apdus, start=1):
+                    for idx, recorded_apdu in enumerate(apdus, start=1):
                         logging.info("Replaying %s", recorded_apdu.__rich__())
                         data, resp = self.__send_apdu(link, recorded_apdu.apdu)
 
                         if resp == b2h(recorded_apdu.apdu.sw):
                             progress.update(
                                 progress_id,
-                                total=len(self.recording.apdus),
+                                total=len(apdus),
                                 completed=idx,
-                                description=f"Replaying APDU {idx} / {len(self.recording.apdus)}",
+                                description=f"Replaying APDU {idx} / {len(apdus)}",
                             )
                             successful_replays += 1
                             continue
@@ -127,7 +142,7 @@ class Replayer:
                 if not progress.finished:
                     progress.update(
                         progress_id,
-                        description=f":police_car_light: [bold yellow]Failed to replay all APDUs ({successful_replays}/{len(self.recording.apdus)}).",
+                        description=f":police_car_light: [bold yellow]Failed to replay all APDUs ({successful_replays}/{len(apdus)}).",
                     )
 
                 else:
@@ -135,3 +150,5 @@ class Replayer:
                         progress_id,
                         description=":white_check_mark: [bold green]Replay finished.",
                     )
+            finally:
+                self.recording.close()
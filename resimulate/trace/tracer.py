@@ -1,7 +1,9 @@
 import logging
-from queue import Queue
+import time
+from queue import Queue, ShutDown
+from threading import Event, Thread
 
-from pySim.apdu import ApduDecoder, CardReset
+from pySim.apdu import Apdu, ApduCommand, ApduDecoder, CardReset
 from pySim.apdu.global_platform import ApduCommands as GlobalPlatformCommands
 from pySim.apdu.ts_31_102 import ApduCommands as UsimApduCommands
 from pySim.apdu.ts_102_221 import ApduCommands as UiccApduCommands
@@ -19,6 +21,7 @@ from pySim.ts_31_103 import CardApplicationISIM
 from pySim.ts_102_221 import CardProfileUICC
 
 from resimulate.exceptions import RecorderException
+from resimulate.trace.pipeline import CapturedApdu, RingBuffer, StageStats
 from resimulate.util.dummy_sim_link import DummySimLink
 from resimulate.util.enums import ISDR_AID
 
@@ -26,16 +29,19 @@ APDU_COMMANDS = (
     UiccApduCommands + UsimApduCommands + ManageApduCommands + GlobalPlatformCommands
 )
 
+DEFAULT_BUFFER_SIZE = 65536
 
-# Taken from the pySim project and modified for the ReSIMulate project
-class Tracer:
-    def __init__(self, source: ApduSource, isd_r_aid: ISDR_AID):
+
+class TraceDecoder:
+    """Decodes APDUs into pySim ApduCommands, tracking the card state they imply."""
+
+    def __init__(self, isd_r_aid: ISDR_AID):
         # we assume a generic UICC profile; as all APDUs return 9000 in DummySimLink above,
         # all CardProfileAddon (including SIM) will probe successful.
         profile = CardProfileUICC()
         profile.add_application(CardApplicationUSIM())
         profile.add_application(CardApplicationISIM())
-        profile.add_application(CardApplicationISDR(aid=isd_r_aid.value))
+        profile.add_application(CardApplicationISDR(aid=isd_r_aid.aid))
         profile.add_application(CardApplicationECASD())
         profile.add_application(CardApplicationARAM())
         profile.add_application(CardApplicationISD())
@@ -49,56 +55,138 @@ class Tracer:
 
         self.apdu_decoder = ApduDecoder(APDU_COMMANDS)
 
+    def reset(self):
+        logging.debug("Resetting runtime state")
+        self.runtime_state.reset()
+
+    def decode(self, apdu: Apdu) -> ApduCommand:
+        # ask ApduDecoder to look-up (INS,CLA) + instantiate an ApduCommand derived
+        apdu_command = self.apdu_decoder.input(apdu)
+        # process the APDU (may modify the RuntimeState)
+        apdu_command.process(self.runtime_state)
+        return apdu_command
+
+
+# Taken from the pySim project and modified for the ReSIMulate project
+class Tracer:
+    def __init__(
+        self,
+        source: ApduSource,
+        isd_r_aid: ISDR_AID,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        decode: bool = True,
+    ):
+        # In raw mode nothing is decoded while capturing, every APDU is handed to
+        # the sink as is and decoded later on with 'trace decode'.
+        self.decoder = TraceDecoder(isd_r_aid) if decode else None
+
         self.suppress_status = False
         self.suppress_select = False
         self.show_raw_apdu = False
         self.source = source
 
-    def main(self, package_queue: Queue):
-        """Main loop of tracer: Iterates over all Apdu received from source."""
-        apdu_counter = 0
-        while True:
+        self.ring_buffer: RingBuffer[CapturedApdu] = RingBuffer(buffer_size)
+        self.package_queue: Queue | None = None
+        self.capture_thread = Thread(target=self.capture, daemon=True)
+        self.stopped = Event()
+        self.stats = {
+            "capture": StageStats(),
+            "decode": StageStats(),
+            "sink": StageStats(),
+        }
+
+    def capture(self):
+        """Capture stage: drains the source into the ring buffer as fast as possible.
+        Nothing is decoded here, so a slow decode never blocks the socket."""
+        stats = self.stats["capture"]
+        sequence_number = 0
+        while not self.stopped.is_set():
             # obtain the next APDU from the source (blocking read)
             try:
                 apdu = self.source.read()
-                apdu_counter = apdu_counter + 1
             except StopIteration:
-                logging.debug("%i APDUs parsed, stop iteration." % apdu_counter)
-                package_queue.task_done()
-                return
+                logging.debug("%i APDUs captured, stop iteration." % stats.processed)
+                break
             except Exception as e:
-                logging.error("Error reading APDU (%s): %s", apdu, e)
+                logging.error("Error reading APDU: %s", e)
+                stats.errors += 1
                 continue
 
             if apdu is None:
                 logging.debug("Received None APDU")
                 continue
 
-            if isinstance(apdu, CardReset):
-                logging.debug("Resetting runtime state")
-                self.runtime_state.reset()
-                continue
+            sequence_number += 1
+            self.ring_buffer.put(CapturedApdu(sequence_number, time.time(), apdu))
+            stats.processed += 1
 
-            # ask ApduDecoder to look-up (INS,CLA) + instantiate an ApduCommand derived
-            apdu_command = self.apdu_decoder.input(apdu)
-            # process the APDU (may modify the RuntimeState)
-            try:
-                apdu_command.process(self.runtime_state)
-            except ValueError as e:
-                logging.error("Error reading APDU (%s): %s", apdu, e)
-                logging.exception(e)
-                continue
-            except AttributeError as e:
-                logging.error("Error processing APDU (%s): %s", apdu, e)
-                logging.exception(e)
-                return
-
-            # Avoid cluttering the logging with too much verbosity
-            if self.suppress_select and isinstance(apdu_command, UiccSelect):
-                logging.debug("Suppressing UiccSelect")
-                continue
-            if self.suppress_status and isinstance(apdu_command, UiccStatus):
-                logging.debug("Suppressing UiccStatus")
-                continue
+        self.ring_buffer.shutdown()
+
+    def stop(self):
+        """Stops the capture stage. The APDUs captured so far are still decoded and
+        handed to the sink, which ends once the package queue is drained."""
+        self.stopped.set()
+        self.ring_buffer.shutdown()
+
+    def main(self, package_queue: Queue):
+        """Decode stage of the tracer: Starts the capture stage and decodes every
+        captured APDU, handing it to the sink via the package queue. APDUs that
+        fail to decode (or all APDUs in raw mode) are handed over without a
+        command so their raw bytes can still be persisted."""
+        self.package_queue = package_queue
+        self.capture_thread.start()
+
+        stats = self.stats["decode"]
+        try:
+            while True:
+                try:
+                    captured = self.ring_buffer.get()
+                except ShutDown:
+                    logging.debug("%i APDUs decoded, stop iteration." % stats.processed)
+                    package_queue.shutdown()
+                    return
+
+                apdu = captured.apdu
+                if self.decoder is None:
+                    package_queue.put((captured, None))
+                    stats.processed += 1
+                    continue
+
+                if isinstance(apdu, CardReset):
+                    self.decoder.reset()
+                    package_queue.put((captured, None))
+                    continue
+
+                try:
+                    apdu_command = self.decoder.decode(apdu)
+                except Exception as e:
+                    logging.error("Error decoding APDU (%s): %s", apdu, e)
+                    logging.exception(e)
+                    stats.errors += 1
+                    package_queue.put((captured, None))
+                    continue
+
+                stats.processed += 1
+
+                # Avoid cluttering the logging with too much verbosity
+                if self.suppress_select and isinstance(apdu_command, UiccSelect):
+                    logging.debug("Suppressing UiccSelect")
+                    continue
+                if self.suppress_status and isinstance(apdu_command, UiccStatus):
+                    logging.debug("Suppressing UiccStatus")
+                    continue
+
+                package_queue.put((captured, apdu_command))
+        except ShutDown:
+            logging.debug("Sink was shut down, stopping decoding.")
+
+    def get_stats(self) -> dict[str, StageStats]:
+        """Returns the per-stage statistics. The depth and drops of a stage refer
+        to its input buffer: the ring buffer for decode, the package queue for the sink.
+        """
+        self.stats["decode"].depth = len(self.ring_buffer)
+        self.stats["decode"].dropped = self.ring_buffer.dropped
+        if self.package_queue is not None:
+            self.stats["sink"].depth = self.package_queue.qsize()
 
-            package_queue.put((apdu, apdu_command))
+        return self.stats
@@ -18,6 +18,13 @@ class ISDR_AID(enum.Enum):
                 return member
         raise ValueError(f"ISD-R description '{description}' is not supported!")
 
+    @classmethod
+    def from_aid(cls, aid: str) -> "ISDR_AID":
+        for member in cls:
+            if member.aid.lower() == aid.lower():
+                return member
+        raise ValueError(f"ISD-R AID '{aid}' is not supported!")
+
     @classmethod
     def get_all_descriptions(cls) -> list[str]:
         return [member.description for member in cls]
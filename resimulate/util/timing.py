@@ -0,0 +1,30 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+@dataclass
+class StageTimings:
+    """Seconds spent in every stage of an operation, in the order the stages
+    started. Stages which run several times are summed up, stages which overlap
+    are measured each on their own."""
+
+    stages: dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def measure(self, stage: str):
+        self.stages.setdefault(stage, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] += time.perf_counter() - start
+
+    def add(self, other: "StageTimings"):
+        for stage, elapsed in other.stages.items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{stage} {elapsed:.3f}s" for stage, elapsed in self.stages.items()
+        )